@@ -5,14 +5,15 @@ import pandas as pd
 from datetime import datetime
 from PIL import Image, ImageTk
 import os
+import sys
 
 from utils.formatting import inches_to_feet_inches
-from db.queries import fetch_all, execute
+from db.queries import execute
 from db.connection import get_cursor
+from db.schema import ensure_schema, SchemaError
 from services.barcode_service import (
     generate_barcode_image,
     generate_all_barcodes_service,          # still imported (legacy function) – remove if no longer used anywhere
-    get_barcode_items,
     build_barcode_filename,
     generate_selected_barcodes_service,
     generate_scannable_barcode,
@@ -23,32 +24,50 @@ from services.barcode_service import (
     test_barcode_naming_cases
 )
 from services.export_service import (
-    fetch_inventory_rows_for_csv,
-    build_csv_dataframe,
-    export_inventory_pronest_dataframe
+    fetch_inventory_csv_dataframe,
+    pronest_export,
+    save_frame
 )
 
 from inventory_import import run_import
 # --- UPDATE import from inventory_service to include new helpers ---
 from services.inventory_service import (
     add_inventory_item, update_inventory_item, delete_inventory_item,
-    adjust_quantity, extract_dimensions, parse_dimensions,
+    extract_dimensions, parse_dimensions,
     get_quantity_for_barcode, set_quantity_for_barcode, normalize_date_input,
-    fetch_item_by_barcode, update_inventory_item_by_id, delete_inventory_item_by_id
+    fetch_item_by_barcode, update_inventory_item_by_id, delete_inventory_item_by_id,
+    apply_delta, adjust_quantities, search_inventory, query_inventory, PAGE_SIZE
 )
+from services.ledger_service import start_ledger_maintenance
+from services.history_service import start_history_maintenance
+from services.snapshot_service import get_snapshot, SNAPSHOT_POLL_MS, SORT_KEYS, RANGE_FILTERS
+from services.facet_service import get_facets, facet_values, FACET_COLUMNS
+from services.analytics_service import (
+    stock_summary, stock_totals, low_stock, LOW_STOCK_SHEETS, SUMMARY_COLUMNS,
+    SUMMARY_SOURCE_COLUMNS
+)
+from db.schema import SEARCH_FIELDS
 
 # --- imports (add fetch_one) ---
-from db.queries import fetch_all, execute, fetch_one
+from db.queries import execute, fetch_all, fetch_one
 from services.backup_service import backup_inventory, restore_inventory
 
 # ------------------------------------------------------------------
 # Global UI state
 # ------------------------------------------------------------------
 current_filters = {}
+current_dimension_filters = {}
+current_search = ""   # View tab search text; rows shown best match first
 filter_comboboxes = {}
 show_dimensions_in_feet = False
 sort_column = None
 sort_reverse = False
+view_query = (None, None)   # filters / range filters of the rows in the View tab
+view_next_key = None        # keyset cursor of the next page (None: all loaded)
+view_total = 0              # matching rows (estimate on large PostgreSQL tables)
+shown_barcode_image = None   # barcode currently drawn in barcode_image_label
+# Rows shown in the View / Barcode tabs (kept current from DB change notifications).
+inventory_snapshot = get_snapshot()
 # After global UI state variables:
 ADMIN_WIPE_PASSWORD = os.environ.get("INVENTORY_WIPE_PASSWORD", "Zach")
 
@@ -59,26 +78,17 @@ def treeview_sort_column(tv, col, reverse):
     global sort_column, sort_reverse
     sort_column = col
     sort_reverse = reverse
-    data_list = [(tv.set(k, col), k) for k in tv.get_children("")]
-    try:
-        if col == "quantity":
-            data_list.sort(key=lambda x: int(x[0]), reverse=reverse)
-        elif col == "thickness":
-            data_list.sort(key=lambda x: float(x[0]) if x[0].replace('.', '', 1).isdigit()
-                           else x[0].lower(), reverse=reverse)
-        else:
-            data_list.sort(key=lambda x: x[0].lower(), reverse=reverse)
-    except (ValueError, TypeError):
-        data_list.sort(reverse=reverse)
-    for idx, (_, k) in enumerate(data_list):
-        tv.move(k, "", idx)
-    tv.heading(col, command=lambda: treeview_sort_column(tv, col, not reverse))
+    # Rows come back from the database already in this order.
+    refresh_table(current_filters, current_dimension_filters)
+
+def update_sort_headings(tv):
     for c in tv['columns']:
         label = "Sheet size" if c == "usable_scrap" else c.capitalize()
-        if c == col:
-            tv.heading(c, text=f"{label} {'▼' if reverse else '▲'}")
+        if c == sort_column:
+            tv.heading(c, text=f"{label} {'▼' if sort_reverse else '▲'}",
+                       command=lambda c=c: treeview_sort_column(tv, c, not sort_reverse))
         else:
-            tv.heading(c, text=label)
+            tv.heading(c, text=label, command=lambda c=c: treeview_sort_column(tv, c, False))
 
 # Mapping helpers for service-layer expectations
 def ui_row_to_service_tuple(row_vals):
@@ -102,20 +112,22 @@ def ui_row_to_adjust_tuple(row_vals):
         row_vals[5],  # location
     )
 
-def get_distinct_values(column):
-    try:
-        rows = fetch_all(f"SELECT DISTINCT {column} FROM inventory ORDER BY {column}")
-        return [r[0] for r in rows if r[0] is not None]
-    except Exception:
-        return []
-
 def refresh_comboboxes():
+    # One cached facet query for all entry comboboxes; the filter comboboxes
+    # only offer values that still exist under the other active filters.
+    try:
+        facets = get_facets()
+        filtered = get_facets(current_filters, current_dimension_filters) \
+            if (current_filters or current_dimension_filters) else facets
+    except Exception as e:
+        print(f"Facet query failed: {e}")
+        return
     for col, cb in entry_comboboxes.items():
         if isinstance(cb, ttk.Combobox):
-            cb['values'] = get_distinct_values(col)
+            cb['values'] = facet_values(facets, col)
     for col, cb in filter_comboboxes.items():
         if isinstance(cb, ttk.Combobox):
-            cb['values'] = [''] + get_distinct_values(col)
+            cb['values'] = [''] + facet_values(filtered, col)
 
 def get_field_values():
     return {
@@ -133,10 +145,16 @@ def get_field_values():
 # ------------------------------------------------------------------
 # Inventory CRUD
 # ------------------------------------------------------------------
+def show_dimension_counts(counts):
+    messagebox.showinfo(
+        "Success",
+        f"Dimension data updated for {counts['parsed']} record(s)\n"
+        f"Unparseable: {counts['failed']}  Blank: {counts['skipped']}"
+    )
+
 def extract_dimensions_from_database():
     try:
-        updated = extract_dimensions()
-        messagebox.showinfo("Success", f"Dimension data updated for {updated} record(s)")
+        show_dimension_counts(extract_dimensions())
     except Exception as e:
         messagebox.showerror("Error", f"Could not extract dimensions: {str(e)}")
 
@@ -187,9 +205,17 @@ def add_entry():
 # ------------------------------------------------------------------
 def setup_filter_section():
     global filter_comboboxes, length_min_entry, length_max_entry, width_min_entry, width_max_entry, current_filters
+    global thickness_min_entry, thickness_max_entry, current_dimension_filters, search_entry
     current_filters = {}
+    current_dimension_filters = {}
     for w in filter_frame.winfo_children():
         w.destroy()
+    search_frame = tk.Frame(filter_frame); search_frame.pack(fill="x", pady=2)
+    tk.Label(search_frame, text="Search:").pack(side="left", padx=5)
+    search_entry = tk.Entry(search_frame, width=40); search_entry.pack(side="left", padx=5)
+    search_entry.bind("<Return>", lambda e: apply_search())
+    tk.Button(search_frame, text="Search", command=apply_search).pack(side="left", padx=5)
+    tk.Button(search_frame, text="Clear", command=lambda: [search_entry.delete(0, tk.END), apply_search()]).pack(side="left")
     labels = [
         ("Shelf:", "shelf"), ("Thickness:", "thickness"), ("Metal Type:", "metal_type"),
         ("Dimensions:", "dimensions"), ("Location:", "location"),
@@ -220,11 +246,23 @@ def setup_filter_section():
     width_min_entry = tk.Entry(wf_inner, width=8); width_min_entry.pack(side="left", padx=2)
     tk.Label(wf_inner, text="Max:").pack(side="left", padx=(10, 0))
     width_max_entry = tk.Entry(wf_inner, width=8); width_max_entry.pack(side="left", padx=2)
+    tf = tk.Frame(dim_frame); tf.pack(side="left", padx=40)
+    tk.Label(tf, text="Thickness (in) Range:").pack(anchor="w")
+    tf_inner = tk.Frame(tf); tf_inner.pack(fill="x")
+    tk.Label(tf_inner, text="Min:").pack(side="left")
+    thickness_min_entry = tk.Entry(tf_inner, width=8); thickness_min_entry.pack(side="left", padx=2)
+    tk.Label(tf_inner, text="Max:").pack(side="left", padx=(10, 0))
+    thickness_max_entry = tk.Entry(tf_inner, width=8); thickness_max_entry.pack(side="left", padx=2)
     tk.Button(filter_frame, text="Apply Filter", command=apply_filter).pack(pady=5)
     tk.Button(filter_frame, text="Extract Dimensions", command=extract_dimensions_from_database).pack(pady=5)
 
+def apply_search():
+    global current_search
+    current_search = search_entry.get().strip()
+    refresh_table(current_filters, current_dimension_filters)
+
 def apply_filter():
-    global current_filters
+    global current_filters, current_dimension_filters
     current_filters = {c: cb.get() for c, cb in filter_comboboxes.items() if cb.get()}
     dimension_filters = {}
     try:
@@ -232,62 +270,110 @@ def apply_filter():
         if length_max_entry.get(): dimension_filters["length_max"] = float(length_max_entry.get())
         if width_min_entry.get():  dimension_filters["width_min"] = float(width_min_entry.get())
         if width_max_entry.get():  dimension_filters["width_max"] = float(width_max_entry.get())
+        if thickness_min_entry.get(): dimension_filters["thickness_min"] = float(thickness_min_entry.get())
+        if thickness_max_entry.get(): dimension_filters["thickness_max"] = float(thickness_max_entry.get())
     except ValueError:
         messagebox.showerror("Error", "Dimension range values must be numeric.")
         return
+    current_dimension_filters = dimension_filters
     refresh_table(current_filters, dimension_filters)
+    refresh_comboboxes()
 
 # ------------------------------------------------------------------
 # Table refresh
 # ------------------------------------------------------------------
-def build_inventory_query(filters=None, dimension_filters=None):
-    base = """SELECT barcode, shelf, thickness, metal_type, dimensions,
-                     location, quantity, usable_scrap, date, length, width
-              FROM inventory"""
-    clauses = []
-    params = []
-    if filters:
-        for k, v in filters.items():
-            clauses.append(f"{k} = %s")
-            params.append(v)
-    if dimension_filters:
-        mapping = {
-            "length_min": "length >= %s",
-            "length_max": "length <= %s",
-            "width_min": "width >= %s",
-            "width_max": "width <= %s"
-        }
-        for key, clause in mapping.items():
-            if key in dimension_filters:
-                clauses.append(clause)
-                params.append(dimension_filters[key])
-    if clauses:
-        base += " WHERE " + " AND ".join(clauses)
-    return base, params
+def restore_tree_view(tv, selected, top):
+    # Keep selection / scroll position across a redraw (rows are keyed by id).
+    keep = [iid for iid in selected if tv.exists(iid)]
+    if keep:
+        tv.selection_set(keep)
+    tv.yview_moveto(top)
+
+def view_values(row):
+    # Snapshot / query rows start with id; the table shows barcode .. date.
+    row_list = list(row[1:10])
+    if show_dimensions_in_feet:
+        length_val = row[10]; width_val = row[11]
+        if (length_val is None or width_val is None) and row[5]:
+            parsed = parse_dimensions(row[5])
+            if parsed:
+                length_val, width_val = parsed
+        if length_val and width_val:
+            length_str = inches_to_feet_inches(length_val)
+            width_str = inches_to_feet_inches(width_val)
+            original = row_list[4] or ""
+            row_list[4] = f"{original} ({length_str} x {width_str})"
+    return row_list
+
+def search_rows():
+    # Barcode / metal / dimensions / shelf / location search, best match first.
+    inventory_snapshot.sync()
+    hits = (inventory_snapshot.get(r[0]) for r in search_inventory(current_search))
+    return [r for r in hits if r]
+
+def current_view_rows():
+    """Every row the View tab matches (not just the pages loaded), in its order."""
+    if current_search:
+        return search_rows()
+    filters, dimension_filters = view_query
+    rows, key = [], None
+    while True:
+        page, key, _ = query_inventory(filters, dimension_filters, sort_column, sort_reverse,
+                                       key, limit=PAGE_SIZE * 10)
+        rows.extend(page)
+        if key is None:
+            return rows
+
+def update_page_status():
+    shown = len(tree.get_children())
+    if view_next_key is None:
+        view_page_label.config(text=f"{shown} rows")
+        load_more_btn.config(state="disabled")
+    else:
+        view_page_label.config(text=f"Showing {shown} of ~{max(view_total, shown + 1)}")
+        load_more_btn.config(state="normal")
 
 def refresh_table(filters=None, dimension_filters=None):
-    global show_dimensions_in_feet, sort_column, sort_reverse
+    """
+    Redraw the View tab. Without a search only the first page is read (sorted
+    in SQL); "Load more" appends the next one. A redraw keeps as many rows
+    as were loaded, so edits don't collapse the view.
+    """
+    global view_query, view_next_key, view_total
+    selected, top = tree.selection(), tree.yview()[0]
+    shown = len(tree.get_children())
     for row_id in tree.get_children():
         tree.delete(row_id)
     try:
-        query, params = build_inventory_query(filters, dimension_filters)
-        rows = fetch_all(query, params)
+        view_query = (filters, dimension_filters)
+        if current_search:
+            rows, view_next_key = search_rows(), None
+            view_total = len(rows)
+        else:
+            rows, view_next_key, view_total = query_inventory(
+                filters, dimension_filters, sort_column, sort_reverse,
+                limit=max(PAGE_SIZE, shown))
+        for row in rows:
+            # Row iid is the inventory id, so row actions can key on it.
+            tree.insert("", "end", iid=str(row[0]), values=view_values(row))
+        update_sort_headings(tree)
+        update_page_status()
+        restore_tree_view(tree, selected, top)
+    except Exception as e:
+        messagebox.showerror("Error", str(e))
+
+def load_more_rows():
+    global view_next_key
+    if view_next_key is None:
+        return
+    filters, dimension_filters = view_query
+    try:
+        rows, view_next_key, _ = query_inventory(
+            filters, dimension_filters, sort_column, sort_reverse, view_next_key)
         for row in rows:
-            row_list = list(row)
-            if show_dimensions_in_feet:
-                length_val = row[9]; width_val = row[10]
-                if (length_val is None or width_val is None) and row[4]:
-                    parsed = parse_dimensions(row[4])
-                    if parsed:
-                        length_val, width_val = parsed
-                if length_val and width_val:
-                    length_str = inches_to_feet_inches(length_val)
-                    width_str = inches_to_feet_inches(width_val)
-                    original = row_list[4] or ""
-                    row_list[4] = f"{original} ({length_str} x {width_str})"
-            tree.insert("", "end", values=row_list[:9])
-        if sort_column:
-            treeview_sort_column(tree, sort_column, sort_reverse)
+            if not tree.exists(str(row[0])):
+                tree.insert("", "end", iid=str(row[0]), values=view_values(row))
+        update_page_status()
     except Exception as e:
         messagebox.showerror("Error", str(e))
 
@@ -316,39 +402,33 @@ def delete_entry():
     except Exception as e:
         messagebox.showerror("Error", str(e))
 
-def increment_quantity():
+def adjust_selected_quantities(sign, title, prompt, reason):
     sel = tree.selection()
     if not sel:
-        messagebox.showwarning("No selection", "Select a row.")
+        messagebox.showwarning("No selection", "Select one or more rows.")
         return
-    ui_vals = tree.item(sel[0], "values")
-    amt = tk.simpledialog.askinteger("Add Quantity", "Amount to add:", minvalue=1)
+    amt = tk.simpledialog.askinteger(title, prompt, minvalue=1)
     if amt is None:
         return
     try:
-        base_tuple = ui_row_to_adjust_tuple(ui_vals)
-        adjust_quantity(base_tuple, amt)
-        messagebox.showinfo("Success", f"Added {amt}.")
-        refresh_table(current_filters)
+        # All selected rows in one statement / transaction.
+        results = adjust_quantities([(int(iid), sign * amt) for iid in sel], reason)
+        missing = len(sel) - len(results)
+        applied = sum(abs(r[2]) for r in results.values())
+        verb = "Added" if sign > 0 else "Removed"
+        msg = f"{verb} {applied} across {len(results)} item(s)."
+        if missing:
+            msg += f"\n{missing} item(s) no longer exist."
+        messagebox.showinfo("Success", msg)
+        refresh_table(current_filters, current_dimension_filters)
     except Exception as e:
         messagebox.showerror("Error", str(e))
 
+def increment_quantity():
+    adjust_selected_quantities(1, "Add Quantity", "Amount to add to each selected row:", "manual add")
+
 def decrement_quantity():
-    sel = tree.selection()
-    if not sel:
-        messagebox.showwarning("No selection", "Select a row.")
-        return
-    ui_vals = tree.item(sel[0], "values")
-    amt = tk.simpledialog.askinteger("Remove Quantity", "Amount to remove:", minvalue=1)
-    if amt is None:
-        return
-    try:
-        base_tuple = ui_row_to_adjust_tuple(ui_vals)
-        adjust_quantity(base_tuple, -amt)
-        messagebox.showinfo("Success", f"Removed {amt}.")
-        refresh_table(current_filters)
-    except Exception as e:
-        messagebox.showerror("Error", str(e))
+    adjust_selected_quantities(-1, "Remove Quantity", "Amount to remove from each selected row:", "manual remove")
 
 def fix_field():
     sel = tree.selection()
@@ -379,16 +459,20 @@ def fix_field():
         except ValueError:
             messagebox.showerror("Error", f"Stored quantity not numeric: {quantity}")
             return
-        sql = f"""
-            UPDATE inventory
-            SET {field} = %s
+        match = """
             WHERE shelf = %s AND thickness = %s AND metal_type = %s AND dimensions = %s
               AND location = %s AND quantity = %s AND usable_scrap = %s AND date = %s
         """
-        params = (new_val, shelf, thickness, metal_type, dimensions,
+        params = (shelf, thickness, metal_type, dimensions,
                   location, quantity_int, usable_scrap, date_val)
         try:
-            execute(sql, params)
+            if field == "quantity":
+                # Through the ledger, so the change is recorded as a movement.
+                rows = fetch_all(f"SELECT id FROM inventory {match}", params)
+                adjust_quantities([(item_id, int(new_val) - quantity_int) for (item_id,) in rows],
+                                  "fix field")
+            else:
+                execute(f"UPDATE inventory SET {field} = %s {match}", (new_val,) + params)
             messagebox.showinfo("Success", "Field updated.")
             dialog.destroy()
             refresh_table(current_filters)
@@ -404,11 +488,10 @@ def fix_field():
 def export_to_csv():
     try:
         if tree.get_children():
-            data = [tree.item(iid)['values'] for iid in tree.get_children()]
+            data = [view_values(row) for row in current_view_rows()]
             df = pd.DataFrame(data, columns=columns)
         else:
-            rows = fetch_inventory_rows_for_csv()
-            df = build_csv_dataframe(rows)
+            df = fetch_inventory_csv_dataframe()
         filename = filedialog.asksaveasfilename(
             defaultextension=".csv",
             filetypes=[("CSV files", "*.csv"), ("Excel files", "*.xlsx"), ("All files", "*.*")],
@@ -416,28 +499,24 @@ def export_to_csv():
         )
         if not filename:
             return
-        if filename.endswith(".xlsx"):
-            df.to_excel(filename, index=False)
-        else:
-            df.to_csv(filename, index=False, encoding="utf-8-sig")
+        save_frame(df, filename)
         messagebox.showinfo("Success", f"Exported: {filename}")
     except Exception as e:
         messagebox.showerror("Export Error", str(e))
 
 def export_to_pronest():
     try:
-        extract_dimensions_from_database()
         visible = []
         if tree.get_children():
-            for iid in tree.get_children():
-                v = tree.item(iid, 'values')
+            for row in current_view_rows():
                 visible.append({
-                    'shelf': v[1],
-                    'thickness': v[2],
-                    'metal_type': v[3],
-                    'dimensions': v[4]
+                    'shelf': row[2],
+                    'thickness': row[3],
+                    'metal_type': row[4],
+                    'dimensions': row[5]
                 })
-        df = export_inventory_pronest_dataframe(visible if visible else None)
+        df, counts = pronest_export(visible if visible else None)
+        show_dimension_counts(counts)
         if df is None or df.empty:
             messagebox.showwarning("No Data", "Nothing to export.")
             return
@@ -448,10 +527,7 @@ def export_to_pronest():
         )
         if not filename:
             return
-        if filename.endswith(".xlsx"):
-            df.to_excel(filename, index=False)
-        else:
-            df.to_csv(filename, index=False, encoding="utf-8-sig")
+        save_frame(df, filename)
         messagebox.showinfo("Success", f"ProNest export: {filename}")
     except Exception as e:
         messagebox.showerror("Export Error", str(e))
@@ -459,9 +535,15 @@ def export_to_pronest():
 def backup_database():
     backup_inventory()
 
+def show_import_progress(rows_read, totals):
+    view_page_label.config(
+        text=f"Importing: {rows_read} rows read, {totals['added']} added, {totals['updated']} updated")
+    root.update_idletasks()
+
 def import_csv_inventory():
     try:
-        run_import(refresh_table, refresh_comboboxes, load_barcode_items, current_filters)
+        run_import(refresh_table, refresh_comboboxes, load_barcode_items, current_filters,
+                   progress_fn=show_import_progress)
     except Exception as e:
         import traceback, io
         buf = io.StringIO()
@@ -510,13 +592,18 @@ def generate_and_show_barcode():
         return
     try:
         path = generate_scannable_barcode(bc, overwrite=True)
-        show_barcode_image()
+        show_barcode_image(force=True)
         messagebox.showinfo("Success", f"Generated: {os.path.basename(path)}")
     except Exception as e:
         messagebox.showerror("Error", str(e))
 
-def show_barcode_image():
+def show_barcode_image(force=False):
+    global shown_barcode_image
     bc = entry_comboboxes["barcode"].get().strip()
+    # FocusOut fires on every tab/click; only redraw when the code changed.
+    if bc == shown_barcode_image and not force:
+        return
+    shown_barcode_image = bc
     if not bc:
         barcode_image_label.config(image='', text='No barcode')
         return
@@ -656,8 +743,8 @@ def save_printable_barcode():
 
 def save_barcode_sheet():
     codes = []
-    for iid in tree.get_children():
-        val = tree.item(iid, "values")[0]
+    for row in current_view_rows() if tree.get_children() else ():
+        val = row[1]
         if val and val not in codes:
             codes.append(val)
     if not codes:
@@ -683,15 +770,50 @@ def save_barcode_sheet():
     except Exception as e:
         messagebox.showerror("Error", str(e))
 
+# ------------------------------------------------------------------
+# Dashboard tab
+# ------------------------------------------------------------------
+def refresh_dashboard():
+    """Totals, stock per metal / thickness / size and low stock (cached summary)."""
+    try:
+        threshold = int(low_stock_spin.get())
+    except ValueError:
+        threshold = LOW_STOCK_SHEETS
+    try:
+        totals = stock_totals(threshold)
+        dashboard_totals_label.config(text=(
+            f"Items: {totals['items']}    Sheets: {totals['sheets']}    "
+            f"Sq ft on hand: {totals['area_sq_ft']:,.2f}    "
+            f"Groups: {totals['groups']}    Low stock: {totals['low_stock_groups']}"
+        ))
+        for tv, groups in ((summary_tree, stock_summary()), (low_stock_tree, low_stock(threshold))):
+            selected, top = tv.selection(), tv.yview()[0]
+            tv.delete(*tv.get_children())
+            for g in groups:
+                tv.insert("", "end", iid="\x1f".join(g[:3]), values=g)
+            restore_tree_view(tv, selected, top)
+    except Exception as e:
+        messagebox.showerror("Error", f"Failed to load stock summary: {e}")
+
 # ------------------------------------------------------------------
 # Barcode tab (batch functions)
 # ------------------------------------------------------------------
+BARCODE_TAB_SORT = ("metal_type", "thickness")
+
+def barcode_values(row):
+    # barcode, shelf, thickness, metal_type, dimensions, quantity
+    return row[1:6] + row[7:8]
+
 def load_barcode_items():
+    # Redraws from the snapshot as it stands; poll_inventory_changes keeps it current.
+    selected, top = barcode_tree.selection(), barcode_tree.yview()[0]
     for r in barcode_tree.get_children():
         barcode_tree.delete(r)
     try:
-        for row in get_barcode_items():
-            barcode_tree.insert("", "end", values=row)
+        inventory_snapshot.ensure_loaded()
+        for row in inventory_snapshot.select(sort_by=BARCODE_TAB_SORT):
+            barcode_tree.insert("", "end", iid=str(row[0]), values=barcode_values(row))
+        restore_tree_view(barcode_tree, selected, top)
     except Exception as e:
         messagebox.showerror("Error", f"Failed to load barcode items: {e}")
 
@@ -835,7 +957,12 @@ def open_barcode_detail_popup(barcode_value: str):
             messagebox.showerror("Invalid Date", str(ve))
             return
         try:
+            # Quantity is saved as the change made in this popup, so edits
+            # from another station since it opened are kept.
+            qty_delta = int(updated.pop("quantity") or "0") - int(existing["quantity"])
             changed = update_inventory_item_by_id(item_id, updated)
+            if qty_delta:
+                changed = apply_delta(item_id, qty_delta, "item popup") or changed
             if changed:
                 messagebox.showinfo("Saved", "Item updated.")
             else:
@@ -988,9 +1115,11 @@ notebook.pack(fill='both', expand=True, padx=10, pady=10)
 add_edit_tab = ttk.Frame(notebook)
 view_tab = ttk.Frame(notebook)
 barcode_tab = ttk.Frame(notebook)
+dashboard_tab = ttk.Frame(notebook)
 notebook.add(add_edit_tab, text="Add/Edit")
 notebook.add(view_tab, text="View Inventory")
 notebook.add(barcode_tab, text="Barcodes")
+notebook.add(dashboard_tab, text="Dashboard")
 
 tk.Label(add_edit_tab, text="Environmental Pneumatics Inventory",
          font=("Arial", 14, "bold")).grid(row=0, column=0, columnspan=2, pady=10)
@@ -1012,7 +1141,8 @@ for idx, (label, key) in enumerate(entry_labels):
     if key == "barcode":
         ent = tk.Entry(add_edit_tab, width=25)
         ent.grid(row=idx + 1, column=1, padx=5, pady=2)
-        ent.bind("<Return>", lambda e: [scan_and_update_quantity(), show_barcode_image()])
+        # Enter = scan: straight to the popup; the image follows on FocusOut.
+        ent.bind("<Return>", lambda e: scan_and_update_quantity())
         ent.bind("<FocusOut>", lambda e: show_barcode_image())
         entry_comboboxes[key] = ent
     else:
@@ -1067,7 +1197,7 @@ tree_frame.pack(fill="both", expand=True, padx=5, pady=5)
 tree_scroll_y = ttk.Scrollbar(tree_frame); tree_scroll_y.pack(side="right", fill="y")
 tree_scroll_x = ttk.Scrollbar(tree_frame, orient="horizontal"); tree_scroll_x.pack(side="bottom", fill="x")
 
-tree = ttk.Treeview(tree_frame, columns=columns, show="headings",
+tree = ttk.Treeview(tree_frame, columns=columns, show="headings", selectmode="extended",
                     yscrollcommand=tree_scroll_y.set, xscrollcommand=tree_scroll_x.set)
 for col in columns:
     hdr = "Sheet size" if col == "usable_scrap" else col.capitalize()
@@ -1086,6 +1216,10 @@ tk.Button(action_frame, text="Fix Field", command=fix_field).pack(side="left", p
 dimension_format_btn = tk.Button(action_frame, text="Show Dimensions in Feet/Inches",
                                  command=toggle_dimension_format)
 dimension_format_btn.pack(side="left", padx=5)
+load_more_btn = tk.Button(action_frame, text="Load more", command=load_more_rows, state="disabled")
+load_more_btn.pack(side="right", padx=5)
+view_page_label = tk.Label(action_frame, text="")
+view_page_label.pack(side="right", padx=5)
 
 export_frame = tk.Frame(view_tab); export_frame.pack(fill="x", padx=5, pady=5)
 tk.Button(export_frame, text="Export CSV", command=export_to_csv).pack(side="left", padx=5)
@@ -1133,32 +1267,130 @@ tk.Button(barcode_btn_frame, text="Force Rebuild", command=force_rebuild_all_bar
 tk.Button(export_frame, text="Import CSV", command=import_csv_inventory,
           bg="#444", fg="white").pack(side="left", padx=5)
 
+# Dashboard tab
+dashboard_top = ttk.Frame(dashboard_tab)
+dashboard_top.pack(fill="x", padx=10, pady=(10, 0))
+dashboard_totals_label = tk.Label(dashboard_top, text="", font=("Arial", 10, "bold"))
+dashboard_totals_label.pack(side="left")
+tk.Button(dashboard_top, text="Refresh", command=refresh_dashboard).pack(side="right", padx=5)
+low_stock_spin = tk.Spinbox(dashboard_top, from_=0, to=1000, width=5, command=refresh_dashboard)
+low_stock_spin.delete(0, "end"); low_stock_spin.insert(0, str(LOW_STOCK_SHEETS))
+low_stock_spin.bind("<Return>", lambda e: refresh_dashboard())
+low_stock_spin.pack(side="right")
+tk.Label(dashboard_top, text="Low stock at or below (sheets):").pack(side="right", padx=5)
+
+def make_summary_tree(title, height):
+    frame = ttk.LabelFrame(dashboard_tab, text=title)
+    frame.pack(fill="both", expand=True, padx=10, pady=5)
+    headings = ("Metal type", "Thickness", "Size", "Items", "Sheets", "Sq ft")
+    tv = ttk.Treeview(frame, columns=SUMMARY_COLUMNS, show="headings", height=height)
+    for col, hdr in zip(SUMMARY_COLUMNS, headings):
+        tv.heading(col, text=hdr)
+        tv.column(col, width=110, anchor="e" if col in ("items", "sheets", "area_sq_ft") else "w")
+    scroll = ttk.Scrollbar(frame, orient="vertical", command=tv.yview)
+    tv.configure(yscrollcommand=scroll.set)
+    tv.pack(fill="both", expand=True, side="left")
+    scroll.pack(side="right", fill="y")
+    return tv
+
+summary_tree = make_summary_tree("Stock by metal / thickness / size", 14)
+low_stock_tree = make_summary_tree("Low stock", 7)
+
 # ------------------------------------------------------------------
 # DB setup
 # ------------------------------------------------------------------
 def setup_database_if_needed():
+    """Bring the schema up to date; False (after telling the user) if it can't be."""
+    try:
+        applied = ensure_schema()
+        if applied:
+            print(f"Database schema migrated to version {applied[-1]}.")
+        return True
+    except SchemaError as e:
+        # e.g. duplicate barcodes blocking the unique index; the message lists them.
+        messagebox.showerror("Database Upgrade Blocked", str(e))
+    except Exception as e:
+        messagebox.showerror("Database Setup Error", str(e))
+    return False
+
+def view_order_columns():
+    """Columns deciding which rows the View tab shows and in what order."""
+    filters, dimension_filters = view_query
+    cols = set(filters or ()) | {RANGE_FILTERS[k][0] for k in (dimension_filters or ())}
+    if sort_column:
+        cols.update(SORT_KEYS[sort_column])
+    if current_search:
+        cols.update(SEARCH_FIELDS)
+    return cols
+
+def apply_view_changes(changes):
+    # Rows added, deleted, or edited in a filtered / sorted / searched column
+    # can change which rows are shown: re-query. Other edits are redrawn in place.
+    if changes.reloaded or changes.added or changes.deleted or changes.columns & view_order_columns():
+        refresh_table(*view_query)
+        return
+    for item_id in changes.changed:
+        row = inventory_snapshot.get(item_id)
+        if row and tree.exists(str(item_id)):
+            tree.item(str(item_id), values=view_values(row))
+
+def apply_barcode_changes(changes):
+    if changes.reloaded:
+        load_barcode_items()
+        return
+    for item_id in changes.deleted:
+        if barcode_tree.exists(str(item_id)):
+            barcode_tree.delete(str(item_id))
+    sort_cols = {c for col in BARCODE_TAB_SORT for c in SORT_KEYS[col]}
+    if not changes.added and not changes.columns & sort_cols:
+        for item_id in changes.changed:
+            row = inventory_snapshot.get(item_id)
+            if row and barcode_tree.exists(str(item_id)):
+                barcode_tree.item(str(item_id), values=barcode_values(row))
+        return
+    # Re-place the changed rows: taken out, then put back in final order, so
+    # each one's index counts only rows already in place before it.
+    position = {row[0]: n for n, row in enumerate(inventory_snapshot.select(sort_by=BARCODE_TAB_SORT))}
+    moved = sorted((i for i in changes.changed if i in position), key=position.get)
+    shown = [str(i) for i in moved if barcode_tree.exists(str(i))]
+    if shown:
+        barcode_tree.detach(*shown)
+    for item_id in moved:
+        row, iid = inventory_snapshot.get(item_id), str(item_id)
+        if barcode_tree.exists(iid):
+            barcode_tree.move(iid, "", position[item_id])
+            barcode_tree.item(iid, values=barcode_values(row))
+        else:
+            barcode_tree.insert("", position[item_id], iid=iid, values=barcode_values(row))
+
+def poll_inventory_changes():
+    """Pick up rows changed by this or another station and redraw just those."""
     try:
-        execute("""
-            DO $$
-            BEGIN
-                IF NOT EXISTS (
-                    SELECT 1 FROM information_schema.columns
-                    WHERE table_name='inventory' AND column_name='id'
-                ) THEN
-                    ALTER TABLE inventory ADD COLUMN id SERIAL PRIMARY KEY;
-                END IF;
-            END
-            $$;
-        """)
+        changes = inventory_snapshot.take_changes() if inventory_snapshot.loaded else None
+        if changes:
+            apply_view_changes(changes)
+            apply_barcode_changes(changes)
+            if changes.columns & set(FACET_COLUMNS):
+                refresh_comboboxes()
+            if changes.columns & set(SUMMARY_SOURCE_COLUMNS):
+                refresh_dashboard()
     except Exception as e:
-        print(f"Database setup error: {e}")
+        print(f"Inventory sync error: {e}")
+    root.after(SNAPSHOT_POLL_MS, poll_inventory_changes)
 
-setup_database_if_needed()
+# A half-migrated schema would fail every view and background query: stop here.
+if not setup_database_if_needed():
+    root.destroy()
+    sys.exit(1)
+start_ledger_maintenance()
+start_history_maintenance()
 
 # Initial loads
 load_barcode_items()
 refresh_table()
 refresh_comboboxes()
+refresh_dashboard()
+root.after(SNAPSHOT_POLL_MS, poll_inventory_changes)
 
 if __name__ == "__main__":
     root.mainloop()
\ No newline at end of file
@@ -1,3 +1,5 @@
+import os
+
 # Central place for database credentials.
 # Later: move sensitive values to environment variables.
 DB_CONFIG = {
@@ -6,4 +8,28 @@ DB_CONFIG = {
     "password": "MANman1@6",   # TODO: pull from env (e.g. os.environ.get("INV_DB_PASS"))
     "host": "192.168.0.90",
     "port": "5432",
-}
\ No newline at end of file
+}
+
+# Connection pool used by db.connection (see db/pool.py).
+POOL_CONFIG = {
+    "minconn": 1,
+    "maxconn": 8,
+    "max_idle_seconds": 300,    # close and replace connections idle longer than this
+    "health_check_after": 30,   # ping connections idle longer than this before reuse
+    "checkout_timeout": 10,     # seconds to wait when all maxconn connections are busy
+}
+
+# Statement timing and slow-query log (see db/instrumentation.py).
+QUERY_STATS_CONFIG = {
+    "enabled": True,
+    "slow_query_ms": 250,            # log statements at least this slow; None disables
+    "samples_per_statement": 256,    # recent latencies kept per statement for p95
+    "dump_path": None,               # e.g. "query_stats.json" to dump stats periodically
+    "dump_interval_seconds": 300,
+}
+
+# "postgres" (DB_CONFIG above) or "sqlite" for a local database file - handy
+# offline or for benchmarks without a server. SQLITE_PATH ":memory:" gives a
+# throwaway in-process database. Both can be overridden from the environment.
+DB_BACKEND = os.environ.get("INV_DB_BACKEND", "postgres").lower()
+SQLITE_PATH = os.environ.get("INV_SQLITE_PATH", "inventory_local.db")
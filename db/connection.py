@@ -1,21 +1,113 @@
+import atexit
+import threading
 import psycopg2
 from contextlib import contextmanager
-from .config import DB_CONFIG
+from .config import DB_CONFIG, POOL_CONFIG, DB_BACKEND, SQLITE_PATH
+from .instrumentation import TimedCursor, start_stats_dump, stop_stats_dump
+from .pool import ConnectionPool
+
+_pool = None
+_pool_lock = threading.Lock()
+# Connection/session bound to this thread by db.transaction.transaction().
+_local = threading.local()
+
+def is_sqlite():
+    return DB_BACKEND == "sqlite"
+
+def _connect():
+    if is_sqlite():
+        from . import sqlite_backend
+        return sqlite_backend.connect(SQLITE_PATH)
+    return psycopg2.connect(cursor_factory=TimedCursor, **DB_CONFIG)
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(_connect, **POOL_CONFIG)
+                start_stats_dump()
+    return _pool
+
+def get_pool_stats():
+    return get_pool().stats()
+
+def close_pool():
+    global _pool
+    stop_stats_dump()
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+atexit.register(close_pool)
+
+def bind_transaction(conn, session):
+    _local.conn = conn
+    _local.session = session
+
+def release_transaction():
+    _local.conn = None
+    _local.session = None
+
+def current_session():
+    """The Session of the transaction() active on this thread, or None."""
+    return getattr(_local, "session", None)
 
 @contextmanager
 def get_connection():
-    conn = psycopg2.connect(**DB_CONFIG)
+    shared = getattr(_local, "conn", None)
+    if shared is not None:
+        # Inside transaction(): reuse its connection; it owns commit/rollback.
+        yield shared
+        return
+    pool = get_pool()
+    conn = pool.getconn()
+    broken = False
     try:
         yield conn
         conn.commit()
-    except Exception:
-        conn.rollback()
+    except Exception as e:
+        broken = conn.closed or isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
         raise
     finally:
-        conn.close()
+        pool.putconn(conn, discard=broken)
+
+def open_listener(channel):
+    """
+    Dedicated autocommit connection LISTENing on channel (Postgres only).
+    Not pooled: it stays open while the caller drains it with drain_notifications().
+    """
+    conn = psycopg2.connect(**DB_CONFIG)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f"LISTEN {channel}")
+    return conn
+
+def drain_notifications(conn):
+    """
+    Payloads received on a listener connection since the last call, without
+    blocking. Returns None (and closes conn) if the connection was lost, so
+    the caller knows notifications may have been missed.
+    """
+    try:
+        conn.poll()
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        if not conn.closed:
+            conn.close()
+        return None
+    payloads = [n.payload for n in conn.notifies]
+    conn.notifies.clear()
+    return payloads
 
 @contextmanager
 def get_cursor():
     with get_connection() as conn:
         with conn.cursor() as cur:
-            yield cur
\ No newline at end of file
+            yield cur
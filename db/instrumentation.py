@@ -0,0 +1,195 @@
+"""
+Statement timing for everything that runs on a pooled connection.
+
+Pooled connections use TimedCursor, so fetch_all/fetch_one/execute, the
+bulk helpers and raw get_cursor() users are all measured without changes.
+Statistics are grouped by normalized SQL text (literals and VALUES lists
+folded) plus the first call site outside the db package.
+
+    get_query_stats()         -> list of dicts, slowest total first
+    dump_query_stats(path)    -> write the same snapshot as JSON
+    start_stats_dump(...)     -> dump periodically on a background thread
+"""
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from psycopg2 import extensions
+
+from utils.periodic import PeriodicTask
+from .config import QUERY_STATS_CONFIG
+
+slow_log = logging.getLogger("inventory.db.slow")
+
+_lock = threading.Lock()
+_stats = {}
+_dump_task = None
+
+# ------------------------------------------------------------------
+# Normalization
+# ------------------------------------------------------------------
+_VALUES_RE = re.compile(
+    r"\bVALUES\s*\((?:[^()']|'(?:[^']|'')*')*\)(?:\s*,\s*\((?:[^()']|'(?:[^']|'')*')*\))*",
+    re.IGNORECASE
+)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%s|%\(\w+\)s")
+_WS_RE = re.compile(r"\s+")
+
+def normalize_sql(sql):
+    if isinstance(sql, bytes):
+        sql = sql.decode("utf-8", "replace")
+    elif not isinstance(sql, str):
+        sql = str(sql)
+    sql = _VALUES_RE.sub("VALUES (...)", sql)
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _PLACEHOLDER_RE.sub("?", sql)
+    return _WS_RE.sub(" ", sql).strip()
+
+def params_shape(params):
+    """Describe parameters without logging their values."""
+    if params is None:
+        return "none"
+    if isinstance(params, dict):
+        return "dict(" + ", ".join(sorted(params)) + ")"
+    if isinstance(params, (list, tuple)):
+        return f"{type(params).__name__}[{len(params)}](" + ", ".join(
+            "None" if p is None else type(p).__name__ for p in params
+        ) + ")"
+    return type(params).__name__
+
+_SKIP_PREFIXES = ("db.", "contextlib", "psycopg2")
+
+def _call_site():
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if not module.startswith(_SKIP_PREFIXES):
+            return f"{module}.{frame.f_code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return "?"
+
+# ------------------------------------------------------------------
+# Recording
+# ------------------------------------------------------------------
+def record(sql, params, seconds, rows, error=False):
+    if not QUERY_STATS_CONFIG.get("enabled", True):
+        return
+    text = normalize_sql(sql)
+    site = _call_site()
+    ms = seconds * 1000.0
+    with _lock:
+        entry = _stats.get((text, site))
+        if entry is None:
+            entry = _stats[(text, site)] = {
+                "count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0,
+                "samples": deque(maxlen=QUERY_STATS_CONFIG.get("samples_per_statement", 256)),
+            }
+        entry["count"] += 1
+        entry["total_ms"] += ms
+        entry["max_ms"] = max(entry["max_ms"], ms)
+        entry["samples"].append(ms)
+        if error:
+            entry["errors"] += 1
+        elif rows and rows > 0:
+            entry["rows"] += rows
+    threshold = QUERY_STATS_CONFIG.get("slow_query_ms")
+    if threshold is not None and ms >= threshold:
+        slow_log.warning("Slow query %.1f ms at %s: %s [params: %s]",
+                         ms, site, text, params_shape(params))
+
+class TimedCursor(extensions.cursor):
+    """psycopg2 cursor that reports every statement to record()."""
+
+    def _timed(self, method, query, params, *args):
+        start = time.perf_counter()
+        try:
+            result = method(query, params, *args) if args else method(query, params)
+        except Exception:
+            record(query, params, time.perf_counter() - start, None, error=True)
+            raise
+        record(query, params, time.perf_counter() - start, self.rowcount)
+        return result
+
+    def execute(self, query, vars=None):
+        return self._timed(super().execute, query, vars)
+
+    def executemany(self, query, vars_list):
+        vars_list = list(vars_list)
+        return self._timed(super().executemany, query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._timed(super().copy_expert, sql, file, size)
+
+# ------------------------------------------------------------------
+# Reporting
+# ------------------------------------------------------------------
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+def get_query_stats():
+    """Snapshot of per-statement statistics, largest total time first."""
+    with _lock:
+        items = [(key, dict(entry, samples=list(entry["samples"]))) for key, entry in _stats.items()]
+    out = []
+    for (text, site), e in items:
+        samples = sorted(e["samples"])
+        out.append({
+            "sql": text,
+            "site": site,
+            "count": e["count"],
+            "errors": e["errors"],
+            "rows": e["rows"],
+            "total_ms": round(e["total_ms"], 3),
+            "avg_ms": round(e["total_ms"] / e["count"], 3) if e["count"] else 0.0,
+            "p95_ms": round(_percentile(samples, 95), 3),
+            "max_ms": round(e["max_ms"], 3),
+        })
+    out.sort(key=lambda s: s["total_ms"], reverse=True)
+    return out
+
+def reset_query_stats():
+    with _lock:
+        _stats.clear()
+
+def dump_query_stats(path):
+    payload = {"generated_at": datetime.now().isoformat(timespec="seconds"),
+               "statements": get_query_stats()}
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp, path)
+    return path
+
+def start_stats_dump(path=None, interval=None):
+    """Dump stats to `path` every `interval` seconds (defaults from QUERY_STATS_CONFIG)."""
+    global _dump_task
+    path = path or QUERY_STATS_CONFIG.get("dump_path")
+    interval = interval or QUERY_STATS_CONFIG.get("dump_interval_seconds", 300)
+    if not path:
+        return None
+    stop_stats_dump()
+    _dump_task = PeriodicTask(lambda: dump_query_stats(path), interval, name="query-stats-dump").start()
+    return _dump_task
+
+def stop_stats_dump():
+    global _dump_task
+    if _dump_task is not None:
+        _dump_task.stop(run_last=True)
+        _dump_task = None
+
+__all__ = [
+    "TimedCursor", "normalize_sql", "get_query_stats", "reset_query_stats",
+    "dump_query_stats", "start_stats_dump", "stop_stats_dump",
+]
@@ -0,0 +1,174 @@
+"""
+Thread-safe connection pool used behind db.connection.get_connection().
+
+Idle connections are reused newest-first so the warmest socket is picked up
+again. Connections that sat idle longer than `health_check_after` seconds are
+pinged before being handed out, and ones idle longer than `max_idle_seconds`
+are closed and replaced instead of reused.
+"""
+import threading
+import time
+
+from psycopg2 import extensions
+
+
+class PoolError(RuntimeError):
+    """Raised when the pool is closed or no connection frees up in time."""
+
+
+class ConnectionPool:
+    def __init__(self, connect, minconn=1, maxconn=8, max_idle_seconds=300,
+                 health_check_after=30, checkout_timeout=10):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Pool sizes must satisfy 0 <= minconn <= maxconn, maxconn >= 1")
+        self._connect = connect
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.max_idle_seconds = max_idle_seconds
+        self.health_check_after = health_check_after
+        self.checkout_timeout = checkout_timeout
+
+        self._cond = threading.Condition()
+        self._idle = []          # [(conn, last_used_monotonic)], newest last
+        self._in_use = 0
+        self._closed = False
+        self._counters = {
+            "created": 0,
+            "reused": 0,
+            "recycled": 0,
+            "discarded": 0,
+            "failed_checks": 0,
+            "waits": 0,
+            "timeouts": 0,
+        }
+        for _ in range(minconn):
+            self._idle.append((self._new_connection(), time.monotonic()))
+
+    # ------------------------------------------------------------------
+    # Checkout / return
+    # ------------------------------------------------------------------
+    def getconn(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError("Connection pool is closed.")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._in_use < self.maxconn:
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters["timeouts"] += 1
+                    raise PoolError(
+                        f"No database connection available after {self.checkout_timeout}s "
+                        f"(maxconn={self.maxconn})."
+                    )
+                self._counters["waits"] += 1
+                self._cond.wait(remaining)
+            self._in_use += 1
+
+        # Network I/O happens outside the lock.
+        try:
+            if conn is None:
+                return self._new_connection()
+            return self._checked(conn, last_used)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def putconn(self, conn, discard=False):
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            self._in_use -= 1
+            if discard or conn.closed or self._closed or len(self._idle) >= self.maxconn:
+                self._close_quietly(conn)
+                self._counters["discarded"] += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+                self._prune_idle()
+            self._cond.notify()
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+    def stats(self):
+        with self._cond:
+            out = dict(self._counters)
+            out.update({
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "size": self._in_use + len(self._idle),
+                "minconn": self.minconn,
+                "maxconn": self.maxconn,
+                "closed": self._closed,
+            })
+            return out
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _new_connection(self):
+        conn = self._connect()
+        with self._cond:
+            self._counters["created"] += 1
+        return conn
+
+    def _checked(self, conn, last_used):
+        idle_for = time.monotonic() - last_used
+        if conn.closed or idle_for > self.max_idle_seconds:
+            self._close_quietly(conn)
+            with self._cond:
+                self._counters["recycled"] += 1
+            return self._new_connection()
+        if idle_for > self.health_check_after:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except Exception:
+                self._close_quietly(conn)
+                with self._cond:
+                    self._counters["failed_checks"] += 1
+                return self._new_connection()
+        with self._cond:
+            self._counters["reused"] += 1
+        return conn
+
+    def _prune_idle(self):
+        # Caller holds the lock. Oldest idle connections sit at the front.
+        now = time.monotonic()
+        while len(self._idle) > self.minconn:
+            conn, last_used = self._idle[0]
+            if now - last_used <= self.max_idle_seconds:
+                break
+            self._idle.pop(0)
+            self._close_quietly(conn)
+            self._counters["recycled"] += 1
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+__all__ = ["ConnectionPool", "PoolError"]
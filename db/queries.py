@@ -1,4 +1,15 @@
-from .connection import get_cursor
+import io
+import itertools
+from psycopg2.extras import execute_values as _execute_values
+from .connection import get_connection, get_cursor, is_sqlite
+
+# Rows per round trip for the bulk helpers below.
+DEFAULT_PAGE_SIZE = 500
+DEFAULT_COPY_PAGE_SIZE = 5000
+# Rows pulled per round trip by fetch_iter.
+DEFAULT_ITER_BATCH_SIZE = 1000
+
+_cursor_names = itertools.count(1)
 
 def fetch_all(sql, params=()):
     with get_cursor() as cur:
@@ -13,4 +24,206 @@ def fetch_one(sql, params=()):
 def execute(sql, params=()):
     with get_cursor() as cur:
         cur.execute(sql, params)
-        return cur.rowcount
\ No newline at end of file
+        return cur.rowcount
+
+def fetch_iter(sql, params=(), batch_size=DEFAULT_ITER_BATCH_SIZE):
+    """
+    Generator over a server-side (named) cursor: rows arrive batch_size at a
+    time, so memory stays bounded and the first rows are available before
+    the whole result has been read. The connection is held (and the
+    transaction kept open) until the generator is exhausted or closed;
+    closing it early rolls the read transaction back.
+    """
+    with get_connection() as conn:
+        with conn.cursor(name=f"fetch_iter_{next(_cursor_names)}") as cur:
+            cur.itersize = batch_size
+            cur.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+
+def table_columns(table):
+    """Column names of `table` in table order."""
+    if is_sqlite():
+        return [row[1] for row in fetch_all(f"PRAGMA table_info({table})")]
+    rows = fetch_all("""
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_name = %s
+        ORDER BY ordinal_position
+    """, (table,))
+    return [r[0] for r in rows]
+
+# ------------------------------------------------------------------
+# DataFrames
+# ------------------------------------------------------------------
+# Postgres type OID -> read_csv dtype; dates/timestamps go to parse_dates,
+# anything else is read as text.
+_FRAME_DTYPES = {
+    16: "boolean",                               # bool
+    20: "Int64", 21: "Int64", 23: "Int64",       # int8, int2, int4
+    700: "float64", 701: "float64", 1700: "float64",  # float4, float8, numeric
+}
+_FRAME_DATE_OIDS = {1082, 1114, 1184}            # date, timestamp, timestamptz
+
+def fetch_frame(sql, params=(), dtypes=None):
+    """
+    Run a SELECT and return a pandas DataFrame.
+
+    On Postgres the result is streamed with COPY (query) TO STDOUT as CSV and
+    parsed by pandas.read_csv in C, so no Python object is built per cell.
+    Column dtypes follow the result's column types (integers as nullable
+    Int64, numerics as float64, dates parsed, text as str; NULL -> NaN/NA).
+    `dtypes` overrides the dtype of individual columns.
+    """
+    import pandas as pd
+
+    query = sql.strip().rstrip(";")
+    with get_cursor() as cur:
+        if is_sqlite():
+            cur.execute(query, params)
+            cols = [d[0] for d in cur.description]
+            df = pd.DataFrame.from_records(cur.fetchall(), columns=cols)
+            return df.astype(dtypes) if dtypes else df
+        query = cur.mogrify(query, params).decode()
+        # Zero-row run of the same query: column names and types only.
+        cur.execute(f"SELECT * FROM ({query}) AS q LIMIT 0")
+        read_dtypes, parse_dates = {}, []
+        for col in cur.description:
+            if col.type_code in _FRAME_DATE_OIDS:
+                parse_dates.append(col.name)
+            else:
+                read_dtypes[col.name] = _FRAME_DTYPES.get(col.type_code, str)
+        read_dtypes.update(dtypes or {})
+        buf = io.BytesIO()
+        # NULL gets its own marker so empty strings stay empty strings.
+        cur.copy_expert(
+            f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true, NULL '\\N')", buf
+        )
+    buf.seek(0)
+    return pd.read_csv(buf, dtype=read_dtypes, parse_dates=parse_dates,
+                       keep_default_na=False, na_values=["\\N"], encoding="utf-8")
+
+# ------------------------------------------------------------------
+# Bulk writes
+# All pages of one call run in a single transaction; each helper returns
+# the affected row count of every page sent, in order.
+# ------------------------------------------------------------------
+def _pages(rows, page_size):
+    if page_size < 1:
+        raise ValueError("page_size must be >= 1")
+    page = []
+    for row in rows:
+        page.append(row)
+        if len(page) >= page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+def execute_values(sql, rows, template=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Multi-row VALUES statement, e.g.
+        execute_values("INSERT INTO inventory (shelf, quantity) VALUES %s", rows)
+    `sql` must contain a single %s where the VALUES list goes.
+    """
+    counts = []
+    with get_cursor() as cur:
+        for page in _pages(rows, page_size):
+            if is_sqlite():
+                _sqlite_values(cur, sql, page, template)
+            else:
+                _execute_values(cur, sql, page, template=template, page_size=len(page))
+            counts.append(cur.rowcount)
+    return counts
+
+def _sqlite_values(cur, sql, page, template):
+    # No mogrify on SQLite: expand the VALUES slot into placeholders instead.
+    row_sql = template or "(" + ", ".join(["%s"] * len(page[0])) + ")"
+    values_sql = ", ".join([row_sql] * len(page))
+    head, tail = sql.split("%s", 1)
+    cur.execute(head + values_sql + tail, [v for row in page for v in row])
+
+def _copy_field(value):
+    # CSV COPY: an unquoted empty field is NULL, a quoted one is ''.
+    if value is None:
+        return ""
+    return '"' + str(value).replace('"', '""') + '"'
+
+def copy_rows(table, columns, rows, page_size=DEFAULT_COPY_PAGE_SIZE):
+    """Append rows with COPY FROM STDIN. No conflict handling: plain appends only."""
+    col_sql = ", ".join(columns)
+    if is_sqlite():
+        insert_sql = f"INSERT INTO {table} ({col_sql}) VALUES ({', '.join(['%s'] * len(columns))})"
+        return _sqlite_many(insert_sql, rows, page_size)
+    copy_sql = f"COPY {table} ({col_sql}) FROM STDIN WITH (FORMAT csv)"
+    counts = []
+    with get_cursor() as cur:
+        for page in _pages(rows, page_size):
+            buf = io.StringIO()
+            for row in page:
+                buf.write(",".join(_copy_field(v) for v in row))
+                buf.write("\n")
+            buf.seek(0)
+            cur.copy_expert(copy_sql, buf)
+            counts.append(cur.rowcount)
+    return counts
+
+def bulk_update(table, key_column, columns, updates, casts=None, page_size=DEFAULT_PAGE_SIZE,
+                where=None, returning=None):
+    """
+    UPDATE many rows from a list of (key, (value, ...)) tuples, one statement per page:
+        bulk_update("inventory", "id", ["barcode"], [(12, ("14GG410",)), ...])
+    `casts` maps column -> SQL type for values Postgres cannot infer from a
+    VALUES list (dates, all-NULL columns), e.g. {"date": "date"}.
+    `where` is an extra condition on the target rows, which are aliased t.
+    `returning` (column names of the target) returns the updated rows'
+    values instead of per-page counts, e.g. to learn which rows `where` let through.
+    Keys should be unique within one call.
+    """
+    extra = f" AND ({where})" if where else ""
+    if is_sqlite():
+        # No UPDATE ... FROM (VALUES) column aliases; per-row statements are
+        # cheap in-process.
+        set_sql = ", ".join(f"{c} = %s" for c in columns)
+        sql = f"UPDATE {table} AS t SET {set_sql} WHERE {key_column} = %s{extra}"
+        params = (tuple(values) + (key,) for key, values in updates)
+        if not returning:
+            return _sqlite_many(sql, params, page_size)
+        sql += f" RETURNING {', '.join(returning)}"
+        with get_cursor() as cur:
+            out = []
+            for row_params in params:
+                cur.execute(sql, row_params)
+                out += cur.fetchall()
+            return out
+    casts = casts or {}
+    all_cols = [key_column] + list(columns)
+    set_sql = ", ".join(f"{c} = v.{c}" for c in columns)
+    sql = (
+        f"UPDATE {table} AS t SET {set_sql} "
+        f"FROM (VALUES %s) AS v({', '.join(all_cols)}) "
+        f"WHERE t.{key_column} = v.{key_column}{extra}"
+    )
+    template = "(" + ", ".join(
+        f"%s::{casts[c]}" if c in casts else "%s" for c in all_cols
+    ) + ")"
+    rows = ((key,) + tuple(values) for key, values in updates)
+    if not returning:
+        return execute_values(sql, rows, template=template, page_size=page_size)
+    sql += " RETURNING " + ", ".join(f"t.{c}" for c in returning)
+    out = []
+    with get_cursor() as cur:
+        for page in _pages(rows, page_size):
+            out += _execute_values(cur, sql, page, template=template, page_size=len(page), fetch=True)
+    return out
+
+def _sqlite_many(sql, rows, page_size):
+    counts = []
+    with get_cursor() as cur:
+        for page in _pages(rows, page_size):
+            cur.executemany(sql, page)
+            counts.append(cur.rowcount)
+    return counts
@@ -0,0 +1,781 @@
+"""
+Versioned schema migrations for the inventory database.
+
+ensure_schema() reads the version recorded in schema_version and applies
+only the migrations above it, each in its own transaction under an
+advisory lock (so two app instances starting together don't race). When
+the schema is already current it costs one small query per process and no
+DDL or information_schema checks run at all.
+
+Add new migrations at the end of MIGRATIONS with the next version number;
+never edit one that has shipped. A step is either an SQL string, a
+callable taking the open cursor, or a (backend, step) pair that only runs
+on that backend ("postgres" or "sqlite"). SQL strings are written for
+Postgres; the SQLite backend translates them (see db/sqlite_backend.py).
+"""
+import logging
+from datetime import date
+
+from utils.parsing import GAUGE_TO_INCHES, FRACTION_TO_INCHES
+from .config import DB_BACKEND
+from .connection import get_cursor, is_sqlite
+
+# Arbitrary constant identifying the migration advisory lock.
+SCHEMA_LOCK_ID = 7301945
+
+# NOTIFY channel carrying the id of every changed inventory row ('*' after
+# TRUNCATE). SQLite appends to the inventory_changes table instead.
+INVENTORY_CHANGES_CHANNEL = "inventory_changes"
+
+# Text searched by services.inventory_service.search_inventory(); the pg_trgm
+# index from migration 8 is built on exactly this expression.
+SEARCH_FIELDS = ("barcode", "metal_type", "dimensions", "shelf", "location")
+SEARCH_DOCUMENT_SQL = "lower(" + " || ' ' || ".join(f"coalesce({f}, '')" for f in SEARCH_FIELDS) + ")"
+SEARCH_INDEX = "idx_inventory_search_trgm"
+
+# inventory_summary (migration 9): one row per metal_type x thickness x size
+# (the dimensions text), NULLs grouped as ''. Sheet area is quantity x
+# length x width in square inches; rows without parsed dimensions add 0.
+SUMMARY_AREA_SQL = "COALESCE({t}.quantity, 0) * COALESCE({t}.length * {t}.width, 0)"
+
+# inventory_history (migration 10): on Postgres one partition per calendar
+# month (UTC) named like inventory_history_y2026m03, plus a default one.
+HISTORY_PARTITION_PREFIX = "inventory_history_y"
+HISTORY_PARTITIONS_AHEAD = 2    # months created beyond the current one
+
+
+log = logging.getLogger(__name__)
+
+
+class SchemaError(RuntimeError):
+    """A migration cannot be applied to the current data."""
+
+
+def _add_column(table, column, ddl_type):
+    """Step: ADD COLUMN unless present (SQLite has no ADD COLUMN IF NOT EXISTS)."""
+    def step(cur):
+        if is_sqlite():
+            cur.execute(f"PRAGMA table_info({table})")
+            if column in {row[1] for row in cur.fetchall()}:
+                return
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}")
+        else:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {ddl_type}")
+    return step
+
+
+def _require_unique_barcodes(cur):
+    cur.execute("""
+        SELECT barcode, COUNT(*)
+        FROM inventory
+        WHERE barcode IS NOT NULL AND barcode <> ''
+        GROUP BY barcode
+        HAVING COUNT(*) > 1
+        ORDER BY barcode
+        LIMIT 20
+    """)
+    dupes = cur.fetchall()
+    if dupes:
+        listing = ", ".join(f"{bc} (x{n})" for bc, n in dupes)
+        raise SchemaError(
+            "Cannot add the unique barcode index while duplicate barcodes exist: "
+            f"{listing}. Fix or clear them, then restart."
+        )
+
+
+# Upper bound (inches) for a stored thickness_in; NUMERIC(8,4) holds < 10000.
+THICKNESS_IN_MAX = 1000
+
+
+def _sql_case(expr, mapping):
+    whens = " ".join(f"WHEN '{k}' THEN {v}" for k, v in mapping.items())
+    return f"CASE {expr} {whens} END"
+
+
+def _thickness_function_sql():
+    """
+    Postgres twin of utils.parsing.thickness_to_decimal (NULL instead of 0.0
+    for blank/unknown/out of range), generated from the same gauge and
+    fraction tables.
+    A later change to those tables needs a new migration that re-runs this.
+    """
+    return f"""
+        CREATE OR REPLACE FUNCTION inventory_thickness_in(raw TEXT) RETURNS NUMERIC
+        LANGUAGE plpgsql IMMUTABLE AS $$
+        DECLARE
+            s TEXT := btrim(coalesce(raw, ''));
+            v NUMERIC;
+        BEGIN
+            IF s = '' THEN
+                RETURN NULL;
+            ELSIF position('G' in upper(s)) > 0 THEN
+                v := {_sql_case("regexp_replace(s, '[^0-9]', '', 'g')", GAUGE_TO_INCHES)};
+            ELSE
+                v := {_sql_case("s", GAUGE_TO_INCHES)};
+                IF v IS NULL AND position('/' in s) > 0 THEN
+                    v := {_sql_case("s", FRACTION_TO_INCHES)};
+                    IF v IS NULL AND array_length(string_to_array(s, '/'), 1) = 2 THEN
+                        v := split_part(s, '/', 1)::numeric / split_part(s, '/', 2)::numeric;
+                    END IF;
+                ELSIF v IS NULL THEN
+                    v := s::numeric;
+                END IF;
+            END IF;
+            -- Anything outside a plausible thickness is treated as unknown.
+            RETURN CASE WHEN v > 0 AND v < {THICKNESS_IN_MAX} THEN round(v, 4) END;
+        EXCEPTION WHEN others THEN
+            RETURN NULL;   -- not a number, division by zero
+        END $$
+    """
+
+
+def _create_thickness_function(cur):
+    cur.execute(_thickness_function_sql())
+
+
+def _summary_rows_sql(row, sign, source=None):
+    """SELECT of one summary delta per row; sign is "" (add) or "-" (remove)."""
+    return f"""
+        SELECT COALESCE({row}.metal_type, '') AS metal_type,
+               COALESCE({row}.thickness, '') AS thickness,
+               COALESCE({row}.dimensions, '') AS size,
+               {sign}1 AS items,
+               {sign}COALESCE({row}.quantity, 0) AS sheets,
+               {sign}{SUMMARY_AREA_SQL.format(t=row)} AS area_sq_in
+        {f"FROM {source} AS {row}" if source else ""}
+    """
+
+
+def _summary_upsert_sql(*deltas):
+    """
+    Add the summed deltas onto inventory_summary. Groups whose net change is
+    zero are skipped; keys go in sorted order so concurrent writers take the
+    summary row locks in the same order.
+    """
+    return f"""
+        INSERT INTO inventory_summary (metal_type, thickness, size, items, sheets, area_sq_in)
+        SELECT metal_type, thickness, size, SUM(items), SUM(sheets), SUM(area_sq_in)
+        FROM ({" UNION ALL ".join(deltas)}) AS d
+        WHERE TRUE  -- SQLite needs a WHERE before ON CONFLICT in INSERT ... SELECT
+        GROUP BY metal_type, thickness, size
+        HAVING SUM(items) <> 0 OR SUM(sheets) <> 0 OR SUM(area_sq_in) <> 0
+        ORDER BY metal_type, thickness, size
+        ON CONFLICT (metal_type, thickness, size) DO UPDATE SET
+            items = inventory_summary.items + EXCLUDED.items,
+            sheets = inventory_summary.sheets + EXCLUDED.sheets,
+            area_sq_in = inventory_summary.area_sq_in + EXCLUDED.area_sq_in
+    """
+
+
+def _summary_prune_sql(row, source=None):
+    """Drop the emptied groups of the removed rows."""
+    keys = ", ".join(f"COALESCE({row}.{c}, '')" for c in ("metal_type", "thickness", "dimensions"))
+    if source:
+        keys = f"SELECT DISTINCT {keys} FROM {source} AS {row}"
+        return f"""
+        DELETE FROM inventory_summary
+        WHERE items = 0 AND (metal_type, thickness, size) IN ({keys})
+        """
+    return f"""
+        DELETE FROM inventory_summary
+        WHERE items = 0 AND (metal_type, thickness, size) = ({keys})
+    """
+
+
+def rebuild_summary_sql():
+    """SQL statements recomputing inventory_summary from scratch."""
+    return ["DELETE FROM inventory_summary", _summary_upsert_sql(_summary_rows_sql("i", "", "inventory"))]
+
+
+def _add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def history_partition_name(month):
+    return f"{HISTORY_PARTITION_PREFIX}{month.year}m{month.month:02d}"
+
+
+def ensure_history_partitions(cur, first_month, count):
+    """
+    Postgres: create the monthly inventory_history partitions for count
+    months from first_month (a date; the day is ignored). Rows that landed
+    in the default partition for such a month are moved into it.
+    Returns the names created.
+    """
+    created = []
+    month = first_month.replace(day=1)
+    for _ in range(count):
+        name = history_partition_name(month)
+        lo, hi = f"{month} 00:00:00+00", f"{_add_months(month, 1)} 00:00:00+00"
+        month = _add_months(month, 1)
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+        if cur.fetchone()[0]:
+            continue
+        # Built detached and attached once the default partition holds no
+        # rows of its range (ATTACH checks that).
+        cur.execute(f"CREATE TABLE {name} (LIKE inventory_history INCLUDING DEFAULTS)")
+        cur.execute(f"""
+            WITH moved AS (
+                DELETE FROM inventory_history_default
+                WHERE recorded_at >= %s AND recorded_at < %s
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+        """, (lo, hi))
+        cur.execute(f"ALTER TABLE inventory_history ATTACH PARTITION {name} "
+                    f"FOR VALUES FROM ('{lo}') TO ('{hi}')")
+        created.append(name)
+    return created
+
+
+def _create_history_partitions(cur):
+    ensure_history_partitions(cur, date.today(), HISTORY_PARTITIONS_AHEAD + 1)
+
+
+# On-change history rows. Ids never change, so updates join on id; rows are
+# only written when quantity or a descriptive column actually changed.
+_HISTORY_COLUMNS = "item_id, recorded_at, kind, quantity, delta, barcode, metal_type, thickness, dimensions"
+_HISTORY_TRACKED = ("quantity", "barcode", "metal_type", "thickness", "dimensions")
+
+
+def _history_insert_sql(kind, row, delta_sql, quantity_sql, when_sql, source=None, where=""):
+    return f"""
+        INSERT INTO inventory_history ({_HISTORY_COLUMNS})
+        SELECT {row}.id, {when_sql}, '{kind}', {quantity_sql}, {delta_sql},
+               {row}.barcode, {row}.metal_type, {row}.thickness, {row}.dimensions
+        {f"FROM {source}" if source else ""}
+        {where}
+    """
+
+
+def _history_changed_sql(new, old):
+    return " OR ".join(f"{new}.{c} IS DISTINCT FROM {old}.{c}" for c in _HISTORY_TRACKED)
+
+
+def _create_search_index(cur):
+    # pg_trgm ships with most Postgres builds but creating it may need
+    # rights we don't have; search falls back to an in-memory index then.
+    cur.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    if not cur.fetchone():
+        log.warning("pg_trgm not available; inventory search uses the in-memory index.")
+        return
+    cur.execute("SAVEPOINT create_pg_trgm")
+    try:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except Exception as e:
+        cur.execute("ROLLBACK TO SAVEPOINT create_pg_trgm")
+        log.warning("Could not create pg_trgm (%s); inventory search uses the in-memory index.", e)
+        return
+    cur.execute("RELEASE SAVEPOINT create_pg_trgm")
+    cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS {SEARCH_INDEX}
+            ON inventory USING gin (({SEARCH_DOCUMENT_SQL}) gin_trgm_ops)
+    """)
+
+
+MIGRATIONS = [
+    (1, "inventory table and columns", [
+        """
+        CREATE TABLE IF NOT EXISTS inventory (
+            id SERIAL PRIMARY KEY,
+            barcode TEXT,
+            shelf TEXT,
+            thickness TEXT,
+            metal_type TEXT,
+            dimensions TEXT,
+            location TEXT,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            usable_scrap TEXT,
+            date DATE,
+            length NUMERIC(10,2),
+            width NUMERIC(10,2)
+        )
+        """,
+        # Older databases were created by hand and may lack some of these.
+        ("postgres", "ALTER TABLE inventory ADD COLUMN IF NOT EXISTS id SERIAL PRIMARY KEY"),
+        _add_column("inventory", "usable_scrap", "TEXT"),
+        _add_column("inventory", "date", "DATE"),
+        _add_column("inventory", "length", "NUMERIC(10,2)"),
+        _add_column("inventory", "width", "NUMERIC(10,2)"),
+    ]),
+    (2, "match key and dimension range indexes", [
+        # adjust_quantity / import dedupe key
+        """
+        CREATE INDEX IF NOT EXISTS idx_inventory_match_key
+            ON inventory (shelf, thickness, metal_type, dimensions, location)
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_inventory_length ON inventory (length)",
+        "CREATE INDEX IF NOT EXISTS idx_inventory_width ON inventory (width)",
+    ]),
+    (3, "unique barcode index", [
+        _require_unique_barcodes,
+        # Blank barcodes are allowed to repeat; this index also serves barcode lookups.
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_inventory_barcode
+            ON inventory (barcode)
+            WHERE barcode IS NOT NULL AND barcode <> ''
+        """,
+        # Superseded by the unique index (created by the old README schema.sql).
+        "DROP INDEX IF EXISTS idx_inventory_barcode",
+    ]),
+    (4, "quantity movements ledger", [
+        # Append-only; inventory.quantity is the cached SUM(delta) per item.
+        """
+        CREATE TABLE IF NOT EXISTS inventory_movements (
+            id BIGSERIAL PRIMARY KEY,
+            item_id INTEGER NOT NULL REFERENCES inventory(id) ON DELETE CASCADE,
+            delta INTEGER NOT NULL,
+            reason TEXT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_inventory_movements_item
+            ON inventory_movements (item_id, created_at)
+        """,
+        # Opening balances so the ledger sums match the current quantities.
+        """
+        INSERT INTO inventory_movements (item_id, delta, reason)
+        SELECT id, quantity, 'opening balance'
+        FROM inventory
+        WHERE quantity <> 0
+        """,
+    ]),
+    (5, "track which dimensions text length/width were parsed from", [
+        _add_column("inventory", "dims_parsed_from", "TEXT"),
+        # Rows extract_dimensions() still has to look at; empty when current.
+        """
+        CREATE INDEX IF NOT EXISTS idx_inventory_dims_pending
+            ON inventory (dimensions)
+            WHERE dims_parsed_from IS DISTINCT FROM dimensions
+        """,
+    ]),
+    (6, "numeric thickness_in kept in sync with thickness", [
+        _add_column("inventory", "thickness_in", "NUMERIC(8,4)"),
+        # SQLite gets inventory_thickness_in() from db/sqlite_backend.py.
+        ("postgres", _create_thickness_function),
+        ("postgres", """
+        CREATE OR REPLACE FUNCTION inventory_set_thickness_in() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.thickness_in := inventory_thickness_in(NEW.thickness);
+            RETURN NEW;
+        END $$
+        """),
+        ("postgres", "DROP TRIGGER IF EXISTS trg_inventory_thickness_in ON inventory"),
+        ("postgres", """
+        CREATE TRIGGER trg_inventory_thickness_in
+            BEFORE INSERT OR UPDATE OF thickness ON inventory
+            FOR EACH ROW EXECUTE FUNCTION inventory_set_thickness_in()
+        """),
+        ("sqlite", """
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_thickness_in_ins
+            AFTER INSERT ON inventory
+        BEGIN
+            UPDATE inventory SET thickness_in = inventory_thickness_in(NEW.thickness)
+            WHERE id = NEW.id;
+        END
+        """),
+        ("sqlite", """
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_thickness_in_upd
+            AFTER UPDATE OF thickness ON inventory
+        BEGIN
+            UPDATE inventory SET thickness_in = inventory_thickness_in(NEW.thickness)
+            WHERE id = NEW.id;
+        END
+        """),
+        # Back-fill in one pass, then index for range filters and ORDER BY.
+        "UPDATE inventory SET thickness_in = inventory_thickness_in(thickness)",
+        "CREATE INDEX IF NOT EXISTS idx_inventory_thickness_in ON inventory (thickness_in)",
+    ]),
+    (7, "row change notifications for the inventory snapshot", [
+        ("postgres", f"""
+        CREATE OR REPLACE FUNCTION inventory_notify_change() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            -- Repeats within a transaction are collapsed by NOTIFY itself.
+            IF TG_OP = 'TRUNCATE' THEN
+                PERFORM pg_notify('{INVENTORY_CHANGES_CHANNEL}', '*');
+                RETURN NULL;
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM pg_notify('{INVENTORY_CHANGES_CHANNEL}', OLD.id::text);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM pg_notify('{INVENTORY_CHANGES_CHANNEL}', NEW.id::text);
+            END IF;
+            RETURN NULL;
+        END $$
+        """),
+        ("postgres", "DROP TRIGGER IF EXISTS trg_inventory_notify_row ON inventory"),
+        ("postgres", """
+        CREATE TRIGGER trg_inventory_notify_row
+            AFTER INSERT OR UPDATE OR DELETE ON inventory
+            FOR EACH ROW EXECUTE FUNCTION inventory_notify_change()
+        """),
+        ("postgres", "DROP TRIGGER IF EXISTS trg_inventory_notify_truncate ON inventory"),
+        ("postgres", """
+        CREATE TRIGGER trg_inventory_notify_truncate
+            AFTER TRUNCATE ON inventory
+            FOR EACH STATEMENT EXECUTE FUNCTION inventory_notify_change()
+        """),
+        ("sqlite", """
+        CREATE TABLE IF NOT EXISTS inventory_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_id INTEGER NOT NULL
+        )
+        """),
+        ("sqlite", """
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_changes_ins
+            AFTER INSERT ON inventory
+        BEGIN
+            INSERT INTO inventory_changes (item_id) VALUES (NEW.id);
+        END
+        """),
+        ("sqlite", """
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_changes_upd
+            AFTER UPDATE ON inventory
+        BEGIN
+            INSERT INTO inventory_changes (item_id) VALUES (OLD.id);
+            INSERT INTO inventory_changes (item_id) SELECT NEW.id WHERE NEW.id <> OLD.id;
+        END
+        """),
+        ("sqlite", """
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_changes_del
+            AFTER DELETE ON inventory
+        BEGIN
+            INSERT INTO inventory_changes (item_id) VALUES (OLD.id);
+        END
+        """),
+    ]),
+    (8, "trigram search index (pg_trgm, when available)", [
+        ("postgres", _create_search_index),
+    ]),
+    (9, "inventory_summary kept current by triggers", [
+        """
+        CREATE TABLE IF NOT EXISTS inventory_summary (
+            metal_type TEXT NOT NULL,
+            thickness TEXT NOT NULL,
+            size TEXT NOT NULL,
+            items INTEGER NOT NULL,
+            sheets INTEGER NOT NULL,
+            area_sq_in NUMERIC(18,4) NOT NULL,
+            PRIMARY KEY (metal_type, thickness, size)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_inventory_summary_sheets ON inventory_summary (sheets)",
+        # Postgres: statement-level triggers over the transition tables, so
+        # a batch write updates each summary row once.
+        ("postgres", f"""
+        CREATE OR REPLACE FUNCTION inventory_summary_apply() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN
+                DELETE FROM inventory_summary;
+            ELSIF TG_OP = 'INSERT' THEN
+                {_summary_upsert_sql(_summary_rows_sql("n", "", "new_rows"))};
+            ELSIF TG_OP = 'DELETE' THEN
+                {_summary_upsert_sql(_summary_rows_sql("o", "-", "old_rows"))};
+                {_summary_prune_sql("o", "old_rows")};
+            ELSE
+                {_summary_upsert_sql(_summary_rows_sql("n", "", "new_rows"),
+                                     _summary_rows_sql("o", "-", "old_rows"))};
+                {_summary_prune_sql("o", "old_rows")};
+            END IF;
+            RETURN NULL;
+        END $$
+        """),
+        ("postgres", "DROP TRIGGER IF EXISTS trg_inventory_summary_ins ON inventory"),
+        ("postgres", """
+        CREATE TRIGGER trg_inventory_summary_ins
+            AFTER INSERT ON inventory REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION inventory_summary_apply()
+        """),
+        ("postgres", "DROP TRIGGER IF EXISTS trg_inventory_summary_upd ON inventory"),
+        ("postgres", """
+        CREATE TRIGGER trg_inventory_summary_upd
+            AFTER UPDATE ON inventory REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION inventory_summary_apply()
+        """),
+        ("postgres", "DROP TRIGGER IF EXISTS trg_inventory_summary_del ON inventory"),
+        ("postgres", """
+        CREATE TRIGGER trg_inventory_summary_del
+            AFTER DELETE ON inventory REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION inventory_summary_apply()
+        """),
+        ("postgres", "DROP TRIGGER IF EXISTS trg_inventory_summary_truncate ON inventory"),
+        ("postgres", """
+        CREATE TRIGGER trg_inventory_summary_truncate
+            AFTER TRUNCATE ON inventory
+            FOR EACH STATEMENT EXECUTE FUNCTION inventory_summary_apply()
+        """),
+        # SQLite only has row triggers (and a single writer).
+        ("sqlite", f"""
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_summary_ins
+            AFTER INSERT ON inventory
+        BEGIN
+            {_summary_upsert_sql(_summary_rows_sql("NEW", ""))};
+        END
+        """),
+        ("sqlite", f"""
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_summary_upd
+            AFTER UPDATE OF metal_type, thickness, dimensions, quantity, length, width ON inventory
+        BEGIN
+            {_summary_upsert_sql(_summary_rows_sql("NEW", ""), _summary_rows_sql("OLD", "-"))};
+            {_summary_prune_sql("OLD")};
+        END
+        """),
+        ("sqlite", f"""
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_summary_del
+            AFTER DELETE ON inventory
+        BEGIN
+            {_summary_upsert_sql(_summary_rows_sql("OLD", "-"))};
+            {_summary_prune_sql("OLD")};
+        END
+        """),
+        *rebuild_summary_sql(),
+    ]),
+    (10, "inventory_history: on-change and checkpoint quantities", [
+        # kind: 'change' (insert/update), 'delete', or 'checkpoint' (every
+        # item's state, written periodically by services.history_service).
+        ("postgres", """
+        CREATE TABLE IF NOT EXISTS inventory_history (
+            id BIGSERIAL,
+            item_id INTEGER NOT NULL,
+            recorded_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp(),
+            kind TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            delta INTEGER NOT NULL DEFAULT 0,
+            barcode TEXT,
+            metal_type TEXT,
+            thickness TEXT,
+            dimensions TEXT,
+            PRIMARY KEY (recorded_at, id)
+        ) PARTITION BY RANGE (recorded_at)
+        """),
+        ("postgres", "CREATE TABLE IF NOT EXISTS inventory_history_default "
+                     "PARTITION OF inventory_history DEFAULT"),
+        ("postgres", _create_history_partitions),
+        ("sqlite", """
+        CREATE TABLE IF NOT EXISTS inventory_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_id INTEGER NOT NULL,
+            recorded_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            kind TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            delta INTEGER NOT NULL DEFAULT 0,
+            barcode TEXT,
+            metal_type TEXT,
+            thickness TEXT,
+            dimensions TEXT
+        )
+        """),
+        ("sqlite", "CREATE INDEX IF NOT EXISTS idx_inventory_history_time ON inventory_history (recorded_at)"),
+        "CREATE INDEX IF NOT EXISTS idx_inventory_history_item ON inventory_history (item_id, recorded_at)",
+        """
+        CREATE INDEX IF NOT EXISTS idx_inventory_history_checkpoint
+            ON inventory_history (recorded_at) WHERE kind = 'checkpoint'
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_inventory_history_material
+            ON inventory_history (metal_type, thickness, recorded_at)
+        """,
+        # Postgres: statement-level triggers over the transition tables (one
+        # INSERT per statement); clock_timestamp() so a change committed
+        # after a checkpoint is never stamped before it.
+        ("postgres", f"""
+        CREATE OR REPLACE FUNCTION inventory_history_record() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                {_history_insert_sql("change", "n", "COALESCE(n.quantity, 0)", "COALESCE(n.quantity, 0)",
+                                     "clock_timestamp()", "new_rows AS n")};
+            ELSIF TG_OP = 'UPDATE' THEN
+                {_history_insert_sql("change", "n", "COALESCE(n.quantity, 0) - COALESCE(o.quantity, 0)",
+                                     "COALESCE(n.quantity, 0)", "clock_timestamp()",
+                                     "new_rows AS n JOIN old_rows AS o ON o.id = n.id",
+                                     f"WHERE {_history_changed_sql('n', 'o')}")};
+            ELSIF TG_OP = 'DELETE' THEN
+                {_history_insert_sql("delete", "o", "-COALESCE(o.quantity, 0)", "0",
+                                     "clock_timestamp()", "old_rows AS o")};
+            ELSE  -- TRUNCATE, fired BEFORE so the rows are still there
+                {_history_insert_sql("delete", "o", "-COALESCE(o.quantity, 0)", "0",
+                                     "clock_timestamp()", "inventory AS o")};
+            END IF;
+            RETURN NULL;
+        END $$
+        """),
+        ("postgres", "DROP TRIGGER IF EXISTS trg_inventory_history_ins ON inventory"),
+        ("postgres", """
+        CREATE TRIGGER trg_inventory_history_ins
+            AFTER INSERT ON inventory REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION inventory_history_record()
+        """),
+        ("postgres", "DROP TRIGGER IF EXISTS trg_inventory_history_upd ON inventory"),
+        ("postgres", """
+        CREATE TRIGGER trg_inventory_history_upd
+            AFTER UPDATE ON inventory REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION inventory_history_record()
+        """),
+        ("postgres", "DROP TRIGGER IF EXISTS trg_inventory_history_del ON inventory"),
+        ("postgres", """
+        CREATE TRIGGER trg_inventory_history_del
+            AFTER DELETE ON inventory REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION inventory_history_record()
+        """),
+        ("postgres", "DROP TRIGGER IF EXISTS trg_inventory_history_truncate ON inventory"),
+        ("postgres", """
+        CREATE TRIGGER trg_inventory_history_truncate
+            BEFORE TRUNCATE ON inventory
+            FOR EACH STATEMENT EXECUTE FUNCTION inventory_history_record()
+        """),
+        ("sqlite", f"""
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_history_ins
+            AFTER INSERT ON inventory
+        BEGIN
+            {_history_insert_sql("change", "NEW", "COALESCE(NEW.quantity, 0)", "COALESCE(NEW.quantity, 0)",
+                                 "CURRENT_TIMESTAMP")};
+        END
+        """),
+        ("sqlite", f"""
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_history_upd
+            AFTER UPDATE OF {", ".join(_HISTORY_TRACKED)} ON inventory
+            WHEN {_history_changed_sql("NEW", "OLD")}
+        BEGIN
+            {_history_insert_sql("change", "NEW", "COALESCE(NEW.quantity, 0) - COALESCE(OLD.quantity, 0)",
+                                 "COALESCE(NEW.quantity, 0)", "CURRENT_TIMESTAMP")};
+        END
+        """),
+        ("sqlite", f"""
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_history_del
+            AFTER DELETE ON inventory
+        BEGIN
+            {_history_insert_sql("delete", "OLD", "-COALESCE(OLD.quantity, 0)", "0", "CURRENT_TIMESTAMP")};
+        END
+        """),
+        # First checkpoint: the state history starts from.
+        _history_insert_sql("checkpoint", "i", "0", "COALESCE(i.quantity, 0)", "now()", "inventory AS i"),
+    ]),
+    (11, "import match key index (blank and NULL alike)", [
+        # services.import_service looks staged rows up by COALESCE(col, '').
+        """
+        CREATE INDEX IF NOT EXISTS idx_inventory_import_key ON inventory (
+            (COALESCE(shelf, '')), (COALESCE(thickness, '')), (COALESCE(metal_type, '')),
+            (COALESCE(dimensions, '')), (COALESCE(location, ''))
+        )
+        """,
+    ]),
+    (12, "ledger: book the quantity of inserted items", [
+        # Every INSERT (entry form, import, restore, COPY) books the new
+        # row's quantity as an 'insert' movement in the same statement.
+        ("postgres", """
+        CREATE OR REPLACE FUNCTION inventory_ledger_insert() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO inventory_movements (item_id, delta, reason)
+            SELECT id, quantity, 'insert' FROM new_rows WHERE quantity <> 0;
+            RETURN NULL;
+        END $$
+        """),
+        ("postgres", "DROP TRIGGER IF EXISTS trg_inventory_ledger_ins ON inventory"),
+        ("postgres", """
+        CREATE TRIGGER trg_inventory_ledger_ins
+            AFTER INSERT ON inventory REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION inventory_ledger_insert()
+        """),
+        ("sqlite", """
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_ledger_ins
+            AFTER INSERT ON inventory
+            WHEN NEW.quantity <> 0
+        BEGIN
+            INSERT INTO inventory_movements (item_id, delta, reason)
+            VALUES (NEW.id, NEW.quantity, 'insert');
+        END
+        """),
+        # Rows written without a movement before this migration.
+        """
+        INSERT INTO inventory_movements (item_id, delta, reason)
+        SELECT i.id, i.quantity - COALESCE(m.total, 0), 'opening balance'
+        FROM inventory i
+        LEFT JOIN (
+            SELECT item_id, SUM(delta) AS total
+            FROM inventory_movements
+            GROUP BY item_id
+        ) m ON m.item_id = i.id
+        WHERE i.quantity <> COALESCE(m.total, 0)
+        """,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+_schema_current = False
+
+
+def current_version():
+    with get_cursor() as cur:
+        if is_sqlite():
+            cur.execute("SELECT COUNT(*) > 0 FROM sqlite_master WHERE type='table' AND name='schema_version'")
+        else:
+            cur.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return 0
+        cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        return cur.fetchone()[0]
+
+
+def _apply(version, description, steps):
+    """Apply one migration unless another process got there first."""
+    with get_cursor() as cur:
+        if not is_sqlite():
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_ID,))
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TIMESTAMP NOT NULL DEFAULT now()
+            )
+        """)
+        cur.execute("SELECT 1 FROM schema_version WHERE version=%s", (version,))
+        if cur.fetchone():
+            return False
+        for step in steps:
+            if isinstance(step, tuple):
+                backend, step = step
+                if backend != DB_BACKEND:
+                    continue
+            if callable(step):
+                step(cur)
+            else:
+                cur.execute(step)
+        cur.execute(
+            "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+            (version, description)
+        )
+        return True
+
+
+def ensure_schema():
+    """
+    Bring the database up to LATEST_VERSION.
+    Returns the list of versions applied by this call (empty when current).
+    """
+    global _schema_current
+    if _schema_current:
+        return []
+    applied = []
+    start = current_version()
+    for version, description, steps in MIGRATIONS:
+        if version > start and _apply(version, description, steps):
+            applied.append(version)
+    _schema_current = True
+    return applied
+
+
+__all__ = [
+    "ensure_schema", "current_version", "LATEST_VERSION", "MIGRATIONS", "SchemaError",
+    "INVENTORY_CHANGES_CHANNEL", "SEARCH_FIELDS", "SEARCH_DOCUMENT_SQL", "SEARCH_INDEX",
+    "rebuild_summary_sql", "HISTORY_PARTITION_PREFIX", "HISTORY_PARTITIONS_AHEAD", "history_partition_name",
+    "ensure_history_partitions",
+]
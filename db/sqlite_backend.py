@@ -0,0 +1,298 @@
+"""
+SQLite backend: a local file or throwaway database behind the same
+db.connection / db.queries API as PostgreSQL. ":memory:" is served from a
+temp file deleted at exit, so pooled connections share it with normal
+(committed-only) isolation.
+
+Connections are wrapped so callers keep writing psycopg2-style SQL:
+  - %s / %(name)s placeholders become ? / :name, and %% becomes %
+  - `x = ANY(%s)` with a list parameter expands to `x IN (?, ?, ...)`
+  - ::type casts are dropped, ILIKE -> LIKE, IS [NOT] DISTINCT FROM -> IS [NOT]
+  - SERIAL/BIGSERIAL keys become INTEGER PRIMARY KEY AUTOINCREMENT, now() -> CURRENT_TIMESTAMP
+  - GREATEST/LEAST are registered as NULL-skipping SQL functions, and
+    inventory_thickness_in() as a Python function (see db/schema.py)
+  - a transaction is opened before the first statement and ends at
+    commit()/rollback(), like psycopg2 (DDL included)
+DATE and TIMESTAMP columns come back as date/datetime objects.
+"""
+import atexit
+import os
+import re
+import sqlite3
+import tempfile
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+
+from psycopg2 import extensions
+
+from utils.parsing import thickness_to_decimal
+from .instrumentation import record
+
+_memory_path = None     # temp file standing in for ":memory:"
+
+# ------------------------------------------------------------------
+# Type adaptation
+# ------------------------------------------------------------------
+def _convert_date(raw):
+    try:
+        return date.fromisoformat(raw.decode()[:10])
+    except ValueError:
+        return raw.decode()
+
+def _convert_timestamp(raw):
+    try:
+        return datetime.fromisoformat(raw.decode())
+    except ValueError:
+        return raw.decode()
+
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_converter("DATE", _convert_date)
+sqlite3.register_converter("TIMESTAMP", _convert_timestamp)
+sqlite3.register_converter("TIMESTAMPTZ", _convert_timestamp)
+
+def _greatest(*args):
+    vals = [a for a in args if a is not None]
+    return max(vals) if vals else None
+
+def _least(*args):
+    vals = [a for a in args if a is not None]
+    return min(vals) if vals else None
+
+def _thickness_in(raw):
+    # Same rules as the Postgres function from migration 6 (NULL when unknown).
+    from .schema import THICKNESS_IN_MAX
+    value = thickness_to_decimal(raw if isinstance(raw, str) else None)
+    return round(value, 4) if 0 < value < THICKNESS_IN_MAX else None
+
+# ------------------------------------------------------------------
+# SQL translation
+# ------------------------------------------------------------------
+_REWRITES = [
+    (re.compile(r"::\s*\w+(?:\s*\(\s*\d+\s*(?:,\s*\d+\s*)?\))?(?:\[\])?"), ""),
+    (re.compile(r"\bBIGSERIAL\s+PRIMARY\s+KEY\b|\bSERIAL\s+PRIMARY\s+KEY\b", re.I),
+     "INTEGER PRIMARY KEY AUTOINCREMENT"),
+    (re.compile(r"\bIS\s+NOT\s+DISTINCT\s+FROM\b", re.I), "IS"),
+    (re.compile(r"\bIS\s+DISTINCT\s+FROM\b", re.I), "IS NOT"),
+    (re.compile(r"\bILIKE\b", re.I), "LIKE"),
+    (re.compile(r"\bnow\(\)", re.I), "CURRENT_TIMESTAMP"),
+]
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_PARAM_RE = re.compile(r"%%|%s|%\((\w+)\)s")
+_ANY_RE = re.compile(r"=\s*ANY\s*\(\s*%s\s*\)", re.I)
+
+@lru_cache(maxsize=512)
+def translate_sql(sql, with_params=True):
+    """Rewrite psycopg2-flavoured SQL for SQLite (inside string literals only %% -> %)."""
+    out = []
+    pos = 0
+    for m in _STRING_RE.finditer(sql):
+        out.append(_translate_code(sql[pos:m.start()], with_params))
+        out.append(m.group(0).replace("%%", "%") if with_params else m.group(0))
+        pos = m.end()
+    out.append(_translate_code(sql[pos:], with_params))
+    return "".join(out)
+
+def _translate_code(fragment, with_params):
+    for pattern, repl in _REWRITES:
+        fragment = pattern.sub(repl, fragment)
+    if not with_params:
+        return fragment
+    def param(m):
+        if m.group(0) == "%%":
+            return "%"
+        if m.group(1):
+            return f":{m.group(1)}"
+        return "?"
+    return _PARAM_RE.sub(param, fragment)
+
+def _expand_any(sql, params):
+    """`col = ANY(%s)` with a list/tuple parameter -> `col IN (%s, ...)`."""
+    if not isinstance(params, (list, tuple)) or not _ANY_RE.search(sql):
+        return sql, params
+    # Walk placeholders in order so positional params stay aligned.
+    pieces, new_params = [], []
+    idx = last = 0
+    for m in _PARAM_RE.finditer(sql):
+        pieces.append(sql[last:m.start()])
+        if m.group(0) == "%s":
+            value = params[idx]
+            idx += 1
+            head = pieces[-1]
+            any_m = re.search(r"=\s*ANY\s*\(\s*$", head, re.I)
+            if any_m and isinstance(value, (list, tuple, set)):
+                items = list(value)
+                pieces[-1] = head[:any_m.start()] + "IN ("
+                pieces.append(", ".join(["%s"] * len(items)) if items else "NULL")
+                new_params.extend(items)
+            else:
+                pieces.append("%s")
+                new_params.append(value)
+        else:
+            pieces.append(m.group(0))
+        last = m.end()
+    pieces.append(sql[last:])
+    return "".join(pieces), tuple(new_params)
+
+def _split_statements(sql):
+    statements, buf = [], ""
+    for chunk in sql.split(";"):
+        buf = f"{buf};{chunk}" if buf else chunk
+        if sqlite3.complete_statement(buf + ";"):
+            if buf.strip():
+                statements.append(buf.strip())
+            buf = ""
+    if buf.strip():
+        statements.append(buf.strip())
+    return statements
+
+# ------------------------------------------------------------------
+# Connection / cursor wrappers
+# ------------------------------------------------------------------
+class SQLiteCursor:
+    def __init__(self, conn):
+        self._conn = conn
+        self._cur = conn.raw.cursor()
+        self.itersize = 2000
+        self.rowcount = -1
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    @property
+    def lastrowid(self):
+        return self._cur.lastrowid
+
+    def execute(self, sql, params=None):
+        if params is not None and not isinstance(params, dict):
+            sql, params = _expand_any(sql, params)
+        statements = _split_statements(sql) if params is None and ";" in sql.strip().rstrip(";") else [sql]
+        start = time.perf_counter()
+        try:
+            self._conn._begin()
+            for stmt in statements:
+                translated = translate_sql(stmt, params is not None)
+                if params is None:
+                    self._cur.execute(translated)
+                else:
+                    self._cur.execute(translated, params)
+        except Exception:
+            record(sql, params, time.perf_counter() - start, None, error=True)
+            raise
+        self.rowcount = self._cur.rowcount
+        record(sql, params, time.perf_counter() - start, self.rowcount)
+        return None
+
+    def executemany(self, sql, params_seq):
+        params_seq = list(params_seq)
+        start = time.perf_counter()
+        try:
+            self._conn._begin()
+            self._cur.executemany(translate_sql(sql), params_seq)
+        except Exception:
+            record(sql, None, time.perf_counter() - start, None, error=True)
+            raise
+        self.rowcount = self._cur.rowcount
+        record(sql, None, time.perf_counter() - start, self.rowcount)
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cur.fetchmany(size or self.itersize)
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    def close(self):
+        self._cur.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class SQLiteConnection:
+    """psycopg2-like wrapper around sqlite3 (explicit BEGIN before the first statement)."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._closed = False
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def cursor(self, name=None, cursor_factory=None):
+        # Named (server-side) cursors have no SQLite equivalent; sqlite3
+        # cursors already step through results lazily.
+        return SQLiteCursor(self)
+
+    def _begin(self):
+        if not self.raw.in_transaction:
+            self.raw.execute("BEGIN")
+
+    def commit(self):
+        if self.raw.in_transaction:
+            self.raw.execute("COMMIT")
+
+    def rollback(self):
+        if self.raw.in_transaction:
+            self.raw.execute("ROLLBACK")
+
+    def get_transaction_status(self):
+        return (extensions.TRANSACTION_STATUS_INTRANS if self.raw.in_transaction
+                else extensions.TRANSACTION_STATUS_IDLE)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.raw.close()
+
+
+def _throwaway_path():
+    global _memory_path
+    if _memory_path is None:
+        fd, _memory_path = tempfile.mkstemp(prefix="inventory_", suffix=".db")
+        os.close(fd)
+        atexit.register(drop_memory_database)
+    return _memory_path
+
+
+def connect(path):
+    """Open a wrapped connection; path ':memory:' gives a process-wide throwaway database."""
+    if path == ":memory:":
+        path = _throwaway_path()
+    raw = sqlite3.connect(path, timeout=30, isolation_level=None,
+                          check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
+    raw.execute("PRAGMA journal_mode=WAL")
+    raw.execute("PRAGMA foreign_keys=ON")
+    raw.create_function("GREATEST", -1, _greatest, deterministic=True)
+    raw.create_function("LEAST", -1, _least, deterministic=True)
+    raw.create_function("inventory_thickness_in", 1, _thickness_in, deterministic=True)
+    return SQLiteConnection(raw)
+
+
+def drop_memory_database():
+    """Forget the throwaway database (used between benchmark runs and at exit)."""
+    global _memory_path
+    if _memory_path is not None:
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(_memory_path + suffix)
+            except OSError:
+                pass
+        _memory_path = None
+
+
+__all__ = ["connect", "translate_sql", "SQLiteConnection", "drop_memory_database"]
@@ -0,0 +1,123 @@
+"""
+Unit of work: run a multi-step operation on one pooled connection.
+
+    with transaction(batch_size=1000) as tx:
+        for row in rows:
+            try:
+                with tx.savepoint():
+                    tx.execute("INSERT ...", row)
+            except Exception:
+                errors += 1          # only this row was rolled back
+            tx.step()                # commits every batch_size steps
+
+While the block runs, every db.queries call made on the same thread -
+including the ones inside services - joins this connection and
+transaction instead of checking out its own. The transaction commits when
+the block exits normally and rolls back (to the last batch commit) if it
+raises. A nested transaction() joins the outer one.
+"""
+import itertools
+from contextlib import contextmanager
+
+from . import queries
+from .connection import get_connection, bind_transaction, release_transaction, current_session
+
+
+class Session:
+    def __init__(self, conn, batch_size=None):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.commits = 0
+        self._pending_steps = 0
+        self._savepoint_ids = itertools.count(1)
+        self._unreleased = None
+
+    # Same API as db.queries; calls run on this session's connection.
+    def fetch_all(self, sql, params=()):
+        return queries.fetch_all(sql, params)
+
+    def fetch_one(self, sql, params=()):
+        return queries.fetch_one(sql, params)
+
+    def execute(self, sql, params=()):
+        return queries.execute(sql, params)
+
+    def fetch_iter(self, sql, params=(), batch_size=queries.DEFAULT_ITER_BATCH_SIZE):
+        return queries.fetch_iter(sql, params, batch_size)
+
+    def execute_values(self, sql, rows, template=None, page_size=queries.DEFAULT_PAGE_SIZE):
+        return queries.execute_values(sql, rows, template, page_size)
+
+    def copy_rows(self, table, columns, rows, page_size=queries.DEFAULT_COPY_PAGE_SIZE):
+        return queries.copy_rows(table, columns, rows, page_size)
+
+    def bulk_update(self, table, key_column, columns, updates, casts=None,
+                    page_size=queries.DEFAULT_PAGE_SIZE, where=None, returning=None):
+        return queries.bulk_update(table, key_column, columns, updates, casts, page_size, where,
+                                   returning)
+
+    def cursor(self):
+        return self.conn.cursor()
+
+    def _run(self, sql):
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
+
+    @contextmanager
+    def savepoint(self):
+        """
+        Roll back only the statements inside the block if it raises (the
+        exception still propagates). The release of a successful savepoint
+        is sent together with the next SAVEPOINT, saving a round trip per row.
+        """
+        name = f"sp_{next(self._savepoint_ids)}"
+        prefix = f"RELEASE SAVEPOINT {self._unreleased}; " if self._unreleased else ""
+        self._unreleased = None
+        self._run(f"{prefix}SAVEPOINT {name}")
+        try:
+            yield name
+        except Exception:
+            # Anything still unreleased was nested inside `name` and is gone now.
+            self._unreleased = None
+            self._run(f"ROLLBACK TO SAVEPOINT {name}; RELEASE SAVEPOINT {name}")
+            raise
+        self._unreleased = name
+
+    def commit(self):
+        """Commit work so far; the session stays usable. Named cursors do not survive this."""
+        self.conn.commit()
+        self._unreleased = None
+        self._pending_steps = 0
+        self.commits += 1
+
+    def rollback(self):
+        """Discard work since the last commit (e.g. a dry run); the session stays usable."""
+        self.conn.rollback()
+        self._unreleased = None
+        self._pending_steps = 0
+
+    def step(self, n=1):
+        """Count n units of work; commits when batch_size is reached. Returns True on commit."""
+        self._pending_steps += n
+        if self.batch_size and self._pending_steps >= self.batch_size:
+            self.commit()
+            return True
+        return False
+
+
+@contextmanager
+def transaction(batch_size=None):
+    outer = current_session()
+    if outer is not None:
+        yield outer
+        return
+    with get_connection() as conn:
+        session = Session(conn, batch_size)
+        bind_transaction(conn, session)
+        try:
+            yield session
+        finally:
+            release_transaction()
+
+
+__all__ = ["transaction", "Session"]
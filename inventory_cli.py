@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+Headless front end: the GUI's import, export, backup and restore without
+tkinter, for scheduled jobs, scripts and benchmarking.
+
+    python -m inventory_cli import sheet.xlsx --duplicates update --generate-barcodes
+    python -m inventory_cli export-csv inventory.csv
+    python -m inventory_cli export-pronest pronest.csv
+    python -m inventory_cli backup [inventory_backup.csv]
+    python -m inventory_cli restore backup.csv --mode append
+
+Common options: --dry-run does the database work and rolls it back (file
+writing commands build the frame but write nothing); --profile prints the
+time per phase and the statements that took longest (db.instrumentation).
+Exit status is 0 on success, 1 on failure.
+
+Every run first does the maintenance the GUI runs in the background
+(history checkpoint, partitions, retention; ledger reconcile and
+compaction); a dry run only creates the partitions its inserts may need.
+"""
+import argparse
+import sys
+import time
+from contextlib import contextmanager
+
+from db.config import QUERY_STATS_CONFIG
+from db.instrumentation import get_query_stats, reset_query_stats
+from db.schema import ensure_schema
+from db.transaction import transaction
+from services.backup_service import (
+    backup_frame, default_backup_name, read_backup, restore_frame,
+)
+from services.export_service import (
+    fetch_inventory_csv_dataframe, pronest_export, save_frame,
+)
+from services.history_service import ensure_partitions, run_history_maintenance
+from services.import_service import (
+    IMPORT_CHUNK_ROWS, ImportStopped, open_sheet, import_sheet,
+)
+from services.ledger_service import run_ledger_maintenance
+
+PROFILE_TOP_STATEMENTS = 10
+
+
+class _Profile:
+    """Wall time per phase plus a query-stats window, printed by report()."""
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.phases = {}
+        if enabled:
+            QUERY_STATS_CONFIG["enabled"] = True
+            reset_query_stats()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def report(self):
+        if not self.enabled:
+            return
+        print("\nPhases:")
+        for name, seconds in self.phases.items():
+            print(f"  {name:<10} {seconds:9.3f} s")
+        print(f"\nTop {PROFILE_TOP_STATEMENTS} statements by total time:")
+        for s in get_query_stats()[:PROFILE_TOP_STATEMENTS]:
+            sql = " ".join(s["sql"].split())
+            print(f"  {s['total_ms']:10.1f} ms {s['count']:7d}x  {sql[:100]}")
+
+
+def run_maintenance(dry_run):
+    """One maintenance pass before the command; failures are reported, not fatal."""
+    try:
+        if dry_run:
+            ensure_partitions()
+        else:
+            run_history_maintenance()
+    except Exception as e:
+        print(f"History maintenance failed: {e}", file=sys.stderr)
+    if dry_run:
+        return
+    try:
+        run_ledger_maintenance()
+    except Exception as e:
+        print(f"Ledger maintenance failed: {e}", file=sys.stderr)
+
+
+# ------------------------------------------------------------------
+# Commands (each returns the exit status)
+# ------------------------------------------------------------------
+def _print_progress(rows_read, totals):
+    print(f"  {rows_read} rows read: {totals['added']} added, {totals['updated']} updated, "
+          f"{totals['skipped']} skipped, {totals['errors']} errors", flush=True)
+
+
+def cmd_import(args, profile):
+    with profile.phase("open"):
+        chunks = open_sheet(args.path, args.chunk_rows or None)
+    failure = None
+    try:
+        totals = import_sheet(chunks, args.duplicates == "update", args.generate_barcodes,
+                              None if args.quiet else _print_progress, args.dry_run)
+    except ImportStopped as e:
+        failure, totals = e, e.totals
+    for phase, seconds in totals["seconds"].items():
+        profile.add(phase, seconds)
+
+    print(f"Added: {totals['added']}\nUpdated: {totals['updated']}\nSkipped: {totals['skipped']}\n"
+          f"Errors: {totals['errors']}\nBarcodes generated: {totals['barcodes']}")
+    if failure is not None:
+        saved = f"The first {failure.saved} rows were saved." if failure.saved else "Nothing was written."
+        print(f"Import stopped: {failure}\n{saved}", file=sys.stderr)
+        return 1
+    if args.dry_run:
+        print("Dry run: changes rolled back.")
+    return 0
+
+
+def _write(df, path, args, profile):
+    if args.dry_run:
+        print(f"Dry run: {len(df)} rows, not written to {path}.")
+        return
+    with profile.phase("write"):
+        save_frame(df, path)
+    print(f"{len(df)} rows written to {path}")
+
+
+def cmd_export_csv(args, profile):
+    with profile.phase("query"):
+        df = fetch_inventory_csv_dataframe()
+    _write(df, args.path, args, profile)
+    return 0
+
+
+def cmd_export_pronest(args, profile):
+    # Same sequence as the GUI: length/width are refreshed first.
+    with profile.phase("query"), transaction() as tx:
+        df, counts = pronest_export()
+        if args.dry_run:
+            tx.rollback()
+    print(f"Dimension data updated for {counts['parsed']} record(s) "
+          f"(unparseable: {counts['failed']}, blank: {counts['skipped']})")
+    if df is None or df.empty:
+        print("Nothing to export.", file=sys.stderr)
+        return 1
+    _write(df, args.path, args, profile)
+    return 0
+
+
+def cmd_backup(args, profile):
+    with profile.phase("query"):
+        df = backup_frame()
+    if df is None:
+        print("No rows to backup.", file=sys.stderr)
+        return 1
+    _write(df, args.path or default_backup_name(), args, profile)
+    return 0
+
+
+def cmd_restore(args, profile):
+    with profile.phase("read"):
+        df = read_backup(args.path)
+    if df.empty:
+        print("Backup file has no data.", file=sys.stderr)
+        return 1
+    with profile.phase("restore"):
+        rows = restore_frame(df, args.mode == "replace", dry_run=args.dry_run)
+    print(f"Restored {rows} rows (primary keys re-generated)"
+          + (" - dry run, rolled back." if args.dry_run else "."))
+    return 0
+
+
+# ------------------------------------------------------------------
+# Argument parsing
+# ------------------------------------------------------------------
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--dry-run", action="store_true",
+                        help="do the work, then roll back / write no file")
+    common.add_argument("--profile", action="store_true",
+                        help="print time per phase and the slowest SQL statements")
+
+    parser = argparse.ArgumentParser(prog="python -m inventory_cli",
+                                     description="Inventory import/export without the GUI.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("import", parents=[common], help="import a CSV/XLSX sheet")
+    p.add_argument("path")
+    p.add_argument("--duplicates", choices=("update", "skip"), required=True,
+                   help="rows matching an existing item (shelf+thickness+metal_type+"
+                        "dimensions+location) update it or are skipped")
+    p.add_argument("--generate-barcodes", action="store_true",
+                   help="derive barcodes (and images) for new rows without one")
+    p.add_argument("--chunk-rows", type=int, default=IMPORT_CHUNK_ROWS,
+                   help=f"rows merged and committed at a time (default {IMPORT_CHUNK_ROWS}; 0 = whole file)")
+    p.add_argument("--quiet", action="store_true", help="no per-chunk progress lines")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("export-csv", parents=[common], help="export the inventory table")
+    p.add_argument("path", help=".csv or .xlsx")
+    p.set_defaults(func=cmd_export_csv)
+
+    p = sub.add_parser("export-pronest", parents=[common], help="export the ProNest plate list")
+    p.add_argument("path", help=".csv or .xlsx")
+    p.set_defaults(func=cmd_export_pronest)
+
+    p = sub.add_parser("backup", parents=[common], help="back up the whole inventory table")
+    p.add_argument("path", nargs="?", help="default: inventory_backup_<timestamp>.csv")
+    p.set_defaults(func=cmd_backup)
+
+    p = sub.add_parser("restore", parents=[common], help="restore rows from a backup file")
+    p.add_argument("path")
+    p.add_argument("--mode", choices=("replace", "append"), required=True,
+                   help="replace deletes all current rows first")
+    p.set_defaults(func=cmd_restore)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        applied = ensure_schema()
+        if applied:
+            print(f"Database schema migrated to version {applied[-1]}.")
+    except Exception as e:
+        print(f"Database setup error: {e}", file=sys.stderr)
+        return 1
+    run_maintenance(args.dry_run)
+
+    profile = _Profile(args.profile)
+    try:
+        return args.func(args, profile)
+    except Exception as e:
+        print(f"{args.command}: {e}", file=sys.stderr)
+        return 1
+    finally:
+        profile.report()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
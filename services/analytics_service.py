@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Stock analytics: totals, sheet counts, square footage on hand and low stock.
+
+Everything is read from inventory_summary (migration 9), one row per
+metal_type x thickness x size that triggers on inventory keep current, so
+no read scans the inventory table. The summary is small and is cached in
+memory: while the inventory snapshot is loaded the cache lives as long as
+the snapshot version (like the facet cache), otherwise SUMMARY_CACHE_TTL
+seconds. Repeated dashboard reads are then plain list / dict lookups.
+"""
+import threading
+import time
+
+from db.queries import fetch_all
+from db.schema import rebuild_summary_sql
+from db.transaction import transaction
+from services.snapshot_service import get_snapshot
+from utils.parsing import thickness_to_decimal
+
+LOW_STOCK_SHEETS = 2        # a group with this many sheets or fewer is low
+SUMMARY_CACHE_TTL = 30      # seconds, only used while the snapshot isn't loaded
+SQ_IN_PER_SQ_FT = 144
+
+# Group tuples returned by stock_summary() / low_stock().
+SUMMARY_COLUMNS = ("metal_type", "thickness", "size", "items", "sheets", "area_sq_ft")
+# Inventory columns the summary is computed from; other edits leave it as is.
+SUMMARY_SOURCE_COLUMNS = ("metal_type", "thickness", "dimensions", "quantity", "length", "width")
+_GROUP_INDEX = {"metal_type": 0, "thickness": 1, "size": 2}
+
+_cache = None   # (snapshot version, loaded at, groups)
+_cache_lock = threading.Lock()
+
+
+def _group_order(group):
+    metal, thickness, size = group[:3]
+    return metal.lower(), thickness_to_decimal(thickness), thickness.lower(), size.lower()
+
+
+def _load_groups():
+    rows = fetch_all("""
+        SELECT metal_type, thickness, size, items, sheets, area_sq_in
+        FROM inventory_summary
+    """)
+    groups = [
+        (metal, thickness, size, int(items), int(sheets),
+         round(float(area) / SQ_IN_PER_SQ_FT, 2))
+        for metal, thickness, size, items, sheets, area in rows
+    ]
+    groups.sort(key=_group_order)
+    return groups
+
+
+def _groups():
+    global _cache
+    snap = get_snapshot()
+    if snap.loaded:
+        snap.sync()     # non-blocking; bumps the version if anything changed
+    version = snap.version if snap.loaded else None
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache
+        if hit and hit[0] == version and (version is not None or now - hit[1] < SUMMARY_CACHE_TTL):
+            return hit[2]
+    groups = _load_groups()
+    with _cache_lock:
+        _cache = (version, now, groups)
+    return groups
+
+
+def stock_summary():
+    """
+    Stock per metal_type x thickness x size as SUMMARY_COLUMNS tuples,
+    ordered by metal, numeric thickness and size. Unknown values are ''.
+    """
+    return list(_groups())
+
+
+def stock_totals(low_stock_sheets=LOW_STOCK_SHEETS):
+    """
+    {"items", "sheets", "area_sq_ft", "groups", "low_stock_groups"} over the
+    whole inventory.
+    """
+    groups = _groups()
+    return {
+        "items": sum(g[3] for g in groups),
+        "sheets": sum(g[4] for g in groups),
+        "area_sq_ft": round(sum(g[5] for g in groups), 2),
+        "groups": len(groups),
+        "low_stock_groups": sum(1 for g in groups if g[4] <= low_stock_sheets),
+    }
+
+
+def stock_by(*columns):
+    """
+    The summary rolled up to some of metal_type / thickness / size:
+    [(key tuple, items, sheets, area_sq_ft)], in summary order.
+    """
+    idx = [_GROUP_INDEX[c] for c in columns]
+    rolled = {}
+    for g in _groups():
+        key = tuple(g[i] for i in idx)
+        items, sheets, area = rolled.get(key, (0, 0, 0.0))
+        rolled[key] = (items + g[3], sheets + g[4], area + g[5])
+    return [(key, items, sheets, round(area, 2)) for key, (items, sheets, area) in rolled.items()]
+
+
+def low_stock(low_stock_sheets=LOW_STOCK_SHEETS):
+    """Groups with low_stock_sheets sheets or fewer, fewest first."""
+    low = [g for g in _groups() if g[4] <= low_stock_sheets]
+    low.sort(key=lambda g: g[4])    # stable: summary order within a count
+    return low
+
+
+def rebuild_summary():
+    """
+    Recompute inventory_summary from the inventory table (repair only; the
+    triggers keep it current). Returns the number of groups.
+    """
+    with transaction() as tx:
+        for sql in rebuild_summary_sql():
+            tx.execute(sql)
+    invalidate_summary()
+    return len(_groups())
+
+
+def invalidate_summary():
+    global _cache
+    with _cache_lock:
+        _cache = None
+
+
+__all__ = [
+    "LOW_STOCK_SHEETS",
+    "SUMMARY_COLUMNS",
+    "SUMMARY_SOURCE_COLUMNS",
+    "stock_summary",
+    "stock_totals",
+    "stock_by",
+    "low_stock",
+    "rebuild_summary",
+    "invalidate_summary",
+]
@@ -1,47 +1,94 @@
 import pandas as pd
 from datetime import datetime
-from tkinter import filedialog, messagebox
-from db.queries import fetch_all, execute
-from db.connection import get_cursor
+from db.queries import fetch_frame, execute, execute_values, table_columns
+from db.transaction import transaction
+from services.export_service import save_frame
 
 TABLE_NAME = "inventory"
 
+
+def default_backup_name():
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{TABLE_NAME}_backup_{ts}.csv"
+
+
+def backup_frame():
+    """The whole inventory table as a DataFrame; None if there is nothing to back up."""
+    cols = table_columns(TABLE_NAME)
+    if not cols:
+        return None
+    df = fetch_frame(f"SELECT {', '.join(cols)} FROM {TABLE_NAME}")
+    return None if df.empty else df
+
+
+def read_backup(filename):
+    if filename.lower().endswith(".csv"):
+        return pd.read_csv(filename)
+    return pd.read_excel(filename)
+
+
+def restore_frame(df, replace_mode, dry_run=False):
+    """
+    Insert a backup frame into inventory and return the row count.
+    Strategy: always ignore primary key 'id' to avoid duplicate key conflicts
+    and let the database assign new IDs. replace_mode deletes existing rows
+    first; dry_run does all of it and rolls back. Raises ValueError if the
+    frame has no restorable columns.
+    """
+    valid_columns = table_columns(TABLE_NAME)
+
+    # Determine usable columns (intersection) and drop 'id' if present
+    use_cols = [c for c in df.columns if c in valid_columns]
+    if not use_cols:
+        raise ValueError("No valid inventory columns in backup.")
+
+    if 'id' in use_cols:
+        use_cols = [c for c in use_cols if c != 'id']
+
+    if not use_cols:
+        raise ValueError("No restorable (non-id) columns found.")
+
+    # object dtype turns numpy scalars into plain Python values psycopg2 can adapt
+    data = df[use_cols].astype(object)
+    data = data.where(pd.notna(data), None)
+    col_list_sql = ", ".join(use_cols)
+    # Wipe and reload as one unit: a failed restore leaves the old data in place.
+    with transaction() as tx:
+        if replace_mode:
+            execute(f"DELETE FROM {TABLE_NAME}")
+        rows_added = sum(execute_values(
+            f"INSERT INTO {TABLE_NAME} ({col_list_sql}) VALUES %s",
+            data.itertuples(index=False, name=None)
+        ))
+        if dry_run:
+            tx.rollback()
+    return rows_added
+
+
+# ------------------------------------------------------------------
+# Dialog front ends (tkinter is imported here so the CLI never loads it)
+# ------------------------------------------------------------------
 def backup_inventory():
     """
     Backup the entire inventory table to CSV or XLSX.
     """
+    from tkinter import filedialog, messagebox
     try:
-        cols = [c[0] for c in fetch_all(f"""
-            SELECT column_name
-            FROM information_schema.columns
-            WHERE table_name='{TABLE_NAME}'
-            ORDER BY ordinal_position
-        """)]
-        if not cols:
-            messagebox.showinfo("No Data", "No columns found.")
-            return
-
-        rows = fetch_all(f"SELECT {', '.join(cols)} FROM {TABLE_NAME}")
-        if not rows:
+        df = backup_frame()
+        if df is None:
             messagebox.showinfo("No Data", "No rows to backup.")
             return
 
-        df = pd.DataFrame(rows, columns=cols)
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = filedialog.asksaveasfilename(
             defaultextension=".csv",
-            initialfile=f"{TABLE_NAME}_backup_{ts}.csv",
+            initialfile=default_backup_name(),
             filetypes=[("CSV files", "*.csv"), ("Excel files", "*.xlsx")],
             title="Save Backup"
         )
         if not filename:
             return
 
-        if filename.lower().endswith(".xlsx"):
-            df.to_excel(filename, index=False)
-        else:
-            df.to_csv(filename, index=False, encoding="utf-8-sig")
-
+        save_frame(df, filename)
         messagebox.showinfo("Success", f"Backup saved: {filename}")
     except Exception as e:
         messagebox.showerror("Backup Error", str(e))
@@ -49,11 +96,10 @@ def backup_inventory():
 
 def restore_inventory(refresh_table_fn=None, refresh_comboboxes_fn=None):
     """
-    Restore rows from a CSV/XLSX backup file into inventory.
-    Strategy: always ignore primary key 'id' to avoid duplicate key conflicts
-    and let the database assign new IDs.
+    Restore rows from a CSV/XLSX backup file into inventory (see restore_frame).
     If REPLACE is chosen, existing rows are deleted first.
     """
+    from tkinter import filedialog, messagebox
     try:
         filename = filedialog.askopenfilename(
             title="Select Backup File",
@@ -62,11 +108,7 @@ def restore_inventory(refresh_table_fn=None, refresh_comboboxes_fn=None):
         if not filename:
             return
 
-        if filename.lower().endswith(".csv"):
-            df = pd.read_csv(filename)
-        else:
-            df = pd.read_excel(filename)
-
+        df = read_backup(filename)
         if df.empty:
             messagebox.showwarning("Empty", "Backup file has no data.")
             return
@@ -80,39 +122,13 @@ def restore_inventory(refresh_table_fn=None, refresh_comboboxes_fn=None):
         if replace_mode:
             if not messagebox.askyesno("Confirm Replace", "This will DELETE all current data. Continue?"):
                 return
-            execute(f"DELETE FROM {TABLE_NAME}")
-
-        valid_columns = [c[0] for c in fetch_all(f"""
-            SELECT column_name
-            FROM information_schema.columns
-            WHERE table_name='{TABLE_NAME}'
-        """)]
-
-        # Determine usable columns (intersection) and drop 'id' if present
-        use_cols = [c for c in df.columns if c in valid_columns]
-        if not use_cols:
-            messagebox.showerror("Error", "No valid inventory columns in backup.")
-            return
-
-        if 'id' in use_cols:
-            use_cols = [c for c in use_cols if c != 'id']
 
-        if not use_cols:
-            messagebox.showerror("Error", "No restorable (non-id) columns found.")
+        try:
+            rows_added = restore_frame(df, replace_mode)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
             return
 
-        rows_added = 0
-        with get_cursor() as cur:
-            placeholders = ", ".join(["%s"] * len(use_cols))
-            col_list_sql = ", ".join(use_cols)
-            for _, r in df[use_cols].iterrows():
-                vals = [None if pd.isna(v) else v for v in r]
-                cur.execute(
-                    f"INSERT INTO {TABLE_NAME} ({col_list_sql}) VALUES ({placeholders})",
-                    vals
-                )
-                rows_added += 1
-
         messagebox.showinfo(
             "Restore Complete",
             f"Restored {rows_added} rows.\n(Primary keys re-generated)"
@@ -127,4 +143,11 @@ def restore_inventory(refresh_table_fn=None, refresh_comboboxes_fn=None):
         messagebox.showerror("Restore Error", str(e))
 
 
-__all__ = ["backup_inventory", "restore_inventory"]
\ No newline at end of file
+__all__ = [
+    "backup_frame",
+    "default_backup_name",
+    "read_backup",
+    "restore_frame",
+    "backup_inventory",
+    "restore_inventory",
+]
@@ -12,6 +12,7 @@ Adjustments:
 
 from __future__ import annotations
 from datetime import datetime
+from functools import lru_cache
 import os
 import re
 from typing import Iterable, Tuple, Dict, Optional, List
@@ -20,7 +21,8 @@ import barcode
 from barcode.writer import ImageWriter
 
 from utils.formatting import sanitize_filename
-from db.queries import fetch_all
+from utils.parsing import PARSE_CACHE_SIZE
+from db.queries import fetch_all, fetch_iter
 from db.connection import get_cursor
 
 # ------------------------------------------------------------------
@@ -95,6 +97,7 @@ _DECIMAL_RE = re.compile(r'^\s*0?\.(\d{1,4})')
 def _normalize(s: Optional[str]) -> str:
     return (s or "").strip().upper()
 
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
 def _material_code(metal_type: Optional[str]) -> str:
     key = _normalize(metal_type)
     if not key:
@@ -110,6 +113,7 @@ def _material_code(metal_type: Optional[str]) -> str:
     letters = ''.join(ch for ch in first if ch.isalpha())[:2].upper()
     return letters.ljust(2, "X") if letters else "XX"
 
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
 def _parse_dimensions(dimensions: Optional[str]) -> Tuple[Optional[float], Optional[float]]:
     if not dimensions:
         return None, None
@@ -178,6 +182,7 @@ def _extract_gauge_numeric(thickness: str) -> Optional[str]:
         return None
     return m.group(1)[:2].zfill(2)
 
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
 def format_thickness_token(thickness: Optional[str], metal_type: Optional[str]) -> Optional[str]:
     if not thickness:
         return None
@@ -234,6 +239,27 @@ def _ensure_unique(code: str, cur) -> str:
         code = f"{base}{alpha(idx)}"
         idx += 1
 
+BARCODE_LOCK_ID = 7301947    # advisory lock serializing bulk barcode allocation (Postgres)
+
+def allocate_barcodes(wanted: Iterable[Tuple[int, str]], taken: set) -> List[Tuple[int, str]]:
+    """
+    Pick a free code for every (key, base) in memory: base itself, else
+    base1, base2, ... - the first not in `taken`. Chosen codes are added to
+    `taken`, so rows sharing a base get distinct suffixes. No queries.
+    """
+    next_suffix: Dict[str, int] = {}
+    out = []
+    for key, base in wanted:
+        n = next_suffix.get(base, 0)
+        code = f"{base}{n}" if n else base
+        while code in taken:
+            n += 1
+            code = f"{base}{n}"
+        next_suffix[base] = n + 1
+        taken.add(code)
+        out.append((key, code))
+    return out
+
 # ------------------------------------------------------------------
 # Barcode image generation
 # ------------------------------------------------------------------
@@ -305,7 +331,8 @@ def get_or_create_barcode_image(barcode_value: str,
 # Inventory bulk helpers
 # ------------------------------------------------------------------
 def get_barcode_items():
-    return fetch_all("""
+    """Iterator of (barcode, shelf, thickness, metal_type, dimensions, quantity) rows."""
+    return fetch_iter("""
         SELECT barcode, shelf, thickness, metal_type, dimensions, quantity
         FROM inventory ORDER BY metal_type, thickness
     """)
@@ -355,15 +382,16 @@ def generate_compact_barcodes_service(migrate_legacy: bool = True,
     """
     Returns (assigned_new, migrated_existing, rewritten_total, total_rows)
     """
-    rows = fetch_all("""
+    rows = fetch_iter("""
         SELECT id, shelf, thickness, metal_type, dimensions, barcode
         FROM inventory ORDER BY id
     """)
-    total = len(rows)
+    total = 0
     assigned = migrated = rewritten = 0
 
     with get_cursor() as cur:
         for rec_id, shelf, thickness, metal_type, dimensions, bc in rows:
+            total += 1
             need_rebuild = force_rebuild_all
             if not force_rebuild_all:
                 if not bc or not str(bc).strip():
@@ -565,6 +593,7 @@ __all__ = [
     "generate_compact_code",
     "ensure_compact_if_needed",
     "derive_compact_barcode_value",
+    "allocate_barcodes",
     "generate_compact_barcodes_service",
     "get_barcode_items",
     "generate_all_barcodes_service",
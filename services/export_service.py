@@ -2,17 +2,12 @@
 from datetime import datetime
 import pandas as pd
 
-from db.queries import fetch_all
+from db.queries import fetch_all, fetch_iter, fetch_frame
 from db.connection import get_cursor
-from services.inventory_service import parse_dimensions  # reuse
+from services.inventory_service import extract_dimensions
+from utils.parsing import parse_dimensions, thickness_to_decimal  # memoized
 # inches_to_feet_inches imported in main; we do raw numbers here
 
-GAUGE_TO_INCHES = {
-    "6": 0.1935,"7": 0.1875,"8": 0.1644,"9": 0.1500,"10": 0.1350,"11": 0.1200,"12": 0.1050,
-    "13": 0.0897,"14": 0.0750,"15": 0.0673,"16": 0.0600,"17": 0.0538,"18": 0.0480,"19": 0.0418,
-    "20": 0.0360,"22": 0.0300,"24": 0.0240,"26": 0.0180,"28": 0.0150,"30": 0.0120
-}
-
 PRONEST_HEADERS = [
     "Description", "Plate Type", "Units", "Length", "Width", "MaterialID",
     "Material", "Thickness", "Stock Qty", "Unit Price", "Date Created",
@@ -22,7 +17,15 @@ PRONEST_HEADERS = [
 ]
 
 def fetch_inventory_rows_for_csv():
-    return fetch_all("""
+    return fetch_iter("""
+        SELECT barcode, shelf, thickness, metal_type,
+               dimensions, location, quantity, usable_scrap, date
+        FROM inventory
+    """)
+
+def fetch_inventory_csv_dataframe():
+    """Full-table CSV export frame, read column-wise via fetch_frame."""
+    return fetch_frame("""
         SELECT barcode, shelf, thickness, metal_type,
                dimensions, location, quantity, usable_scrap, date
         FROM inventory
@@ -43,7 +46,7 @@ def fetch_pronest_source_rows(visible_items=None):
             for shelf, thickness, metal_type, dimensions in visible_items:
                 cur.execute("""
                     SELECT metal_type, thickness, dimensions, quantity, length, width,
-                           location, date, shelf, usable_scrap
+                           location, date, shelf, usable_scrap, thickness_in
                     FROM inventory
                     WHERE shelf=%s AND thickness=%s AND metal_type=%s AND dimensions=%s
                 """, (shelf, thickness, metal_type, dimensions))
@@ -53,35 +56,10 @@ def fetch_pronest_source_rows(visible_items=None):
         return out
     return fetch_all("""
         SELECT metal_type, thickness, dimensions, quantity, length, width,
-               location, date, shelf, usable_scrap
+               location, date, shelf, usable_scrap, thickness_in
         FROM inventory
     """)
 
-def thickness_to_decimal(thickness_str: str):
-    if not thickness_str:
-        return 0.0
-    s = thickness_str.strip()
-    if any(g in s.upper() for g in ["G","GA","GAUGE"]):
-        digits = ''.join(c for c in s if c.isdigit())
-        if digits and digits in GAUGE_TO_INCHES:
-            return GAUGE_TO_INCHES[digits]
-        return 0.0
-    if s in GAUGE_TO_INCHES:
-        return GAUGE_TO_INCHES[s]
-    if "/" in s:
-        mapping = {"1/8":0.1250,"1/4":0.2500,"3/8":0.3750,"1/2":0.5000,"5/8":0.6250,"3/4":0.7500,"1":1.0,"7/8":0.8750}
-        if s in mapping:
-            return mapping[s]
-        try:
-            a,b = s.split('/')
-            return float(a)/float(b)
-        except Exception:
-            return 0.0
-    try:
-        return float(s)
-    except:
-        return 0.0
-
 def classify_material_code(metal_type, thickness_original):
     metal_type_l = (metal_type or "").lower()
     code = thickness_original or ""
@@ -118,7 +96,7 @@ def build_pronest_dataframe(source_rows):
     data = []
     for idx, row in enumerate(source_rows):
         (metal_type, thickness, dimensions, quantity, length, width,
-         location, date_val, shelf, usable_scrap) = row
+         location, date_val, shelf, usable_scrap, thickness_in) = row
 
         if (not length or not width) and dimensions and 'x' in str(dimensions).lower():
             parsed = parse_dimensions(dimensions)
@@ -130,7 +108,8 @@ def build_pronest_dataframe(source_rows):
         width_feet = int(float(width)/12)
 
         thickness_str = thickness.strip() if thickness else ""
-        decimal_thickness = thickness_to_decimal(thickness_str)
+        # thickness_in is NULL when the text isn't a known thickness (0.0 here).
+        decimal_thickness = float(thickness_in) if thickness_in is not None else thickness_to_decimal(thickness_str)
         material_code = classify_material_code(metal_type, thickness_str)
         prefix = description_prefix(metal_type)
         description = f"{prefix}{material_code} ({width_feet}' x {length_feet}')"
@@ -164,4 +143,20 @@ def export_inventory_pronest_dataframe(visible_items=None):
         src_rows = fetch_pronest_source_rows()
     if not src_rows:
         return None
-    return build_pronest_dataframe(src_rows)
\ No newline at end of file
+    return build_pronest_dataframe(src_rows)
+
+def pronest_export(visible_items=None):
+    """
+    The ProNest export as the GUI and CLI run it: refresh length/width from
+    the dimensions text first (rows added since the last export), then
+    build the frame. Returns (DataFrame or None, extract_dimensions() counts).
+    """
+    counts = extract_dimensions()
+    return export_inventory_pronest_dataframe(visible_items), counts
+
+def save_frame(df, path):
+    """Write an export frame: .xlsx as Excel, anything else as CSV (UTF-8 with BOM for Excel)."""
+    if path.lower().endswith(".xlsx"):
+        df.to_excel(path, index=False)
+    else:
+        df.to_csv(path, index=False, encoding="utf-8-sig")
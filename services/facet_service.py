@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Facets: the distinct values of each inventory column, with row counts.
+
+get_facets() answers every column in one grouped UNION ALL query instead of
+one SELECT DISTINCT per combobox. With filters it returns the values still
+present under them; each column ignores its own filter so the user can
+switch to another value of it.
+
+Results are cached. While the inventory snapshot is loaded the cache lives
+as long as the snapshot version (which moves on every local write and every
+change notification); otherwise entries expire after FACET_CACHE_TTL.
+"""
+import threading
+import time
+from datetime import date
+
+from db.queries import fetch_all
+from services.snapshot_service import get_snapshot, RANGE_FILTERS
+
+FACET_COLUMNS = (
+    "barcode", "shelf", "thickness", "metal_type", "dimensions",
+    "location", "quantity", "usable_scrap", "date",
+)
+FACET_CACHE_TTL = 30        # seconds, only used while the snapshot isn't loaded
+FACET_CACHE_SIZE = 32       # distinct filter combinations kept
+
+# Values come back as text (UNION ALL needs one type); these are converted back.
+_FACET_TYPES = {"quantity": int, "date": date.fromisoformat}
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _where(filters, ranges, exclude):
+    clauses, params = [], []
+    for col, value in filters.items():
+        if col != exclude:
+            clauses.append(f"{col} = %s")
+            params.append(value)
+    for key, bound in ranges.items():
+        col, lower = RANGE_FILTERS[key]
+        clauses.append(f"{col} {'>=' if lower else '<='} %s")
+        params.append(bound)
+    return "".join(f" AND {c}" for c in clauses), params
+
+
+def _query_facets(filters, ranges, columns):
+    parts, params = [], []
+    for col in columns:
+        where, where_params = _where(filters, ranges, exclude=col)
+        parts.append(f"""
+            SELECT '{col}' AS facet, CAST({col} AS TEXT) AS value, COUNT(*) AS n
+            FROM inventory
+            WHERE {col} IS NOT NULL{where}
+            GROUP BY {col}
+        """)
+        params.extend(where_params)
+    facets = {col: [] for col in columns}
+    for col, value, count in fetch_all(" UNION ALL ".join(parts), params):
+        convert = _FACET_TYPES.get(col)
+        facets[col].append((convert(value) if convert else value, count))
+    for values in facets.values():
+        values.sort(key=lambda vc: vc[0])
+    return facets
+
+
+def get_facets(filters=None, ranges=None, columns=FACET_COLUMNS):
+    """
+    {column: [(value, row_count), ...]} sorted by value, NULLs left out.
+    filters: {column: value}; ranges: numeric range filters as used by the
+    View tab (length_min, thickness_max, ...).
+    """
+    filters = {c: v for c, v in (filters or {}).items() if v not in (None, "")}
+    ranges = dict(ranges or {})
+    for col in filters:
+        if col not in FACET_COLUMNS:
+            raise ValueError(f"Unknown facet column: {col}")
+    key = (tuple(sorted(filters.items())), tuple(sorted(ranges.items())), tuple(columns))
+
+    snap = get_snapshot()
+    if snap.loaded:
+        snap.sync()     # non-blocking; bumps the version if anything changed
+    version = snap.version if snap.loaded else None
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit and hit[0] == version and (version is not None or now - hit[1] < FACET_CACHE_TTL):
+            return hit[2]
+
+    facets = _query_facets(filters, ranges, columns)
+    with _cache_lock:
+        if len(_cache) >= FACET_CACHE_SIZE:
+            _cache.clear()
+        _cache[key] = (version, now, facets)
+    return facets
+
+
+def facet_values(facets, column):
+    """Just the values of one column, e.g. for a combobox."""
+    return [value for value, _ in facets.get(column, ())]
+
+
+def invalidate_facets():
+    with _cache_lock:
+        _cache.clear()
+
+
+__all__ = [
+    "FACET_COLUMNS",
+    "get_facets",
+    "facet_values",
+    "invalidate_facets",
+]
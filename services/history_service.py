@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Quantity history: what was on hand at a past date, and how fast it is used.
+
+inventory_history (migration 10) is filled by triggers on inventory: a
+'change' row whenever an item's quantity, barcode, metal type, thickness or
+dimensions change (with the delta), and a 'delete' row when it is removed.
+run_history_maintenance() adds a 'checkpoint' row per item every
+HISTORY_CHECKPOINT_DAYS and at the start of each month. A point-in-time
+read starts from the last checkpoint at or before that time, so it scans at
+most one checkpoint interval of rows however long the history gets; before
+the first checkpoint (a new install) it reads from the start of history.
+Retention writes a checkpoint at its cutoff before dropping anything, so
+what remains is always complete from its first row.
+
+On Postgres the table is partitioned by month: range reads only touch the
+months they cover, maintenance creates the partitions ahead of time, and
+retention drops whole partitions. On SQLite retention is a DELETE.
+
+Times may be datetimes (naive ones are local time) or dates; a date means
+the end of that day for a point in time, its start for a range start.
+"""
+import re
+from datetime import date, datetime, time, timedelta, timezone
+
+from db.connection import is_sqlite
+from db.queries import fetch_all, fetch_one
+from db.schema import (
+    HISTORY_PARTITION_PREFIX, HISTORY_PARTITIONS_AHEAD, ensure_history_partitions,
+)
+from db.transaction import transaction
+from utils.periodic import PeriodicTask
+
+HISTORY_MAINTENANCE_INTERVAL = 3600  # seconds between checkpoint/partition/retention runs
+HISTORY_CHECKPOINT_DAYS = 7          # a full checkpoint at least this often
+HISTORY_KEEP_MONTHS = 24             # whole months of history kept
+HISTORY_LOCK_ID = 7301946            # advisory lock serializing maintenance (Postgres)
+
+HISTORY_FILTER_COLUMNS = ("barcode", "metal_type", "thickness", "dimensions")
+HISTORY_GROUP_COLUMNS = ("item_id",) + HISTORY_FILTER_COLUMNS
+
+_PARTITION_RE = re.compile(re.escape(HISTORY_PARTITION_PREFIX) + r"(\d{4})m(\d{2})$")
+
+_maintenance_task = None
+
+
+def _bound(when, end_of_day):
+    if not isinstance(when, datetime):
+        day = when + timedelta(days=1) if end_of_day else when
+        when = datetime.combine(day, time()) - (timedelta(microseconds=1) if end_of_day else timedelta(0))
+    when = when.astimezone(timezone.utc)
+    # SQLite stores CURRENT_TIMESTAMP text: naive UTC.
+    return when.replace(tzinfo=None) if is_sqlite() else when
+
+
+def _as_datetime(value):
+    if isinstance(value, str):   # SQLite returns MAX(...) / expressions as text
+        value = datetime.fromisoformat(value)
+    if value is not None and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _month_start(day, offset=0):
+    index = day.year * 12 + day.month - 1 + offset
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _filter_sql(filters, prefix=" AND "):
+    clauses, params = [], []
+    for col, value in (filters or {}).items():
+        if col not in HISTORY_FILTER_COLUMNS:
+            raise ValueError(f"Unknown history filter column: {col}")
+        clauses.append(f"{col} = %s")
+        params.append(value)
+    return "".join(prefix + c for c in clauses), params
+
+
+# ------------------------------------------------------------------
+# Queries
+# ------------------------------------------------------------------
+def _read_start(as_of, when):
+    """
+    Where a read as of `as_of` starts: the last checkpoint at or before it,
+    or the first history row when there is no checkpoint yet (nothing has
+    been dropped then: retention leaves a checkpoint at its cutoff).
+    """
+    at, first = fetch_one("""
+        SELECT MAX(CASE WHEN kind = 'checkpoint' THEN recorded_at END), MIN(recorded_at)
+        FROM inventory_history
+        WHERE recorded_at <= %s
+    """, (as_of,))
+    if at is None and first is None:
+        raise ValueError(f"No inventory history as far back as {when}")
+    return at if at is not None else first
+
+
+def _state_sql(where=""):
+    # Latest row per item in [since, as_of]; params: since, as_of, then where's.
+    return f"""
+        SELECT item_id, barcode, metal_type, thickness, dimensions, quantity
+        FROM (
+            SELECT h.*, ROW_NUMBER() OVER (
+                       PARTITION BY item_id ORDER BY recorded_at DESC, id DESC) AS rn
+            FROM inventory_history h
+            WHERE recorded_at >= %s AND recorded_at <= %s
+        ) latest
+        WHERE rn = 1 AND kind <> 'delete'{where}
+    """
+
+
+def inventory_at(when, filters=None):
+    """
+    Items as they were at `when`: [(item_id, barcode, metal_type, thickness,
+    dimensions, quantity)] ordered by item id, leaving out items deleted by
+    then. filters: {column: value} on those columns, as they were at `when`.
+    Raises ValueError when `when` is older than the retained history.
+    """
+    as_of = _bound(when, end_of_day=True)
+    since = _read_start(as_of, when)
+    where, params = _filter_sql(filters)
+    return fetch_all(_state_sql(where) + " ORDER BY item_id", [since, as_of] + params)
+
+
+def stock_at(when, filters=None):
+    """{"items", "sheets"} on hand at `when`, e.g. stock_at(date(2026, 3, 1),
+    {"metal_type": "Galvanized", "thickness": "12 ga"})."""
+    rows = inventory_at(when, filters)
+    return {"items": len(rows), "sheets": sum(r[5] for r in rows)}
+
+
+def consumption_rate(start, end, filters=None, group_by=("metal_type", "thickness")):
+    """
+    Sheets used and received between start and end (inclusive dates), per
+    group_by columns: [(*group values, used, received, used_per_day)], most
+    used first. Used is the sum of quantity decreases; received the
+    increases, including new items. Deleted items count as neither.
+    """
+    for col in group_by:
+        if col not in HISTORY_GROUP_COLUMNS:
+            raise ValueError(f"Unknown history group column: {col}")
+    lo, hi = _bound(start, end_of_day=False), _bound(end, end_of_day=True)
+    days = max((hi - lo).total_seconds() / 86400, 1e-9)
+    where, params = _filter_sql(filters)
+    cols = ", ".join(group_by)
+    rows = fetch_all(f"""
+        SELECT {cols + ", " if cols else ""}
+               SUM(CASE WHEN delta < 0 THEN -delta ELSE 0 END) AS used,
+               SUM(CASE WHEN delta > 0 THEN delta ELSE 0 END) AS received
+        FROM inventory_history
+        WHERE kind = 'change' AND recorded_at >= %s AND recorded_at <= %s{where}
+        {"GROUP BY " + cols if cols else ""}
+    """, [lo, hi] + params)
+    out = []
+    for row in rows:
+        used, received = int(row[-2] or 0), int(row[-1] or 0)
+        if group_by and not used and not received:
+            continue    # e.g. only renamed in the range
+        out.append(tuple(row[:-2]) + (used, received, round(used / days, 3)))
+    out.sort(key=lambda r: -r[-3])
+    return out
+
+
+# ------------------------------------------------------------------
+# Maintenance
+# ------------------------------------------------------------------
+def write_checkpoint():
+    """Record every item's current state. Returns the number of rows written."""
+    with transaction() as tx:
+        if is_sqlite():
+            at = tx.fetch_one("SELECT CURRENT_TIMESTAMP")[0]
+        else:
+            tx.fetch_one("SELECT pg_advisory_xact_lock(%s)", (HISTORY_LOCK_ID,))
+            # Waits for running writers; later ones stamp their rows after `at`.
+            tx.execute("LOCK TABLE inventory IN SHARE MODE")
+            at = tx.fetch_one("SELECT clock_timestamp()")[0]
+        return tx.execute("""
+            INSERT INTO inventory_history
+                (item_id, recorded_at, kind, quantity, delta, barcode, metal_type, thickness, dimensions)
+            SELECT id, %s, 'checkpoint', COALESCE(quantity, 0), 0, barcode, metal_type, thickness, dimensions
+            FROM inventory
+        """, (at,))
+
+
+def checkpoint_due(now=None):
+    now = now or datetime.now(timezone.utc)
+    latest = _as_datetime(fetch_one(
+        "SELECT MAX(recorded_at) FROM inventory_history WHERE kind = 'checkpoint'")[0])
+    return (latest is None
+            or now - latest >= timedelta(days=HISTORY_CHECKPOINT_DAYS)
+            or (latest.year, latest.month) != (now.year, now.month))
+
+
+def ensure_partitions():
+    """Postgres: this month's and the next HISTORY_PARTITIONS_AHEAD months' partitions."""
+    if is_sqlite():
+        return []
+    with transaction() as tx:
+        tx.fetch_one("SELECT pg_advisory_xact_lock(%s)", (HISTORY_LOCK_ID,))
+        with tx.cursor() as cur:
+            return ensure_history_partitions(
+                cur, datetime.now(timezone.utc).date(), HISTORY_PARTITIONS_AHEAD + 1)
+
+
+def _checkpoint_cutoff(tx, at):
+    # Before the rows older than `at` go, record the state at `at` so reads
+    # from then on still find every item. Nothing to do if nothing is older.
+    if tx.fetch_one("SELECT 1 FROM inventory_history WHERE recorded_at < %s LIMIT 1", (at,)) is None:
+        return 0
+    if tx.fetch_one("SELECT 1 FROM inventory_history WHERE kind = 'checkpoint' AND recorded_at = %s "
+                    "LIMIT 1", (at,)) is not None:
+        return 0
+    return tx.execute(f"""
+        INSERT INTO inventory_history
+            (item_id, recorded_at, kind, quantity, delta, barcode, metal_type, thickness, dimensions)
+        SELECT item_id, %s, 'checkpoint', quantity, 0, barcode, metal_type, thickness, dimensions
+        FROM ({_state_sql()}) AS state
+    """, (at, _read_start(at, at), at))
+
+
+def apply_retention(keep_months=HISTORY_KEEP_MONTHS):
+    """
+    Drop history older than keep_months whole months (Postgres: the
+    partitions themselves), after checkpointing the state at the cutoff.
+    Returns the number of partitions dropped, or rows deleted on SQLite.
+    """
+    cutoff = _month_start(datetime.now(timezone.utc).date(), -keep_months)
+    if is_sqlite():
+        at = datetime.combine(cutoff, time())
+        with transaction() as tx:
+            _checkpoint_cutoff(tx, at)
+            return tx.execute("DELETE FROM inventory_history WHERE recorded_at < %s", (at,))
+    dropped = 0
+    with transaction() as tx:
+        tx.fetch_one("SELECT pg_advisory_xact_lock(%s)", (HISTORY_LOCK_ID,))
+        _checkpoint_cutoff(tx, datetime.combine(cutoff, time(), timezone.utc))
+        for (name,) in tx.fetch_all("""
+            SELECT c.relname
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'inventory_history'::regclass
+            ORDER BY c.relname
+        """):
+            m = _PARTITION_RE.match(name)
+            if m and date(int(m.group(1)), int(m.group(2)), 1) < cutoff:
+                tx.execute(f"DROP TABLE {name}")
+                dropped += 1
+        tx.execute("DELETE FROM inventory_history_default WHERE recorded_at < %s",
+                   (datetime.combine(cutoff, time(), timezone.utc),))
+    return dropped
+
+
+def run_history_maintenance():
+    created = ensure_partitions()
+    checkpoint = write_checkpoint() if checkpoint_due() else 0
+    dropped = apply_retention()
+    return {"partitions_created": len(created), "checkpoint_rows": checkpoint,
+            "retention": dropped}
+
+
+def start_history_maintenance(interval=HISTORY_MAINTENANCE_INTERVAL):
+    """Run maintenance now (checkpoint, partitions, retention), then every interval."""
+    global _maintenance_task
+    if _maintenance_task is None:
+        _maintenance_task = PeriodicTask(run_history_maintenance, interval,
+                                         name="history-maintenance", run_first=True).start()
+    return _maintenance_task
+
+
+def stop_history_maintenance():
+    global _maintenance_task
+    if _maintenance_task is not None:
+        _maintenance_task.stop()
+        _maintenance_task = None
+
+
+__all__ = [
+    "HISTORY_CHECKPOINT_DAYS",
+    "HISTORY_KEEP_MONTHS",
+    "inventory_at",
+    "stock_at",
+    "consumption_rate",
+    "write_checkpoint",
+    "checkpoint_due",
+    "ensure_partitions",
+    "apply_retention",
+    "run_history_maintenance",
+    "start_history_maintenance",
+    "stop_history_maintenance",
+]
@@ -0,0 +1,614 @@
+# -*- coding: utf-8 -*-
+"""
+Inventory import engine (no UI; inventory_import.py and inventory_cli.py drive it).
+
+read_chunks() streams the sheet IMPORT_CHUNK_ROWS rows at a time (CSV
+through pandas' chunked reader, XLSX through openpyxl's read-only rows), so
+memory stays flat however big the file is; each chunk is merged and
+committed on its own. clean_frame() turns a chunk into typed columns with
+whole-column pandas operations (no per-row Python), flagging rows that
+can't be imported with a reason; merge_rows() writes the good rows with a
+handful of set-based statements instead of one INSERT/UPDATE per row:
+
+  1. COPY the rows into a temp staging table,
+  2. flag the ones whose match key (shelf + thickness + metal_type +
+     dimensions + location, blanks as '') already exists in inventory,
+  3. INSERT the first row of every new key (ON CONFLICT on the barcode
+     index skips rows whose barcode is taken - counted as errors, and the
+     key's next row is tried in another round),
+  4. for the remaining duplicate rows either UPDATE the existing rows from
+     the last row per key, or skip them. Keys whose rows would set a
+     barcode used elsewhere are applied row by row.
+
+Counts: updated is the number of existing items the import actually
+changed (re-importing the same sheet updates nothing); rows without any
+key field are ignored.
+"""
+import time
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+from db.connection import is_sqlite
+from db.queries import fetch_all
+from db.transaction import transaction
+from utils.parsing import normalize_date_series
+from services.barcode_service import (
+    BARCODE_LOCK_ID,
+    allocate_barcodes,
+    generate_scannable_barcode,
+    derive_compact_barcode_value,
+    generate_compact_code
+)
+
+DEBUG_IMPORT = False
+IMPORT_CHUNK_ROWS = 5000    # rows read, merged and committed at a time
+
+# Sheet header (lower-cased, trimmed) -> inventory column.
+IMPORT_COLUMN_MAP = {
+    "barcode": "barcode",
+    "shelf": "shelf",
+    "thickness": "thickness",
+    "metal_type": "metal_type",
+    "metal": "metal_type",
+    "material": "metal_type",
+    "dimensions": "dimensions",
+    "dimension": "dimensions",
+    "location": "location",
+    "qty": "quantity",
+    "quantity": "quantity",
+    "usable_scrap": "usable_scrap",
+    "sheet size": "usable_scrap",
+    "sheet_size": "usable_scrap",
+    "date": "date",
+    "date_added": "date",
+}
+MATCH_KEY = ("shelf", "thickness", "metal_type", "dimensions", "location")
+# Row layout produced by normalize_frame() and expected by merge_rows().
+IMPORT_COLUMNS = ("barcode", "shelf", "thickness", "metal_type", "dimensions",
+                  "location", "quantity", "usable_scrap", "date")
+
+_MAX_QUANTITY = 2 ** 31     # inventory.quantity is an INTEGER
+_STAGING = "import_staging"
+_TARGETS = "import_targets"     # duplicate row -> matching inventory ids
+_BARCODE_ATTEMPTS = 3       # re-allocations after losing a code to another writer
+_KEYS = ("k_shelf", "k_thickness", "k_metal_type", "k_dimensions", "k_location")
+
+
+class SheetError(ValueError):
+    """The file has no rows or no recognisable inventory columns."""
+
+
+class ImportStopped(RuntimeError):
+    """
+    A chunk failed part-way through import_sheet(). totals covers the rows
+    read so far; saved is how many of them were committed.
+    """
+    def __init__(self, cause, totals, saved):
+        super().__init__(str(cause))
+        self.totals = totals
+        self.saved = saved
+
+
+def _unique_headers(header):
+    # Same names pandas gives: "Unnamed: n" for blanks, "x.1" for repeats.
+    seen, names = {}, []
+    for i, h in enumerate(header):
+        name = f"Unnamed: {i}" if h is None else h
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _xlsx_chunks(path, chunk_rows):
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = _unique_headers(header)
+        width = len(columns)
+        start, batch = 0, []
+        for values in rows:
+            if all(v is None for v in values):
+                continue    # blank / formatting-only rows
+            batch.append(tuple(values[:width]) + (None,) * (width - len(values)))
+            if len(batch) == chunk_rows:
+                yield pd.DataFrame(batch, columns=columns, dtype=object,
+                                   index=range(start, start + len(batch)))
+                start, batch = start + len(batch), []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns, dtype=object,
+                               index=range(start, start + len(batch)))
+    finally:
+        wb.close()
+
+
+def read_chunks(path, chunk_rows=IMPORT_CHUNK_ROWS):
+    """
+    Yield a CSV/XLSX sheet as DataFrames of up to chunk_rows rows (None:
+    the whole sheet as one frame). CSV columns are read as text so every
+    chunk parses alike; index labels run on across chunks.
+    """
+    if not path.lower().endswith(".csv"):
+        yield from _xlsx_chunks(path, chunk_rows or float("inf"))
+    elif not chunk_rows:
+        yield pd.read_csv(path, dtype=str)
+    else:
+        with pd.read_csv(path, dtype=str, chunksize=chunk_rows) as reader:
+            yield from reader
+
+
+def map_columns(df):
+    """Rename recognised headers to inventory columns; None if there are none."""
+    renamed = {}
+    for c in df.columns:
+        k = str(c).strip().lower()
+        if k in IMPORT_COLUMN_MAP:
+            renamed[c] = IMPORT_COLUMN_MAP[k]
+    df = df.rename(columns=renamed)
+    if not any(c in IMPORT_COLUMN_MAP.values() for c in df.columns):
+        return None
+    return df
+
+
+def open_sheet(path, chunk_rows=IMPORT_CHUNK_ROWS):
+    """
+    read_chunks() after checking the first chunk: raises SheetError if the
+    file has no rows or no recognisable columns (read errors propagate).
+    """
+    chunks = read_chunks(path, chunk_rows)
+    first = next(chunks, None)
+    if first is None or first.empty:
+        raise SheetError("File has no rows.")
+    if map_columns(first) is None:
+        raise SheetError("No recognizable inventory columns found.")
+    if DEBUG_IMPORT:
+        print(f"[IMPORT] Columns: {list(first.columns)}")
+    return chain([first], chunks)
+
+
+def _text(df, col):
+    # Column as trimmed text, missing values None (a blank cell stays "").
+    if col not in df.columns:
+        return pd.Series([None] * len(df), index=df.index, dtype=object)
+    values = df[col]
+    missing = values.isna()
+    return values.astype(str).str.strip().astype(object).where(~missing, None)
+
+
+def _quantities(text):
+    # "7", "7.", "10.0", "12.3" (floored toward zero), "1e3"; blank -> 0.
+    blank = text.isna() | text.isin(["", "NaN"])
+    number = pd.to_numeric(text.where(~blank), errors="coerce")
+    bad = ~blank & ~(number.abs() < _MAX_QUANTITY)     # also NaN / inf
+    quantity = np.trunc(number.where(~blank, 0)).where(~bad).astype("Int64").astype(object)
+    return quantity.where(~bad, None), bad
+
+
+def clean_frame(df):
+    """
+    Column-mapped frame -> (clean, bad, reasons), a column at a time:
+    clean has the IMPORT_COLUMNS (text trimmed, missing values None,
+    quantity int, date 'YYYY-MM-DD' or None when blank / unreadable) for
+    the rows with any match key field; bad marks the ones that can't be
+    imported and reasons says why (None for good rows).
+    """
+    text = {c: _text(df, c) for c in IMPORT_COLUMNS}
+    keyed = np.logical_or.reduce([text[c].fillna("") != "" for c in MATCH_KEY])
+    clean = pd.DataFrame({c: text[c][keyed] for c in IMPORT_COLUMNS})
+    quantity, bad = _quantities(clean["quantity"])
+    reasons = ("Unrecognized quantity '" + clean["quantity"] + "'").where(bad, None)
+    clean["quantity"] = quantity
+    clean["date"] = normalize_date_series(clean["date"])
+    return clean, bad, reasons
+
+
+def normalize_frame(df):
+    """
+    Column-mapped frame -> (rows, errors): rows are clean_frame()'s good
+    rows as IMPORT_COLUMNS tuples; errors counts the bad ones. Rows without
+    any match key field are dropped silently.
+    """
+    clean, bad, reasons = clean_frame(df)
+    if DEBUG_IMPORT:
+        for idx, why in reasons[bad].items():
+            print(f"[IMPORT][ERROR] Row {idx}: {why}")
+    rows = list(clean[~bad].itertuples(index=False, name=None))
+    return rows, int(bad.sum())
+
+
+def _key_match(alias):
+    # Matches idx_inventory_import_key, so each staged row is an index probe.
+    return " AND ".join(f"COALESCE({alias}.{c}, '') = s.{k}" for c, k in zip(MATCH_KEY, _KEYS))
+
+
+def _in_inventory():
+    return f"EXISTS (SELECT 1 FROM inventory i WHERE {_key_match('i')})"
+
+
+def _drop_staging(tx):
+    # SQLite has no ON COMMIT DROP, and inside an outer transaction (dry
+    # run) PostgreSQL keeps the tables until it ends; drop them explicitly.
+    schema = "temp" if is_sqlite() else "pg_temp"
+    for table in (_STAGING, _TARGETS):
+        tx.execute(f"DROP TABLE IF EXISTS {schema}.{table}")
+
+
+def _create_staging(tx):
+    # SQLite: no declared type, or the column's TEXT affinity keeps the
+    # COALESCE index from being used for the key lookups.
+    key_type = "" if is_sqlite() else "TEXT"
+    _drop_staging(tx)
+    tx.execute(f"""
+        CREATE TEMP TABLE {_STAGING} (
+            row_no INTEGER PRIMARY KEY,
+            barcode TEXT, shelf TEXT, thickness TEXT, metal_type TEXT,
+            dimensions TEXT, location TEXT, quantity INTEGER,
+            usable_scrap TEXT, date DATE,
+            {", ".join(f"{k} {key_type} NOT NULL" for k in _KEYS)},
+            action TEXT NOT NULL DEFAULT 'insert'
+        ) {"" if is_sqlite() else "ON COMMIT DROP"}
+    """)
+    tx.execute(f"CREATE INDEX {_STAGING}_barcode ON {_STAGING} (barcode)")
+
+
+def merge_rows(rows, duplicate_update):
+    """
+    Merge normalize_frame() rows into inventory in one transaction.
+    duplicate_update: rows whose key exists (in inventory or earlier in the
+    file) update the existing rows' barcode (when given), usable_scrap,
+    quantity and date; otherwise they are skipped.
+    Returns {"added", "updated", "skipped", "errors", "inserted"}, inserted
+    being [(id, barcode, thickness, metal_type, dimensions)] of new rows.
+    """
+    counts = {"added": 0, "updated": 0, "skipped": 0, "errors": 0, "inserted": []}
+    if not rows:
+        return counts
+    key_idx = [IMPORT_COLUMNS.index(c) for c in MATCH_KEY]
+    staged = ((n,) + tuple(row) + tuple(row[i] or "" for i in key_idx)
+              for n, row in enumerate(rows))
+    cols = IMPORT_COLUMNS
+    with transaction() as tx:
+        _create_staging(tx)
+        tx.copy_rows(_STAGING, ("row_no",) + cols + _KEYS, staged)
+        keys = ", ".join(_KEYS)
+
+        # Duplicates: key already in inventory, or not the key's first row.
+        tx.execute(f"UPDATE {_STAGING} AS s SET action = 'duplicate' WHERE {_in_inventory()}")
+        tx.execute(f"""
+            UPDATE {_STAGING} SET action = 'duplicate'
+            WHERE action = 'insert' AND row_no NOT IN (
+                SELECT MIN(row_no) FROM {_STAGING} WHERE action = 'insert' GROUP BY {keys}
+            )
+        """)
+
+        # A first row whose barcode is taken is an error, and the key's next
+        # row in the file is tried instead (as the row-by-row import did).
+        inserted = []
+        while True:
+            candidates = tx.fetch_one(f"SELECT COUNT(*) FROM {_STAGING} WHERE action = 'insert'")[0]
+            if not candidates:
+                break
+            added = tx.fetch_all(f"""
+                INSERT INTO inventory ({", ".join(cols)})
+                SELECT {", ".join(cols)} FROM {_STAGING}
+                WHERE action = 'insert'
+                ORDER BY row_no
+                ON CONFLICT (barcode) WHERE barcode IS NOT NULL AND barcode <> '' DO NOTHING
+                RETURNING id, barcode, thickness, metal_type, dimensions
+            """)
+            inserted += added
+            counts["errors"] += candidates - len(added)
+            tx.execute(f"""
+                UPDATE {_STAGING} AS s SET action = CASE
+                    WHEN {_in_inventory()} THEN 'inserted' ELSE 'error' END
+                WHERE action = 'insert'
+            """)
+            tx.execute(f"""
+                UPDATE {_STAGING} SET action = 'insert'
+                WHERE row_no IN (
+                    SELECT MIN(row_no) FROM {_STAGING}
+                    WHERE action = 'duplicate' AND ({keys}) IN (
+                        SELECT {keys} FROM {_STAGING} WHERE action = 'error'
+                    ) AND ({keys}) NOT IN (
+                        SELECT {keys} FROM {_STAGING} WHERE action = 'inserted'
+                    )
+                    GROUP BY {keys}
+                )
+            """)
+        counts["added"] = len(inserted)
+        counts["inserted"] = sorted(inserted)
+
+        duplicates = tx.fetch_one(f"SELECT COUNT(*) FROM {_STAGING} WHERE action = 'duplicate'")[0]
+        if not duplicate_update:
+            counts["skipped"] = duplicates
+        elif duplicates:
+            counts["updated"], failed = _update_duplicates(tx)
+            counts["errors"] += failed
+
+        _drop_staging(tx)
+    if DEBUG_IMPORT:
+        print(f"[IMPORT] {len(rows)} rows: {counts['added']} added, {counts['updated']} updated, "
+              f"{counts['skipped']} skipped, {counts['errors']} errors")
+    return counts
+
+
+def _update_sql(where):
+    return f"""
+        UPDATE inventory AS i SET
+            barcode = COALESCE(NULLIF(s.barcode, ''), i.barcode),
+            usable_scrap = s.usable_scrap, quantity = s.quantity, date = s.date
+        FROM (
+            SELECT s.*, t.item_id
+            FROM {_STAGING} s JOIN {_TARGETS} t ON t.row_no = s.row_no
+            WHERE {where}
+        ) AS s
+        WHERE i.id = s.item_id AND (
+            COALESCE(NULLIF(s.barcode, ''), i.barcode) IS DISTINCT FROM i.barcode
+            OR s.usable_scrap IS DISTINCT FROM i.usable_scrap
+            OR s.quantity IS DISTINCT FROM i.quantity
+            OR s.date IS DISTINCT FROM i.date
+        )
+    """
+
+
+def _book_update_sql(where):
+    # The quantity change _update_sql(where) is about to make, as 'import'
+    # movements; run just before it in the same savepoint. Postgres locks
+    # the rows first so no other writer lands in between.
+    return f"""
+        INSERT INTO inventory_movements (item_id, delta, reason)
+        SELECT i.id, COALESCE(s.quantity, 0) - COALESCE(i.quantity, 0), 'import'
+        FROM inventory i JOIN (
+            SELECT s.quantity, t.item_id
+            FROM {_STAGING} s JOIN {_TARGETS} t ON t.row_no = s.row_no
+            WHERE {where}
+        ) AS s ON s.item_id = i.id
+        WHERE COALESCE(s.quantity, 0) <> COALESCE(i.quantity, 0)
+        {"" if is_sqlite() else "FOR UPDATE OF i"}
+    """
+
+
+def _update_duplicates(tx):
+    """
+    Apply the duplicate rows to the existing rows: one UPDATE from the last
+    row of each key, except for keys with a row that would break the unique
+    barcode (a barcode another item or another key in the file uses, or a
+    barcode for a key matching several items) - those are applied row by
+    row in file order, each in a savepoint, so only the clashing rows fail.
+    Items already holding the row's values are left alone.
+    Returns (items changed, rows that could not be applied).
+    """
+    keys = ", ".join(_KEYS)
+    # Resolve each duplicate row's items once; the updates then go by id.
+    tx.execute(f"""
+        CREATE TEMP TABLE {_TARGETS} {"" if is_sqlite() else "ON COMMIT DROP"} AS
+        SELECT s.row_no, i.id AS item_id
+        FROM {_STAGING} s JOIN inventory i ON {_key_match("i")}
+        WHERE s.action = 'duplicate'
+    """)
+    tx.execute(f"CREATE INDEX {_TARGETS}_row ON {_TARGETS} (row_no)")
+    # A barcode set on a key matching several items can never be applied.
+    failed = tx.execute(f"""
+        UPDATE {_STAGING} SET action = 'error'
+        WHERE action = 'duplicate' AND barcode <> '' AND row_no IN (
+            SELECT row_no FROM {_TARGETS} GROUP BY row_no HAVING COUNT(*) > 1
+        )
+    """)
+    shared_across_keys = " OR ".join(f"MIN({k}) <> MAX({k})" for k in _KEYS)
+    tx.execute(f"""
+        UPDATE {_STAGING} SET action = 'conflict'
+        WHERE action = 'duplicate' AND ({keys}) IN (
+            SELECT {keys} FROM {_STAGING}
+            WHERE action = 'duplicate' AND barcode <> '' AND (
+                row_no IN (
+                    SELECT s.row_no FROM {_STAGING} s JOIN inventory i ON i.barcode = s.barcode
+                    WHERE NOT EXISTS (SELECT 1 FROM {_TARGETS} t
+                                      WHERE t.row_no = s.row_no AND t.item_id = i.id)
+                )
+                OR barcode IN (
+                    SELECT barcode FROM {_STAGING}
+                    WHERE action = 'duplicate' AND barcode <> ''
+                    GROUP BY barcode HAVING {shared_across_keys}
+                )
+            )
+        )
+    """)
+    row_by_row = "action = 'conflict'"
+    try:
+        with tx.savepoint():
+            # A blank barcode keeps the one before it: the last row of a key
+            # takes the key's last non-blank barcode.
+            tx.execute(f"""
+                UPDATE {_STAGING} SET barcode = b.barcode
+                FROM (
+                    SELECT row_no,
+                           ROW_NUMBER() OVER (PARTITION BY {keys} ORDER BY row_no DESC) AS rn,
+                           MAX(CASE WHEN barcode <> '' THEN row_no END)
+                               OVER (PARTITION BY {keys}) AS barcode_row
+                    FROM {_STAGING} WHERE action = 'duplicate'
+                ) AS w
+                JOIN {_STAGING} b ON b.row_no = w.barcode_row
+                WHERE {_STAGING}.row_no = w.row_no AND w.rn = 1
+                  AND COALESCE({_STAGING}.barcode, '') = ''
+            """)
+            last_rows = f"""s.row_no IN (
+                SELECT MAX(row_no) FROM {_STAGING} WHERE action = 'duplicate' GROUP BY {keys}
+            )"""
+            tx.execute(_book_update_sql(last_rows))
+            updated = tx.execute(_update_sql(last_rows))
+    except Exception:
+        updated = 0
+        row_by_row = "action IN ('duplicate', 'conflict')"
+    book_one, one_row = _book_update_sql("s.row_no = %s"), _update_sql("s.row_no = %s")
+    for (row_no,) in tx.fetch_all(
+            f"SELECT row_no FROM {_STAGING} WHERE {row_by_row} ORDER BY row_no"):
+        try:
+            with tx.savepoint():
+                tx.execute(book_one, (row_no,))
+                updated += tx.execute(one_row, (row_no,))
+        except Exception as ex:
+            failed += 1
+            if DEBUG_IMPORT:
+                print(f"[IMPORT][ERROR] Update failed for staged row {row_no}: {ex}")
+    return updated, failed
+
+
+def _barcodes_in_use():
+    return {bc for (bc,) in fetch_all(
+        "SELECT barcode FROM inventory WHERE barcode IS NOT NULL AND barcode <> ''")}
+
+
+def generate_missing_barcodes(inserted, images=True, taken=None):
+    """
+    Give merge_rows()'s new items without a barcode a derived one (+ image
+    unless images is False). Returns the count.
+
+    Codes are picked in memory (allocate_barcodes) against `taken`, the
+    set of barcodes in use - import_sheet() reads it once per import and
+    passes it to every chunk; None reads it for this call. One bulk UPDATE
+    by id writes the codes. Allocations are serialized by an advisory lock
+    on PostgreSQL; if some other writer takes a chosen code anyway, the
+    unique barcode index rejects the update and the batch is allocated
+    again against a fresh set. The last failure is raised.
+    """
+    if taken is None:
+        taken = _barcodes_in_use()
+    wanted = []
+    for item_id, barcode_val, thickness, metal_type, dimensions in inserted:
+        if barcode_val and barcode_val.strip():
+            taken.add(barcode_val)      # set by the sheet in this chunk
+            continue
+        try:
+            derived = derive_compact_barcode_value(thickness, metal_type, dimensions)
+            if not derived:
+                base = f"{(thickness or '')}-{(metal_type or '')}-{(dimensions or '')}-{item_id}"
+                derived = generate_compact_code(base, length=8)
+            wanted.append((item_id, derived))
+        except Exception as ex:
+            if DEBUG_IMPORT:
+                print(f"[IMPORT][WARN] Barcode gen failed item {item_id}: {ex}")
+    if not wanted:
+        return 0
+
+    with transaction() as tx:
+        if not is_sqlite():
+            tx.fetch_one("SELECT pg_advisory_xact_lock(%s)", (BARCODE_LOCK_ID,))
+        for attempt in range(1, _BARCODE_ATTEMPTS + 1):
+            assigned = allocate_barcodes(wanted, taken)
+            try:
+                with tx.savepoint():
+                    # Leave items alone that got a barcode in the meantime.
+                    written = tx.bulk_update(
+                        "inventory", "id", ["barcode"], [(i, (code,)) for i, code in assigned],
+                        where="t.barcode IS NULL OR t.barcode = ''", returning=["barcode"])
+                break
+            except Exception as ex:
+                if DEBUG_IMPORT:
+                    print(f"[IMPORT][WARN] Barcode allocation attempt {attempt} failed: {ex}")
+                if attempt == _BARCODE_ATTEMPTS:
+                    raise
+                taken.clear()
+                taken.update(_barcodes_in_use())
+
+    if images:
+        for (code,) in written:
+            try:
+                generate_scannable_barcode(code, overwrite=True)
+            except Exception:
+                pass
+    if DEBUG_IMPORT:
+        print(f"[IMPORT] Generated {len(written)} barcodes")
+    return len(written)
+
+
+def _lap(seconds, phase, start):
+    now = time.perf_counter()
+    seconds[phase] += now - start
+    return now
+
+
+def import_sheet(chunks, duplicate_update, gen_barcodes=False, progress_fn=None, dry_run=False):
+    """
+    Normalize and merge each chunk of open_sheet() (committed one by one),
+    then call progress_fn(rows_read, totals). Returns totals: added /
+    updated / skipped / errors / barcodes, rows_read, and "seconds" spent
+    per phase (read, normalize, merge, barcodes).
+    dry_run runs the whole import in one transaction and rolls it back
+    (no barcode images are written either). A failing chunk raises
+    ImportStopped with the totals so far.
+    """
+    if dry_run:
+        with transaction() as tx:
+            try:
+                totals = _import_chunks(chunks, duplicate_update, gen_barcodes, progress_fn, True)
+            except ImportStopped as ex:
+                ex.saved = 0
+                raise
+            tx.rollback()
+        return totals
+    return _import_chunks(chunks, duplicate_update, gen_barcodes, progress_fn, False)
+
+
+def _import_chunks(chunks, duplicate_update, gen_barcodes, progress_fn, dry_run):
+    totals = {"added": 0, "updated": 0, "skipped": 0, "errors": 0, "barcodes": 0, "rows_read": 0}
+    seconds = dict.fromkeys(("read", "normalize", "merge", "barcodes"), 0.0)
+    chunks = iter(chunks)
+    saved = 0
+    taken = None        # barcodes in use, read once when generating
+    try:
+        while True:
+            t = time.perf_counter()
+            chunk = next(chunks, None)
+            t = _lap(seconds, "read", t)
+            if chunk is None:
+                break
+            rows, bad = normalize_frame(map_columns(chunk))
+            t = _lap(seconds, "normalize", t)
+            result = merge_rows(rows, duplicate_update)     # commits this chunk
+            t = _lap(seconds, "merge", t)
+            for k in ("added", "updated", "skipped", "errors"):
+                totals[k] += result[k]
+            totals["errors"] += bad
+            totals["rows_read"] += len(chunk)
+            saved = totals["rows_read"]
+            if gen_barcodes:
+                if taken is None:
+                    taken = _barcodes_in_use()
+                totals["barcodes"] += generate_missing_barcodes(
+                    result["inserted"], images=not dry_run, taken=taken)
+                _lap(seconds, "barcodes", t)
+            if DEBUG_IMPORT:
+                print(f"[IMPORT] {totals['rows_read']} rows read: {totals}")
+            if progress_fn:
+                progress_fn(totals["rows_read"], dict(totals))
+    except Exception as ex:
+        raise ImportStopped(ex, dict(totals, seconds=seconds), saved) from ex
+    totals["seconds"] = seconds
+    return totals
+
+
+__all__ = [
+    "IMPORT_CHUNK_ROWS",
+    "IMPORT_COLUMN_MAP",
+    "IMPORT_COLUMNS",
+    "MATCH_KEY",
+    "SheetError",
+    "ImportStopped",
+    "read_chunks",
+    "open_sheet",
+    "map_columns",
+    "clean_frame",
+    "normalize_frame",
+    "merge_rows",
+    "generate_missing_barcodes",
+    "import_sheet",
+]
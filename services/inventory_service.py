@@ -1,92 +1,67 @@
 ﻿# -*- coding: utf-8 -*-
-import re
-from datetime import datetime
-from db.queries import fetch_all, fetch_one, execute
-from db.connection import get_cursor
-
-DATE_INPUT_FORMATS = [
-    "%m-%d-%Y", "%m/%d/%Y",
-    "%m-%d-%y", "%m/%d/%y",
-    "%Y-%m-%d"
-]
-
-def normalize_date_input(raw: str):
-    if raw is None:
-        return None
-    s = raw.strip()
-    if not s:
-        return None
-    for fmt in DATE_INPUT_FORMATS:
-        try:
-            dt = datetime.strptime(s, fmt)
-            return dt.strftime("%Y-%m-%d")
-        except ValueError:
-            continue
-    raise ValueError("Date must be MM-DD-YYYY (e.g. 08-26-2025).")
+from db.queries import fetch_all, fetch_one, execute, bulk_update
+from db.transaction import transaction
+from db.connection import is_sqlite
+from db.schema import ensure_schema, SEARCH_DOCUMENT_SQL, SEARCH_INDEX
+from services.ledger_service import apply_delta, adjust_quantities, set_quantity_for_barcode
+# Point-in-time / consumption queries live with the history maintenance; re-exported here.
+from services.history_service import inventory_at, stock_at, consumption_rate
+from services.snapshot_service import (
+    get_snapshot, note_changed, SNAPSHOT_COLUMNS, SORT_KEYS, RANGE_FILTERS,
+)
+# Parsers live in utils.parsing (memoized); re-exported here for existing callers.
+from utils.parsing import normalize_date_input, parse_dimensions
+from utils.trigram import EXACT_BONUS, WORD_PREFIX_BONUS, SUBSTRING_BONUS
 
-def parse_dimensions(dim_text: str):
-    if not dim_text or not isinstance(dim_text, str):
-        return None
-    txt = dim_text.replace("×", "x").lower().strip()  # defensive replace
-    parts = [p.strip() for p in re.split(r'\bx\b', txt)]
-    if len(parts) < 2:
-        nums = re.findall(r'(\d+(?:\.\d+)?)\s*(?:ft|feet|\'|in|")?', txt)
-        if len(nums) >= 2:
-            parts = [nums[0], nums[1]]
-        else:
-            return None
-    left, right = parts[0], parts[1]
-
-    def to_inches(fragment: str):
-        feet_marker = bool(re.search(r"(?:\bft\b|\bfeet\b|'|ft\.)", fragment))
-        m = re.search(r"(\d+(?:\.\d+)?)", fragment)
-        if not m:
-            return 0.0
-        val = float(m.group(1))
-        return val * 12.0 if feet_marker else val
-
-    length_in = to_inches(left)
-    width_in = to_inches(right)
-    if length_in <= 0 or width_in <= 0:
-        return None
-    return length_in, width_in
+SEARCH_LIMIT = 50
+PAGE_SIZE = 200          # query_inventory() default page
+EXACT_COUNT_BELOW = 10000  # planner estimates under this are replaced by COUNT(*)
+_ITEM_COLUMNS = ("id, barcode, shelf, thickness, metal_type, dimensions, location, "
+                 "quantity, usable_scrap, date")
+_search_in_db = None   # pg_trgm index present? (checked once)
 
 def extract_dimensions():
-    execute("""
-        DO $$
-        BEGIN
-            IF NOT EXISTS (
-                SELECT 1 FROM information_schema.columns
-                WHERE table_name='inventory' AND column_name='length') THEN
-                ALTER TABLE inventory ADD COLUMN length NUMERIC;
-            END IF;
-            IF NOT EXISTS (
-                SELECT 1 FROM information_schema.columns
-                WHERE table_name='inventory' AND column_name='width') THEN
-                ALTER TABLE inventory ADD COLUMN width NUMERIC;
-            END IF;
-        END
-        $$;
+    """
+    Fill length/width from the dimensions text, incrementally: only rows
+    whose dimensions changed since they were last parsed (dims_parsed_from)
+    are read, each distinct text is parsed once, and the results go out as
+    bulk UPDATEs. Unparseable text is marked too, so it is not retried until
+    it changes. Returns {"parsed": rows, "failed": rows, "skipped": rows}.
+    """
+    ensure_schema()  # length/width/dims_parsed_from come from the migrations
+    pending = "t.dims_parsed_from IS DISTINCT FROM t.dimensions"
+    texts = fetch_all(f"""
+        SELECT DISTINCT dimensions FROM inventory AS t WHERE {pending}
     """)
-    rows = fetch_all("SELECT dimensions FROM inventory")
-    updated = 0
-    with get_cursor() as cur:
-        for (dim_text,) in rows:
-            if not dim_text:
-                continue
-            parsed = parse_dimensions(dim_text)
-            if not parsed:
-                continue
-            L, W = parsed
-            if L > 0 and W > 0:
-                cur.execute("""
-                    UPDATE inventory
-                    SET length=%s, width=%s
-                    WHERE dimensions=%s
-                """, (L, W, dim_text))
-                if cur.rowcount > 0:
-                    updated += 1
-    return updated
+    counts = {"parsed": 0, "failed": 0, "skipped": 0}
+    if not texts:
+        return counts
+
+    parsed, failed, blank = [], [], []
+    for (dim_text,) in texts:
+        if dim_text is None or not dim_text.strip():
+            blank.append(dim_text)
+            continue
+        result = parse_dimensions(dim_text)
+        if result:
+            parsed.append((dim_text, (result[0], result[1], dim_text)))
+        else:
+            failed.append((dim_text, (dim_text,)))
+
+    with transaction():
+        if parsed:
+            counts["parsed"] = sum(bulk_update(
+                "inventory", "dimensions", ["length", "width", "dims_parsed_from"],
+                parsed, where=pending))
+        if failed:
+            counts["failed"] = sum(bulk_update(
+                "inventory", "dimensions", ["dims_parsed_from"], failed, where=pending))
+        if blank:
+            counts["skipped"] = execute(f"""
+                UPDATE inventory AS t SET dims_parsed_from = dimensions
+                WHERE (dimensions IS NULL OR TRIM(dimensions) = '') AND {pending}
+            """)
+    return counts
 
 def add_inventory_item(fields):
     quantity = int(fields["quantity"])
@@ -96,13 +71,21 @@ def add_inventory_item(fields):
             (barcode, shelf, thickness, metal_type, dimensions, location,
              quantity, usable_scrap, date)
         VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
+        RETURNING id
     """
     params = (
         fields["barcode"], fields["shelf"], fields["thickness"], fields["metal_type"],
         fields["dimensions"], fields["location"], quantity,
         fields["usable_scrap"], date_iso
     )
-    execute(sql, params)
+    note_changed([fetch_one(sql, params)[0]])
+
+def _set_quantities(rows, quantity, reason):
+    # rows: (id, current quantity) of rows this transaction has locked; the
+    # difference goes through the ledger so it is recorded as a movement.
+    for item_id, current in rows:
+        if quantity != (current or 0):
+            apply_delta(item_id, quantity - (current or 0), reason)
 
 def update_inventory_item(fields):
     quantity = int(fields["quantity"])
@@ -110,45 +93,54 @@ def update_inventory_item(fields):
     sql = """
         UPDATE inventory
         SET barcode=%s, shelf=%s, thickness=%s, location=%s,
-            quantity=%s, usable_scrap=%s, date=%s
+            usable_scrap=%s, date=%s
         WHERE dimensions=%s AND thickness=%s AND metal_type=%s
+        RETURNING id, quantity
     """
     params = (
         fields["barcode"], fields["shelf"], fields["thickness"], fields["location"],
-        quantity, fields["usable_scrap"], date_iso,
+        fields["usable_scrap"], date_iso,
         fields["dimensions"], fields["thickness"], fields["metal_type"]
     )
-    return execute(sql, params)
+    with transaction() as tx:
+        rows = tx.fetch_all(sql, params)
+        _set_quantities(rows, quantity, "entry form")
+    ids = [r[0] for r in rows]
+    note_changed(ids)
+    return len(ids)
 
 def delete_inventory_item(row_values):
     sql = """
         DELETE FROM inventory
         WHERE shelf=%s AND thickness=%s AND metal_type=%s AND dimensions=%s
           AND location=%s AND quantity=%s AND usable_scrap=%s AND date=%s
+        RETURNING id
     """
     params = (
         row_values[0], row_values[1], row_values[2], row_values[3],
         row_values[4], int(row_values[5]), row_values[6], row_values[7] if row_values[7] else None
     )
-    return execute(sql, params)
+    ids = [r[0] for r in fetch_all(sql, params)]
+    note_changed(ids)
+    return len(ids)
 
 def adjust_quantity(row_values, delta):
-    sql = """
-        UPDATE inventory
-        SET quantity = GREATEST(0, quantity + %s)
+    """
+    Five-column match kept for older callers; goes through the ledger.
+    Prefer apply_delta(item_id, delta, reason) when the id is known, or
+    adjust_quantities([(item_id or barcode, delta), ...]) for many items.
+    """
+    rows = fetch_all("""
+        SELECT id FROM inventory
         WHERE shelf=%s AND thickness=%s AND metal_type=%s
           AND dimensions=%s AND location=%s
-    """
-    params = (delta, row_values[0], row_values[1], row_values[2], row_values[3], row_values[4])
-    return execute(sql, params)
-
-def set_quantity_for_barcode(barcode_value, new_qty):
-    return execute("UPDATE inventory SET quantity=%s WHERE barcode=%s",
-                   (new_qty, barcode_value))
+    """, (row_values[0], row_values[1], row_values[2], row_values[3], row_values[4]))
+    adjust_quantities([(item_id, delta) for (item_id,) in rows], "adjust")
+    return len(rows)
 
 def get_quantity_for_barcode(barcode_value):
-    row = fetch_one("SELECT quantity FROM inventory WHERE barcode=%s", (barcode_value,))
-    return row[0] if row else None
+    row = fetch_item_by_barcode(barcode_value)
+    return row[7] if row else None
 
 # Add near other CRUD helpers (e.g. right after update_inventory_item_by_id)
 
@@ -157,15 +149,22 @@ def delete_inventory_item_by_id(item_id: int) -> int:
     Delete inventory row by primary key id.
     Returns number of rows deleted (0 or 1).
     """
-    return execute("DELETE FROM inventory WHERE id=%s", (item_id,))
+    deleted = execute("DELETE FROM inventory WHERE id=%s", (item_id,))
+    note_changed([item_id])
+    return deleted
 
 def fetch_item_by_barcode(barcode: str):
     """
     Return a single inventory row by barcode or None.
     Columns: id, barcode, shelf, thickness, metal_type, dimensions, location, quantity, usable_scrap, date
+    Served from the inventory snapshot's barcode index once it is loaded.
     """
     if not barcode:
         return None
+    snap = get_snapshot()
+    if snap.loaded:
+        row = snap.lookup_barcode(barcode)
+        return row[:10] if row else None
     row = fetch_one("""
         SELECT id, barcode, shelf, thickness, metal_type, dimensions, location,
                quantity, usable_scrap, date
@@ -175,6 +174,148 @@ def fetch_item_by_barcode(barcode: str):
     """, (barcode,))
     return row
 
+def _like_escape(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _use_trigram_index():
+    global _search_in_db
+    if _search_in_db is None:
+        _search_in_db = not is_sqlite() and \
+            fetch_one("SELECT to_regclass(%s) IS NOT NULL", (SEARCH_INDEX,))[0]
+    return _search_in_db
+
+def search_inventory(query, limit=SEARCH_LIMIT):
+    """
+    Ranked prefix / substring / fuzzy search over barcode, metal_type,
+    dimensions, shelf and location. Returns up to limit rows (columns as in
+    fetch_item_by_barcode) plus a trailing score, best first.
+    Runs on the pg_trgm index when migration 8 could create it, otherwise
+    on the snapshot's in-memory trigram index.
+    """
+    q = (query or "").strip().lower()
+    if not q:
+        return []
+    if not _use_trigram_index():
+        return [row[:10] + (score,) for row, score in get_snapshot().search(q, limit)]
+    doc = SEARCH_DOCUMENT_SQL
+    escaped = _like_escape(q)
+    rows = fetch_all(f"""
+        SELECT {_ITEM_COLUMNS}, score
+        FROM (
+            SELECT {_ITEM_COLUMNS},
+                   word_similarity(%(q)s, {doc})
+                   + CASE WHEN lower(barcode) = %(q)s THEN {EXACT_BONUS} ELSE 0 END
+                   + CASE WHEN ' ' || {doc} LIKE %(word_prefix)s THEN {WORD_PREFIX_BONUS} ELSE 0 END
+                   + CASE WHEN {doc} LIKE %(substring)s THEN {SUBSTRING_BONUS} ELSE 0 END AS score
+            FROM inventory
+            WHERE {doc} %%> %(q)s OR {doc} LIKE %(substring)s
+        ) ranked
+        ORDER BY score DESC, id
+        LIMIT %(limit)s
+    """, {"q": q, "word_prefix": f"% {escaped}%", "substring": f"%{escaped}%", "limit": limit})
+    return [tuple(r[:10]) + (float(r[10]),) for r in rows]
+
+# Sort columns compared as numbers/dates; everything else is text, compared
+# lower-cased and by code point so pages line up with the snapshot's order.
+_NON_TEXT_SORT = {"thickness_in", "quantity", "date", "length", "width"}
+
+def _sort_expr(col):
+    if col in _NON_TEXT_SORT:
+        return col
+    return f"LOWER({col})" if is_sqlite() else f'LOWER({col}) COLLATE "C"'
+
+def _keyset_after(parts, key):
+    """WHERE clause for rows after key in ORDER BY parts [(expr, desc, nullable)]."""
+    ors, params = [], []
+    equal = []   # (sql, params) pinning every earlier part to the key
+    for (expr, desc, nullable), value in zip(parts, key):
+        if nullable and value is None:
+            equal.append((f"{expr} IS NULL", []))  # NULL ties with NULL only
+            continue
+        op = "<" if desc else ">"
+        terms = equal + [(f"{expr} {op} %s", [value])]
+        ors.append("(" + " AND ".join(sql for sql, _ in terms) + ")")
+        params.extend(p for _, ps in terms for p in ps)
+        equal.append((f"{expr} = %s", [value]))
+    return "(" + " OR ".join(ors or ["FALSE"]) + ")", params
+
+def _count_estimate(where, params):
+    count_sql = f"SELECT COUNT(*) FROM inventory WHERE {where}"
+    if is_sqlite():
+        return fetch_one(count_sql, params)[0]
+    plan = fetch_one(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM inventory WHERE {where}", params)[0]
+    estimate = int(plan[0]["Plan"]["Plan Rows"])
+    if estimate < EXACT_COUNT_BELOW:
+        return fetch_one(count_sql, params)[0]
+    return estimate
+
+def query_inventory(filters=None, ranges=None, sort=None, descending=False,
+                    after_key=None, limit=PAGE_SIZE):
+    """
+    One page of inventory rows (columns as in SNAPSHOT_COLUMNS), sorted and
+    limited in SQL.
+
+    filters: {column: value}; ranges: RANGE_FILTERS keys -> number; sort: a
+    SORT_KEYS column or tuple of them (thickness sorts by its numeric value,
+    then text). NULLs sort last either way, ties by id - the same order as
+    InventorySnapshot.select().
+
+    Paging is by keyset: pass the returned next_key as after_key to get the
+    following page; next_key is None on the last page. The first page also
+    carries total, the number of matching rows - the planner's estimate
+    on PostgreSQL once it reaches EXACT_COUNT_BELOW, exact otherwise; later
+    pages return None for it.
+    Returns (rows, next_key, total).
+    """
+    clauses, params = ["TRUE"], []
+    for col, value in (filters or {}).items():
+        if col not in SORT_KEYS:
+            raise ValueError(f"Unknown filter column: {col}")
+        clauses.append(f"{col} = %s")
+        params.append(value)
+    for key, bound in (ranges or {}).items():
+        col, lower = RANGE_FILTERS[key]
+        clauses.append(f"{col} {'>=' if lower else '<='} %s")
+        params.append(bound)
+    where = " AND ".join(clauses)
+    if isinstance(sort, str):
+        sort = (sort,)
+    exprs = [_sort_expr(c) for col in (sort or ()) for c in SORT_KEYS[col]]
+    parts = []
+    for expr in exprs:
+        parts.append((f"({expr} IS NULL)", False, False))   # NULLs last
+        parts.append((expr, descending, True))
+    parts.append(("id", False, False))
+
+    page_where, page_params = where, list(params)
+    if after_key is not None:
+        full_key = []
+        for value in after_key[:-1]:
+            full_key += [value is None, value]
+        full_key.append(after_key[-1])
+        after_sql, after_params = _keyset_after(parts, full_key)
+        page_where += f" AND {after_sql}"
+        page_params += after_params
+
+    order = ", ".join(f"{expr} {'DESC' if desc else 'ASC'}" for expr, desc, _ in parts)
+    key_cols = "".join(f", {expr}" for expr in exprs)
+    n = len(SNAPSHOT_COLUMNS)
+    fetched = fetch_all(f"""
+        SELECT {', '.join(SNAPSHOT_COLUMNS)}{key_cols}
+        FROM inventory
+        WHERE {page_where}
+        ORDER BY {order}
+        LIMIT %s
+    """, page_params + [limit + 1])
+    rows = [tuple(r[:n]) for r in fetched[:limit]]
+    next_key = total = None
+    if len(fetched) > limit:
+        last = fetched[limit - 1]
+        next_key = tuple(last[n:]) + (last[0],)
+    if after_key is None:
+        total = len(rows) if next_key is None else _count_estimate(where, params)
+    return rows, next_key, total
+
 def update_inventory_item_by_id(item_id: int, fields: dict):
     """
     Update an inventory row (by id) with provided fields.
@@ -198,9 +339,17 @@ def update_inventory_item_by_id(item_id: int, fields: dict):
     if not updates:
         return 0
 
-    set_clause = ", ".join(f"{k}=%s" for k in updates.keys())
+    # Quantity is set through the ledger; the other columns directly.
+    quantity = updates.pop("quantity", None)
+    set_clause = ", ".join(f"{k}=%s" for k in updates.keys()) or "quantity=quantity"
     params = list(updates.values()) + [item_id]
-    return execute(f"UPDATE inventory SET {set_clause} WHERE id=%s", params)
+    with transaction() as tx:
+        rows = tx.fetch_all(f"UPDATE inventory SET {set_clause} WHERE id=%s RETURNING id, quantity",
+                            params)
+        if quantity is not None:
+            _set_quantities(rows, quantity, "entry form")
+    note_changed([item_id])
+    return len(rows)
 
 __all__ = [
     "normalize_date_input",
@@ -210,9 +359,16 @@ __all__ = [
     "update_inventory_item",
     "delete_inventory_item",
     "adjust_quantity",
+    "apply_delta",
+    "adjust_quantities",
     "set_quantity_for_barcode",
     "get_quantity_for_barcode",
     "fetch_item_by_barcode",
+    "search_inventory",
+    "query_inventory",
+    "inventory_at",
+    "stock_at",
+    "consumption_rate",
     "update_inventory_item_by_id",
     "delete_inventory_item_by_id",
 ]
\ No newline at end of file
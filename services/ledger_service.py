@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Quantity ledger.
+
+Every quantity change goes through apply_delta() / set_quantity_for_barcode()
+(or adjust_quantities() for many items at once): one statement (keyed by id
+or barcode) updates inventory.quantity and appends the change actually
+applied to inventory_movements, so concurrent scanning stations add up
+instead of overwriting each other.
+
+Inserted rows (entry form, import, restore) book their quantity as an
+'insert' movement from a trigger (migration 12), and the import's updates
+book theirs as 'import' movements, so the ledger is the full history.
+reconcile_ledger() is the consistency check: it books any remaining
+difference as a 'reconcile' movement and should find nothing.
+compact_ledger() folds old movements into one row per item.
+start_ledger_maintenance() runs both periodically.
+"""
+from datetime import datetime, timedelta, timezone
+
+from db.connection import is_sqlite
+from db.queries import fetch_all, fetch_one, execute
+from db.transaction import transaction
+from services.snapshot_service import note_changed
+from utils.periodic import PeriodicTask
+
+LEDGER_MAINTENANCE_INTERVAL = 3600   # seconds between reconcile/compact runs
+LEDGER_KEEP_DAYS = 365               # movements newer than this stay individual
+
+_maintenance_task = None
+
+
+def _move(key_column, key_value, target_sql, value, reason):
+    """
+    Set quantity to target_sql - an expression over {q} (current quantity)
+    and {v} (value) - for the row where key_column = key_value, and log the
+    change actually applied. Returns (item_id, new_quantity, applied) or None.
+    """
+    if is_sqlite():
+        # No data-modifying CTEs: the INSERT ... SELECT takes the write lock
+        # before it reads, so both statements see the same quantity.
+        target = target_sql.format(q="quantity", v="%s")
+        with transaction() as tx:
+            row = tx.fetch_one(f"""
+                INSERT INTO inventory_movements (item_id, delta, reason)
+                SELECT id, {target} - quantity, %s
+                FROM inventory
+                WHERE {key_column} = %s AND {target} - quantity <> 0
+                RETURNING delta
+            """, (value, reason, key_value, value))
+            applied = row[0] if row else 0
+            row = tx.fetch_one(f"""
+                UPDATE inventory SET quantity = quantity + %s
+                WHERE {key_column} = %s
+                RETURNING id, quantity
+            """, (applied, key_value))
+            return (row[0], row[1], applied) if row else None
+
+    # Lock the row, update it and append the movement in one statement.
+    row = fetch_one(f"""
+        WITH cur AS (
+            SELECT id, quantity FROM inventory
+            WHERE {key_column} = %(key)s
+            FOR UPDATE
+        ), upd AS (
+            UPDATE inventory AS i
+            SET quantity = {target_sql.format(q="cur.quantity", v="%(value)s")}
+            FROM cur
+            WHERE i.id = cur.id
+            RETURNING i.id, i.quantity, i.quantity - cur.quantity AS applied
+        ), mv AS (
+            INSERT INTO inventory_movements (item_id, delta, reason)
+            SELECT id, applied, %(reason)s FROM upd WHERE applied <> 0
+        )
+        SELECT id, quantity, applied FROM upd
+    """, {"key": key_value, "value": value, "reason": reason})
+    return tuple(row) if row else None
+
+
+def apply_delta(item_id, delta, reason=None):
+    """
+    Add delta to one item's quantity (never below 0) and record it.
+    Returns (item_id, new_quantity, applied_delta) or None if the id is unknown;
+    applied_delta differs from delta only when the result was clamped at 0.
+    """
+    result = _move("id", item_id, "GREATEST(0, {q} + {v})", int(delta), reason)
+    if result:
+        note_changed([result[0]])
+    return result
+
+
+def set_quantity_for_barcode(barcode_value, new_qty, reason="set"):
+    """Set the quantity of the item with this barcode; the difference is recorded."""
+    result = _move("barcode", barcode_value, "GREATEST(0, {v})", int(new_qty), reason)
+    if result:
+        note_changed([result[0]])
+    return result
+
+
+def _group_adjustments(adjustments):
+    # {item id: delta} and {barcode: delta}; repeated keys add up.
+    by_id, by_barcode = {}, {}
+    for key, delta in adjustments:
+        target = by_barcode if isinstance(key, str) else by_id
+        key = key if isinstance(key, str) else int(key)
+        target[key] = target.get(key, 0) + int(delta)
+    return by_id, by_barcode
+
+
+def adjust_quantities(adjustments, reason=None):
+    """
+    Apply many (item_id or barcode, delta) pairs in one transaction; str keys
+    are barcodes, anything else an item id. Each quantity is clamped at 0
+    like apply_delta() and every change is recorded.
+    Returns {key: (item_id, new_quantity, applied_delta)}; unknown keys are
+    left out. Deltas for the same item (by id, barcode or both) are summed
+    before clamping.
+    """
+    by_id, by_barcode = _group_adjustments(adjustments)
+    if not by_id and not by_barcode:
+        return {}
+
+    if is_sqlite():
+        # Resolve keys first: a read inside the write transaction would have
+        # to upgrade its lock, which SQLite refuses while another writer waits.
+        totals, barcodes = {}, {}
+        for item_id, barcode in fetch_all("""
+            SELECT id, barcode FROM inventory
+            WHERE id = ANY(%s) OR barcode = ANY(%s)
+        """, (list(by_id), list(by_barcode))):
+            barcodes[item_id] = barcode
+            totals[item_id] = by_id.get(item_id, 0) + by_barcode.get(barcode, 0)
+        rows = []
+        with transaction():
+            for item_id in sorted(totals):
+                moved = _move("id", item_id, "GREATEST(0, {q} + {v})", totals[item_id], reason)
+                if moved:
+                    rows.append((item_id, barcodes[item_id], moved[1], moved[2]))
+    else:
+        # Resolve ids and barcodes, lock in id order, update and log in one statement.
+        rows = fetch_all("""
+            WITH req AS (
+                SELECT r.id, SUM(r.delta) AS delta
+                FROM (
+                    SELECT i.id, k.delta
+                    FROM unnest(%(ids)s::int[], %(id_deltas)s::int[]) AS k(key, delta)
+                    JOIN inventory i ON i.id = k.key
+                    UNION ALL
+                    SELECT i.id, k.delta
+                    FROM unnest(%(barcodes)s::text[], %(barcode_deltas)s::int[]) AS k(key, delta)
+                    JOIN inventory i ON i.barcode = k.key
+                ) r
+                GROUP BY r.id
+            ), cur AS (
+                SELECT i.id, i.quantity, req.delta
+                FROM inventory i
+                JOIN req ON req.id = i.id
+                ORDER BY i.id
+                FOR UPDATE OF i
+            ), upd AS (
+                UPDATE inventory AS i
+                SET quantity = GREATEST(0, cur.quantity + cur.delta)
+                FROM cur
+                WHERE i.id = cur.id
+                RETURNING i.id, i.barcode, i.quantity, i.quantity - cur.quantity AS applied
+            ), mv AS (
+                INSERT INTO inventory_movements (item_id, delta, reason)
+                SELECT id, applied, %(reason)s FROM upd WHERE applied <> 0
+            )
+            SELECT id, barcode, quantity, applied FROM upd
+        """, {
+            "ids": list(by_id), "id_deltas": list(by_id.values()),
+            "barcodes": list(by_barcode), "barcode_deltas": list(by_barcode.values()),
+            "reason": reason,
+        })
+
+    note_changed([r[0] for r in rows])
+    results = {}
+    for item_id, barcode, quantity, applied in rows:
+        if item_id in by_id:
+            results[item_id] = (item_id, quantity, applied)
+        if barcode in by_barcode:
+            results[barcode] = (item_id, quantity, applied)
+    return results
+
+
+def item_movements(item_id, limit=50):
+    """Latest movements of one item: (created_at, delta, reason), newest first."""
+    return fetch_all("""
+        SELECT created_at, delta, reason
+        FROM inventory_movements
+        WHERE item_id = %s
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+    """, (item_id, limit))
+
+
+def reconcile_ledger():
+    """
+    Book a 'reconcile' movement for every item whose cached quantity differs
+    from its ledger sum (a write that bypassed the ledger, e.g. SQL run by
+    hand). Returns the number of items corrected; normally 0.
+    """
+    return execute("""
+        INSERT INTO inventory_movements (item_id, delta, reason)
+        SELECT i.id, i.quantity - COALESCE(m.total, 0), 'reconcile'
+        FROM inventory i
+        LEFT JOIN (
+            SELECT item_id, SUM(delta) AS total
+            FROM inventory_movements
+            GROUP BY item_id
+        ) m ON m.item_id = i.id
+        WHERE i.quantity <> COALESCE(m.total, 0)
+    """)
+
+
+def compact_ledger(keep_days=LEDGER_KEEP_DAYS):
+    """
+    Replace the movements older than keep_days with one 'compacted' row per
+    item (same sum). Returns the number of movement rows removed.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=keep_days)
+    with transaction() as tx:
+        tx.execute("""
+            INSERT INTO inventory_movements (item_id, delta, reason, created_at)
+            SELECT item_id, SUM(delta), 'compacted', %s
+            FROM inventory_movements
+            WHERE created_at < %s
+            GROUP BY item_id
+            HAVING COUNT(*) > 1
+        """, (cutoff, cutoff))
+        return tx.execute("""
+            DELETE FROM inventory_movements
+            WHERE created_at < %s
+              AND item_id IN (
+                  SELECT item_id FROM inventory_movements
+                  WHERE created_at < %s
+                  GROUP BY item_id
+                  HAVING COUNT(*) > 1
+              )
+        """, (cutoff, cutoff))
+
+
+def run_ledger_maintenance():
+    corrected = reconcile_ledger()
+    removed = compact_ledger()
+    return {"reconciled": corrected, "compacted": removed}
+
+
+def start_ledger_maintenance(interval=LEDGER_MAINTENANCE_INTERVAL):
+    """Reconcile and compact now, then every interval."""
+    global _maintenance_task
+    if _maintenance_task is None:
+        _maintenance_task = PeriodicTask(run_ledger_maintenance, interval,
+                                         name="ledger-maintenance", run_first=True).start()
+    return _maintenance_task
+
+
+def stop_ledger_maintenance():
+    global _maintenance_task
+    if _maintenance_task is not None:
+        _maintenance_task.stop()
+        _maintenance_task = None
+
+
+__all__ = [
+    "apply_delta",
+    "adjust_quantities",
+    "set_quantity_for_barcode",
+    "item_movements",
+    "reconcile_ledger",
+    "compact_ledger",
+    "run_ledger_maintenance",
+    "start_ledger_maintenance",
+    "stop_ledger_maintenance",
+]
@@ -0,0 +1,453 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory snapshot of the inventory table.
+
+The View and Barcode tabs and the comboboxes read from one snapshot instead
+of re-querying the whole table after every add, edit, scan or import. Row
+changes are pushed by the triggers from schema migration 7: Postgres NOTIFYs
+the changed ids on INVENTORY_CHANGES_CHANNEL, SQLite appends them to the
+inventory_changes table. sync() re-fetches only those rows.
+
+Rows are tuples in SNAPSHOT_COLUMNS order, keyed by id and indexed by
+barcode and by the five-column match key. lookup_barcode() serves the scan
+path from that index; codes the database doesn't know are remembered too
+(negative cache) until a row with that barcode shows up.
+
+Writers in this process call note_changed(ids) so their own changes are
+visible at once rather than after the notification round trip. sync()
+returns what it applied as Changes; take_changes() collects them across
+every sync, note_changed() and lookup, for the UI to redraw just those rows.
+"""
+import heapq
+import threading
+from collections import OrderedDict
+
+from db.connection import is_sqlite, open_listener, drain_notifications, current_session
+from db.queries import fetch_all, fetch_one, execute
+from db.schema import INVENTORY_CHANGES_CHANNEL, SEARCH_FIELDS
+from utils.trigram import TrigramIndex, EXACT_BONUS
+
+SNAPSHOT_COLUMNS = (
+    "id", "barcode", "shelf", "thickness", "metal_type", "dimensions",
+    "location", "quantity", "usable_scrap", "date", "length", "width", "thickness_in",
+)
+MATCH_KEY_COLUMNS = ("shelf", "thickness", "metal_type", "dimensions", "location")
+
+SNAPSHOT_POLL_MS = 500          # how often the UI calls sync()
+FULL_RELOAD_MIN_ROWS = 500      # a change set larger than this and ...
+FULL_RELOAD_FRACTION = 0.25     # ... this share of the table reloads everything
+CHANGELOG_KEEP = 10000          # SQLite: inventory_changes rows kept for other processes
+NEGATIVE_CACHE_SIZE = 1024      # unknown barcodes remembered by lookup_barcode()
+
+# Sort keys per sortable column, most significant first. Text compares
+# case-insensitively; NULLs sort last in both directions, ties by id.
+SORT_KEYS = {
+    "barcode": ("barcode",),
+    "shelf": ("shelf",),
+    "thickness": ("thickness_in", "thickness"),
+    "metal_type": ("metal_type",),
+    "dimensions": ("dimensions",),
+    "location": ("location",),
+    "quantity": ("quantity",),
+    "usable_scrap": ("usable_scrap",),
+    "date": ("date",),
+}
+
+# Numeric range filters: key -> (column, lower bound?)
+RANGE_FILTERS = {
+    "length_min": ("length", True), "length_max": ("length", False),
+    "width_min": ("width", True), "width_max": ("width", False),
+    "thickness_min": ("thickness_in", True), "thickness_max": ("thickness_in", False),
+}
+
+_COL = {name: i for i, name in enumerate(SNAPSHOT_COLUMNS)}
+_SELECT = f"SELECT {', '.join(SNAPSHOT_COLUMNS)} FROM inventory"
+
+
+def _sort_value(idx):
+    def key(row):
+        v = row[idx]
+        return v.lower() if isinstance(v, str) else v
+    return key
+
+
+def _sorted(rows, columns, descending=False):
+    # One stable pass per key, least significant first; NULLs go last each pass.
+    rows = sorted(rows, key=lambda r: r[0])
+    for col in reversed(columns):
+        key = _sort_value(_COL[col])
+        present = [r for r in rows if r[_COL[col]] is not None]
+        present.sort(key=key, reverse=descending)
+        rows = present + [r for r in rows if r[_COL[col]] is None]
+    return rows
+
+
+def _as_text(value):
+    return None if value is None else str(value)
+
+
+class Changes:
+    """
+    Rows applied to the snapshot: ids added or updated (changed; the new
+    ones also in added), ids deleted, and the columns whose values differ
+    (all of them for added / deleted rows). reloaded means the whole table
+    was re-read and the ids aren't listed. False when nothing changed.
+    """
+    __slots__ = ("changed", "added", "deleted", "columns", "reloaded")
+
+    def __init__(self, reloaded=False):
+        self.changed = set()
+        self.added = set()
+        self.deleted = set()
+        self.columns = set(SNAPSHOT_COLUMNS) if reloaded else set()
+        self.reloaded = reloaded
+
+    def __bool__(self):
+        return bool(self.reloaded or self.changed or self.deleted)
+
+    def add(self, item_id, old, new):
+        if old == new:
+            return
+        if new is None:
+            self.changed.discard(item_id)
+            self.added.discard(item_id)
+            self.deleted.add(item_id)
+        else:
+            self.deleted.discard(item_id)
+            self.changed.add(item_id)
+            if old is None:
+                self.added.add(item_id)
+        if old is None or new is None:
+            self.columns.update(SNAPSHOT_COLUMNS)
+        else:
+            self.columns.update(c for c, a, b in zip(SNAPSHOT_COLUMNS, old, new) if a != b)
+
+    def update(self, other):
+        if other.reloaded:
+            self.reloaded = True
+        for item_id in other.changed:
+            self.deleted.discard(item_id)
+        for item_id in other.deleted:
+            self.changed.discard(item_id)
+            self.added.discard(item_id)
+        self.changed |= other.changed
+        self.added |= other.added
+        self.deleted |= other.deleted
+        self.columns |= other.columns
+
+
+class InventorySnapshot:
+    """Read-through copy of the inventory table, kept current by sync()."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.rows = {}            # id -> row
+        self.by_barcode = {}      # barcode -> id
+        self.by_match_key = {}    # (shelf, thickness, metal_type, dimensions, location) -> {ids}
+        self.loaded = False
+        self.version = 0          # bumped whenever rows change
+        self._unseen = Changes()  # applied since the last take_changes()
+        self._listener = None     # Postgres LISTEN connection
+        self._last_seq = 0        # SQLite: last inventory_changes.seq applied
+        self._pruned_seq = 0
+        self._missing = OrderedDict()   # barcodes known not to exist
+        self._search = None             # TrigramIndex of SEARCH_FIELDS values, built on first search()
+        self._search_ids = {}           # lower-cased value -> {ids}
+        self.hits = self.misses = self.negative_hits = 0
+
+    # -- loading / syncing -------------------------------------------------
+    def load(self):
+        """
+        (Re)read the whole table. Listening starts first so nothing is missed.
+        Returns Changes with reloaded set (nothing on the first load).
+        """
+        with self._lock:
+            changes = Changes(reloaded=self.loaded)
+            if is_sqlite():
+                self._last_seq = fetch_one("SELECT COALESCE(MAX(seq), 0) FROM inventory_changes")[0]
+            elif self._listener is None or self._listener.closed:
+                self._listener = open_listener(INVENTORY_CHANGES_CHANNEL)
+            else:
+                drain_notifications(self._listener)   # covered by the reload
+            self.rows.clear()
+            self.by_barcode.clear()
+            self.by_match_key.clear()
+            self._missing.clear()
+            self._search = None
+            self._search_ids = {}
+            for row in fetch_all(_SELECT):
+                self._add(tuple(row))
+            self.loaded = True
+            self.version += 1
+            self._unseen.update(changes)
+            return changes
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    def sync(self):
+        """
+        Apply the changes committed since the last sync. Returns them as
+        Changes (false when nothing changed).
+        """
+        with self._lock:
+            if not self.loaded:
+                return self.load()
+            ids = self._pending_ids()
+            if ids is None or len(ids) > max(FULL_RELOAD_MIN_ROWS, len(self.rows) * FULL_RELOAD_FRACTION):
+                return self.load()
+            return self.refresh_ids(ids) if ids else Changes()
+
+    def take_changes(self):
+        """
+        sync(), then return everything applied since the previous call - by
+        any sync(), note_changed() or lookup - and start collecting afresh.
+        Meant for the one consumer that redraws from it (the UI poll).
+        """
+        with self._lock:
+            if self.loaded:
+                self.sync()
+            changes, self._unseen = self._unseen, Changes()
+            return changes
+
+    def refresh_ids(self, ids):
+        """
+        Re-fetch just these rows (ids no longer in the table are dropped).
+        Returns the Changes applied.
+        """
+        ids = list(ids)
+        changes = Changes()
+        with self._lock:
+            fresh = {row[0]: tuple(row) for row in fetch_all(_SELECT + " WHERE id = ANY(%s)", (ids,))}
+            for item_id in ids:
+                self._replace(item_id, fresh.get(item_id), changes)
+            self.version += 1
+            self._unseen.update(changes)
+        return changes
+
+    def close(self):
+        with self._lock:
+            if self._listener is not None and not self._listener.closed:
+                self._listener.close()
+            self._listener = None
+            self.loaded = False
+
+    def _pending_ids(self):
+        # Changed ids since the last call, or None if they can't be known.
+        if is_sqlite():
+            changes = fetch_all(
+                "SELECT seq, item_id FROM inventory_changes WHERE seq > %s ORDER BY seq",
+                (self._last_seq,))
+            if not changes:
+                return set()
+            if changes[0][0] > self._last_seq + 1:
+                return None     # pruned before we read them
+            self._last_seq = changes[-1][0]
+            if self._last_seq - self._pruned_seq >= 2 * CHANGELOG_KEEP:
+                execute("DELETE FROM inventory_changes WHERE seq <= %s",
+                        (self._last_seq - CHANGELOG_KEEP,))
+                self._pruned_seq = self._last_seq
+            return {item_id for _, item_id in changes}
+        if self._listener is None or self._listener.closed:
+            return None
+        payloads = drain_notifications(self._listener)
+        if payloads is None or "*" in payloads:
+            return None
+        return {int(p) for p in payloads}
+
+    def _replace(self, item_id, row, changes):
+        # Swap in the fresh row (None: gone) and note the difference.
+        old = self.rows.get(item_id)
+        self._remove(item_id)
+        if row is not None:
+            self._add(row)
+        changes.add(item_id, old, row)
+
+    def _add(self, row):
+        item_id = row[0]
+        self.rows[item_id] = row
+        barcode = row[_COL["barcode"]]
+        if barcode:
+            self.by_barcode[barcode] = item_id
+            self._missing.pop(barcode, None)
+        self.by_match_key.setdefault(self._match_key(row), set()).add(item_id)
+        if self._search is not None:
+            self._index_search_values(item_id, row)
+
+    def _remove(self, item_id):
+        row = self.rows.pop(item_id, None)
+        if row is None:
+            return
+        barcode = row[_COL["barcode"]]
+        if barcode and self.by_barcode.get(barcode) == item_id:
+            del self.by_barcode[barcode]
+        if self._search is not None:
+            for value in self._search_values(row):
+                ids = self._search_ids.get(value)
+                if ids is not None:
+                    ids.discard(item_id)
+                    if not ids:
+                        del self._search_ids[value]
+                        self._search.remove(value)
+        key = self._match_key(row)
+        ids = self.by_match_key.get(key)
+        if ids is not None:
+            ids.discard(item_id)
+            if not ids:
+                del self.by_match_key[key]
+
+    @staticmethod
+    def _match_key(row):
+        return tuple(row[_COL[c]] for c in MATCH_KEY_COLUMNS)
+
+    @staticmethod
+    def _search_values(row):
+        return {row[_COL[c]].lower() for c in SEARCH_FIELDS if row[_COL[c]]}
+
+    def _index_search_values(self, item_id, row):
+        for value in self._search_values(row):
+            ids = self._search_ids.get(value)
+            if ids is None:
+                ids = self._search_ids[value] = set()
+                self._search.add(value)
+            ids.add(item_id)
+
+    # -- reads -------------------------------------------------------------
+    def get(self, item_id):
+        with self._lock:
+            return self.rows.get(item_id)
+
+    def get_by_barcode(self, barcode):
+        with self._lock:
+            item_id = self.by_barcode.get(barcode)
+            return self.rows.get(item_id) if item_id is not None else None
+
+    def lookup_barcode(self, barcode):
+        """
+        Row for barcode, or None. Answered from memory after a sync(); only
+        a barcode that is neither indexed nor known to be missing costs a query.
+        """
+        with self._lock:
+            self.sync()
+            item_id = self.by_barcode.get(barcode)
+            if item_id is not None:
+                self.hits += 1
+                return self.rows[item_id]
+            if barcode in self._missing:
+                self.negative_hits += 1
+                return None
+            self.misses += 1
+            # Not seen yet: maybe created elsewhere and not notified yet.
+            row = fetch_one(_SELECT + " WHERE barcode = %s", (barcode,))
+            if row is not None:
+                self._replace(row[0], tuple(row), self._unseen)
+                return self.rows[row[0]]
+            self._missing[barcode] = True
+            if len(self._missing) > NEGATIVE_CACHE_SIZE:
+                self._missing.popitem(last=False)
+            return None
+
+    def lookup_stats(self):
+        """Counters for lookup_barcode(): hits, negative hits, misses (queries)."""
+        with self._lock:
+            return {"hits": self.hits, "negative_hits": self.negative_hits,
+                    "misses": self.misses, "negative_cached": len(self._missing),
+                    "indexed": len(self.by_barcode)}
+
+    def search(self, query, limit=50):
+        """
+        Ranked fuzzy search over SEARCH_FIELDS: [(row, score), ...] best
+        first, ties by id. A row scores as its best-matching field; the
+        trigram index is built on first use, then kept current.
+        """
+        q = query.strip().lower()
+        with self._lock:
+            self.sync()
+            if self._search is None:
+                self._search = TrigramIndex()
+                for item_id, row in self.rows.items():
+                    self._index_search_values(item_id, row)
+            scored = self._search.search(q)
+            best = {}
+            last_score = None
+            # Walk values best first, a whole score group at a time; a row
+            # keeps the first (highest) score it gets.
+            for value, score in sorted(scored.items(), key=lambda vs: -vs[1]):
+                if len(best) >= limit and last_score is not None and score < last_score:
+                    break
+                last_score = score
+                for item_id in self._search_ids[value]:
+                    if item_id not in best:
+                        best[item_id] = score
+            for item_id in self._search_ids.get(q, ()):
+                if (self.rows[item_id][_COL["barcode"]] or "").lower() == q:
+                    best[item_id] = best.get(item_id, 0) + EXACT_BONUS
+            top = heapq.nsmallest(limit, best.items(), key=lambda kv: (-kv[1], kv[0]))
+            return [(self.rows[item_id], score) for item_id, score in top]
+
+    def get_by_match_key(self, shelf, thickness, metal_type, dimensions, location):
+        with self._lock:
+            ids = self.by_match_key.get((shelf, thickness, metal_type, dimensions, location), ())
+            return [self.rows[i] for i in sorted(ids)]
+
+    def select(self, filters=None, ranges=None, sort_by=None, descending=False):
+        """
+        Rows matching filters ({column: value}, compared as text) and ranges
+        (RANGE_FILTERS keys -> number), ordered by sort_by - a column name
+        or tuple of names from SORT_KEYS - or by id.
+        """
+        with self._lock:
+            rows = list(self.rows.values())
+        for col, want in (filters or {}).items():
+            idx, want = _COL[col], str(want)
+            rows = [r for r in rows if _as_text(r[idx]) == want]
+        for key, bound in (ranges or {}).items():
+            col, lower = RANGE_FILTERS[key]
+            idx, bound = _COL[col], float(bound)
+            if lower:
+                rows = [r for r in rows if r[idx] is not None and float(r[idx]) >= bound]
+            else:
+                rows = [r for r in rows if r[idx] is not None and float(r[idx]) <= bound]
+        if isinstance(sort_by, str):
+            sort_by = (sort_by,)
+        columns = [c for col in (sort_by or ()) for c in SORT_KEYS[col]]
+        return _sorted(rows, columns, descending)
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot():
+    """The process-wide InventorySnapshot (loaded on first sync())."""
+    global _snapshot
+    if _snapshot is None:
+        with _snapshot_lock:
+            if _snapshot is None:
+                _snapshot = InventorySnapshot()
+    return _snapshot
+
+
+def note_changed(ids):
+    """
+    Writers call this with the ids they just changed so a loaded snapshot
+    picks them up immediately. Inside transaction() it does nothing: the
+    change isn't committed yet and the notification follows the commit.
+    """
+    snap = _snapshot
+    ids = [i for i in ids if i is not None]
+    if snap is None or not snap.loaded or not ids or current_session() is not None:
+        return
+    snap.refresh_ids(ids)
+
+
+__all__ = [
+    "SNAPSHOT_COLUMNS",
+    "SNAPSHOT_POLL_MS",
+    "SORT_KEYS",
+    "Changes",
+    "InventorySnapshot",
+    "get_snapshot",
+    "note_changed",
+]
@@ -0,0 +1,197 @@
+"""
+Shared, memoized parsers for the free-text inventory fields.
+
+The same few hundred distinct dimension / thickness / date strings come
+through every refresh, export and import, so each parser keeps a bounded
+LRU cache keyed by the raw string. The *_series functions parse each
+distinct value of a pandas Series once and map the results back.
+"""
+import re
+from datetime import date, datetime
+from functools import lru_cache
+
+# Entries kept per parser cache.
+PARSE_CACHE_SIZE = 4096
+
+GAUGE_TO_INCHES = {
+    "6": 0.1935,"7": 0.1875,"8": 0.1644,"9": 0.1500,"10": 0.1350,"11": 0.1200,"12": 0.1050,
+    "13": 0.0897,"14": 0.0750,"15": 0.0673,"16": 0.0600,"17": 0.0538,"18": 0.0480,"19": 0.0418,
+    "20": 0.0360,"22": 0.0300,"24": 0.0240,"26": 0.0180,"28": 0.0150,"30": 0.0120
+}
+
+FRACTION_TO_INCHES = {
+    "1/8": 0.1250, "1/4": 0.2500, "3/8": 0.3750, "1/2": 0.5000,
+    "5/8": 0.6250, "3/4": 0.7500, "1": 1.0, "7/8": 0.8750
+}
+
+DATE_INPUT_FORMATS = [
+    "%m-%d-%Y", "%m/%d/%Y",
+    "%m-%d-%y", "%m/%d/%y",
+    "%Y-%m-%d"
+]
+DATE_FORMAT_ERROR = "Date must be MM-DD-YYYY (e.g. 08-26-2025)."
+
+# ------------------------------------------------------------------
+# Dimensions
+# ------------------------------------------------------------------
+_X_SPLIT_RE = re.compile(r'\bx\b')
+_NUMS_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(?:ft|feet|\'|in|")?')
+_FEET_RE = re.compile(r"(?:\bft\b|\bfeet\b|'|ft\.)")
+_NUMBER_RE = re.compile(r"(\d+(?:\.\d+)?)")
+
+def parse_dimensions(dim_text):
+    """'48x96', "4' x 8'" ... -> (length_in, width_in), or None."""
+    if not dim_text or not isinstance(dim_text, str):
+        return None
+    return _parse_dimensions(dim_text)
+
+def _to_inches(fragment):
+    feet_marker = bool(_FEET_RE.search(fragment))
+    m = _NUMBER_RE.search(fragment)
+    if not m:
+        return 0.0
+    val = float(m.group(1))
+    return val * 12.0 if feet_marker else val
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_dimensions(dim_text):
+    txt = dim_text.replace("×", "x").lower().strip()  # defensive replace
+    parts = [p.strip() for p in _X_SPLIT_RE.split(txt)]
+    if len(parts) < 2:
+        nums = _NUMS_RE.findall(txt)
+        if len(nums) >= 2:
+            parts = [nums[0], nums[1]]
+        else:
+            return None
+    length_in = _to_inches(parts[0])
+    width_in = _to_inches(parts[1])
+    if length_in <= 0 or width_in <= 0:
+        return None
+    return length_in, width_in
+
+# ------------------------------------------------------------------
+# Thickness
+# ------------------------------------------------------------------
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def thickness_to_decimal(thickness_str):
+    """Gauge ('14', '14GA'), fraction ('1/4') or decimal ('.063') -> inches; 0.0 if unknown."""
+    if not thickness_str:
+        return 0.0
+    s = thickness_str.strip()
+    if any(g in s.upper() for g in ["G","GA","GAUGE"]):
+        digits = ''.join(c for c in s if c.isdigit())
+        if digits and digits in GAUGE_TO_INCHES:
+            return GAUGE_TO_INCHES[digits]
+        return 0.0
+    if s in GAUGE_TO_INCHES:
+        return GAUGE_TO_INCHES[s]
+    if "/" in s:
+        if s in FRACTION_TO_INCHES:
+            return FRACTION_TO_INCHES[s]
+        try:
+            a,b = s.split('/')
+            return float(a)/float(b)
+        except Exception:
+            return 0.0
+    try:
+        return float(s)
+    except ValueError:
+        return 0.0
+
+# ------------------------------------------------------------------
+# Dates
+# ------------------------------------------------------------------
+_ISO_DATE_RE = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})")
+_US_DATE_RE = re.compile(r"(\d{1,2})([-/])(\d{1,2})\2(\d{4}|\d{2})")
+
+def normalize_date_input(raw):
+    """MM-DD-YYYY, MM/DD/YY, YYYY-MM-DD ... -> 'YYYY-MM-DD'; None for blank; ValueError if invalid."""
+    if raw is None:
+        return None
+    s = raw.strip()
+    if not s:
+        return None
+    return _normalize_date(s)
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _normalize_date(s):
+    # Fast path for the accepted shapes; strptime only for anything else.
+    try:
+        m = _US_DATE_RE.fullmatch(s)
+        if m:
+            year = int(m.group(4))
+            if len(m.group(4)) == 2:
+                year += 1900 if year >= 69 else 2000   # same pivot as strptime %y
+            return date(year, int(m.group(1)), int(m.group(3))).isoformat()
+        m = _ISO_DATE_RE.fullmatch(s)
+        if m:
+            return date(int(m.group(1)), int(m.group(2)), int(m.group(3))).isoformat()
+    except ValueError:
+        raise ValueError(DATE_FORMAT_ERROR) from None
+    for fmt in DATE_INPUT_FORMATS:
+        try:
+            return datetime.strptime(s, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    raise ValueError(DATE_FORMAT_ERROR)
+
+# ------------------------------------------------------------------
+# pandas batch entry points
+# ------------------------------------------------------------------
+def _map_unique(series, fn):
+    # Object Series of fn(value); missing values and None results come back as None.
+    mapping = {v: fn(v) for v in series.dropna().unique()}
+    out = series.map(mapping.get).astype("object")
+    return out.where(out.notna(), None)
+
+def parse_dimensions_series(series):
+    """Series of dimension text -> DataFrame with float length/width columns (NaN if unparseable)."""
+    import pandas as pd
+    parsed = _map_unique(series, parse_dimensions)
+    return pd.DataFrame({
+        "length": parsed.map(lambda p: p[0] if p else None).astype("float64"),
+        "width": parsed.map(lambda p: p[1] if p else None).astype("float64"),
+    }, index=series.index)
+
+def thickness_to_decimal_series(series):
+    """Series of thickness text -> float Series of inches (0.0 when unknown)."""
+    return _map_unique(series.astype("object"), lambda v: thickness_to_decimal(str(v))).fillna(0.0).astype("float64")
+
+def normalize_date_series(series, errors="coerce"):
+    """
+    Series of date text -> Series of 'YYYY-MM-DD' strings (None for blank).
+    errors="coerce" turns invalid dates into None; errors="raise" raises ValueError.
+    """
+    def one(v):
+        try:
+            return normalize_date_input(str(v))
+        except ValueError:
+            if errors == "raise":
+                raise
+            return None
+    return _map_unique(series.astype("object"), one)
+
+# ------------------------------------------------------------------
+# Cache maintenance
+# ------------------------------------------------------------------
+_CACHED = {
+    "dimensions": _parse_dimensions,
+    "thickness": thickness_to_decimal,
+    "dates": _normalize_date,
+}
+
+def parse_cache_info():
+    """{parser: {"hits", "misses", "size"}} for the shared parser caches."""
+    return {name: {"hits": i.hits, "misses": i.misses, "size": i.currsize}
+            for name, fn in _CACHED.items() for i in [fn.cache_info()]}
+
+def clear_parse_caches():
+    for fn in _CACHED.values():
+        fn.cache_clear()
+
+__all__ = [
+    "PARSE_CACHE_SIZE", "GAUGE_TO_INCHES", "FRACTION_TO_INCHES", "DATE_INPUT_FORMATS",
+    "parse_dimensions", "thickness_to_decimal", "normalize_date_input",
+    "parse_dimensions_series", "thickness_to_decimal_series", "normalize_date_series",
+    "parse_cache_info", "clear_parse_caches",
+]
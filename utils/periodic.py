@@ -0,0 +1,48 @@
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+class PeriodicTask:
+    """
+    Call fn() every `interval` seconds on a daemon thread until stop().
+    run_first also calls it once right away (on the thread), so a process
+    shorter than one interval still gets a run.
+    """
+
+    def __init__(self, fn, interval, name=None, run_first=False):
+        if interval <= 0:
+            raise ValueError("interval must be > 0")
+        self.fn = fn
+        self.interval = interval
+        self.run_first = run_first
+        self.name = name or getattr(fn, "__name__", "periodic-task")
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, run_last=False):
+        self._stop.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.interval)
+        if run_last:
+            self._call()
+
+    def _run(self):
+        if self.run_first and not self._stop.is_set():
+            self._call()
+        while not self._stop.wait(self.interval):
+            self._call()
+
+    def _call(self):
+        try:
+            self.fn()
+        except Exception:
+            log.exception("Periodic task %s failed", self.name)
@@ -0,0 +1,119 @@
+"""
+In-memory trigram index for ranked fuzzy search.
+
+Used where Postgres' pg_trgm isn't available (SQLite backend, or a server
+without the extension). Trigrams are built like pg_trgm's: lower-cased
+alphanumeric words padded with two spaces in front and one behind, so
+scores come out close to word_similarity().
+
+The index holds distinct strings; callers map each string back to the rows
+that contain it, so a value shared by thousands of rows is scored once.
+"""
+import math
+import re
+from collections import defaultdict
+from functools import lru_cache
+
+SIMILARITY_THRESHOLD = 0.6      # pg_trgm.word_similarity_threshold default
+
+# Score bonuses, same weights as the SQL search in services/inventory_service.py.
+EXACT_BONUS = 1.0        # query equals the barcode
+WORD_PREFIX_BONUS = 0.5  # a word of the text starts with the query
+SUBSTRING_BONUS = 0.3    # the query appears anywhere in the text
+
+_WORD_RE = re.compile(r"[0-9a-z]+")
+
+
+@lru_cache(maxsize=65536)
+def _word_trigrams(word):
+    padded = f"  {word} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def trigrams(text):
+    """pg_trgm-style trigram set of text."""
+    out = set()
+    for word in _WORD_RE.findall(text.lower()):
+        out |= _word_trigrams(word)
+    return out
+
+
+def _inner_trigrams(text):
+    # Unpadded trigrams: present in any text containing `text` inside a word.
+    out = set()
+    for word in _WORD_RE.findall(text):
+        out.update(word[i:i + 3] for i in range(len(word) - 2))
+    return out
+
+
+class TrigramIndex:
+    """Set of lower-cased strings; search() scores them against a query."""
+
+    def __init__(self):
+        self._texts = set()
+        self._postings = defaultdict(set)  # trigram -> texts
+
+    def __len__(self):
+        return len(self._texts)
+
+    def __contains__(self, text):
+        return text in self._texts
+
+    def add(self, text):
+        if text in self._texts:
+            return
+        self._texts.add(text)
+        for g in trigrams(text):
+            self._postings[g].add(text)
+
+    def remove(self, text):
+        if text not in self._texts:
+            return
+        self._texts.discard(text)
+        for g in trigrams(text):
+            texts = self._postings[g]
+            texts.discard(text)
+            if not texts:
+                del self._postings[g]
+
+    def search(self, query, threshold=SIMILARITY_THRESHOLD):
+        """{text: score} for every text similar to, or containing, query."""
+        q = query.strip().lower()
+        if not q:
+            return {}
+        q_grams = trigrams(q)
+        postings = [self._postings.get(g, ()) for g in q_grams]
+        need = math.ceil(threshold * len(q_grams) - 1e-9)
+
+        # A text sharing `need` of the k query trigrams is in at least one of
+        # the k - need + 1 rarest postings, so common trigrams aren't walked.
+        rarest = sorted(postings, key=len)[:len(q_grams) - need + 1]
+        fuzzy = set().union(*rarest) if rarest else set()
+
+        # Substring matches: every inner trigram present, then verified.
+        inner = _inner_trigrams(q)
+        if inner:
+            pool = sorted((self._postings.get(g, set()) for g in inner), key=len)
+            pool = set.intersection(*pool) if pool[0] else set()
+        else:
+            pool = self._texts   # query too short for trigrams: scan
+        substring = {t for t in pool if q in t}
+
+        scores = {}
+        for text in fuzzy | substring:
+            shared = sum(1 for texts in postings if text in texts)
+            if shared < need and text not in substring:
+                continue
+            s = shared / len(q_grams) if q_grams else 0.0
+            if f" {text}".find(f" {q}") >= 0:
+                s += WORD_PREFIX_BONUS
+            if text in substring:
+                s += SUBSTRING_BONUS
+            scores[text] = s
+        return scores
+
+
+__all__ = [
+    "SIMILARITY_THRESHOLD", "EXACT_BONUS", "WORD_PREFIX_BONUS", "SUBSTRING_BONUS",
+    "trigrams", "TrigramIndex",
+]